@@ -0,0 +1,206 @@
+"""
+Answer many natural language questions in one request.
+
+Questions are deduplicated (by normalized text) and answered on a thread
+pool. LLM calls pass through a semaphore shared by every batch, sized to
+the number of requests Ollama serves in parallel, so a large batch queues
+here instead of piling up inside Ollama. Each question takes a pooled
+database session only after its SQL is generated, for as long as the
+query runs.
+
+Results come back one per input question, in completion order; ``ordered``
+re-sequences them into question order.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import encoding, query_pipeline
+from app.cancellation import CancelToken, Cancelled
+from app.config import settings
+from app.nl_cache import normalize_question
+from app.ollama_service import OllamaService, ollama_service
+from app.sql_store import generated_sql_store
+from app.value_index import value_index
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+@contextmanager
+def _interrupt_on_cancel(db: Session, cancel: Optional[CancelToken]):
+    """Abort the statement running on ``db``'s connection if ``cancel`` is set"""
+    if cancel is None:
+        yield
+        return
+    raw = db.connection().connection.dbapi_connection
+    # psycopg2 cancels the backend's current query; sqlite3 interrupts the running statement
+    interrupt = getattr(raw, "cancel", None) or getattr(raw, "interrupt", None)
+    if interrupt is None:
+        yield
+        return
+    with cancel.on_cancel(interrupt):
+        yield
+
+
+def dedupe(questions: List[str]) -> Dict[str, List[int]]:
+    """Normalized question -> positions it appears at, in first-seen order"""
+    positions: Dict[str, List[int]] = {}
+    for index, question in enumerate(questions):
+        positions.setdefault(normalize_question(question), []).append(index)
+    return positions
+
+
+class BatchQueryRunner:
+    def __init__(self, generation_concurrency: int = 4, max_workers: int = 8):
+        self.generation_concurrency = generation_concurrency
+        self.max_workers = max_workers
+        self._generation_slots = threading.BoundedSemaphore(generation_concurrency)
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "questions": 0, "unique": 0, "generated": 0, "cache_hits": 0, "errors": 0}
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def answer(self, session_factory: Callable[[], Session], question: str,
+               service: OllamaService, explain: bool = False, cancel: Optional[CancelToken] = None) -> dict:
+        """
+        Generate, rewrite and execute one question; failures become the item's
+        status. Setting ``cancel`` stops the Ollama stream or interrupts the
+        running query, releasing the generation slot or the connection.
+        """
+        start = time.perf_counter()
+
+        def generate_sql(text: str) -> str:
+            with self._generation_slots:
+                if cancel is None:
+                    return service.generate_sql(text)
+                cancel.raise_if_set()
+                return service.generate_sql(text, cancel=cancel)
+
+        try:
+            query = query_pipeline.generate(question, service, generate_sql)
+            if query.cache_hit:
+                self._count(cache_hits=1)
+            else:
+                self._count(generated=1)
+
+            if cancel is not None:
+                cancel.raise_if_set()
+            with session_factory() as db, _interrupt_on_cancel(db, cancel):
+                query_pipeline.rewrite(db, query)
+                columns, rows = query_pipeline.execute(db, query)
+            sql_query = query.sql
+
+            explanation = None
+            if explain:
+                with self._generation_slots:
+                    if cancel is not None:
+                        cancel.raise_if_set()
+                    explanation = service.explain_query(sql_query, rows)
+
+            item = {
+                "status": "ok",
+                "sql_query": sql_query,
+                "sql_id": generated_sql_store.add(sql_query),
+                "cache": query.cache_kind,
+                "columns": columns,
+                "result": rows,
+                "row_count": len(rows),
+                "explanation": explanation,
+            }
+        except Cancelled:
+            item = {"status": "cancelled"}
+        except ValueError as e:
+            self._count(errors=1)
+            item = {"status": "invalid", "error": str(e)}
+        except Exception as e:
+            if cancel is not None and cancel.is_set():
+                # An interrupted query fails with a driver error
+                item = {"status": "cancelled"}
+            else:
+                self._count(errors=1)
+                item = {"status": "error", "error": str(e)}
+        item["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return item
+
+    def run(self, session_factory: Callable[[], Session], questions: List[str],
+            model: Optional[str] = None, explain: bool = False) -> Iterator[dict]:
+        """
+        Yield one result per question as it completes, tagged with its
+        ``index`` in ``questions``. Duplicates are answered once and reported
+        at every position they appear. Closing the iterator early cancels
+        questions that haven't started.
+        """
+        positions = dedupe(questions)
+        self._count(batches=1, questions=len(questions), unique=len(positions))
+        if not positions:
+            return
+        service = OllamaService(model=model) if model else ollama_service
+
+        # Known values feed the caches and the prompt; refresh once for the whole batch
+        with session_factory() as db:
+            value_index.ensure_fresh(db)
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(positions)), thread_name_prefix="batch-query"
+        )
+        try:
+            futures = {
+                executor.submit(self.answer, session_factory, questions[indexes[0]], service, explain): indexes
+                for indexes in positions.values()
+            }
+            for future in as_completed(futures):
+                item = future.result()
+                indexes = futures[future]
+                for index in indexes:
+                    yield {
+                        "index": index,
+                        "question": questions[index],
+                        "duplicate_of": indexes[0] if index != indexes[0] else None,
+                        **item,
+                    }
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "generation_concurrency": self.generation_concurrency,
+                "max_workers": self.max_workers,
+            }
+
+
+def ordered(items: Iterable[dict]) -> Iterator[dict]:
+    """Re-sequence results into index order, releasing each as soon as its predecessors are out"""
+    pending = {}
+    next_index = 0
+    for item in items:
+        pending[item["index"]] = item
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+def ndjson_stream(items: Iterable[dict]) -> Iterator[bytes]:
+    for item in items:
+        yield encoding.dumps(item) + b"\n"
+
+
+def json_array_stream(items: Iterable[dict]) -> Iterator[bytes]:
+    yield b"["
+    for count, item in enumerate(items):
+        yield (b"," if count else b"") + encoding.dumps(item)
+    yield b"]"
+
+
+batch_query_runner = BatchQueryRunner(
+    generation_concurrency=settings.BATCH_QUERY_GENERATION_CONCURRENCY,
+    max_workers=settings.BATCH_QUERY_MAX_WORKERS,
+)
@@ -0,0 +1,222 @@
+"""
+Bulk student ingestion in chunked transactions.
+
+Rows are validated as they arrive and loaded ``batch_size`` at a time, one
+transaction per batch: PostgreSQL COPY when the driver is psycopg2, a single
+executemany otherwise. Invalid rows are reported and skipped; a batch the
+database rejects is rolled back and reported as a whole, and loading carries
+on with the next one. ``student_stats`` is folded in within each batch's
+transaction, so the summary never drifts from ``students``.
+"""
+import codecs
+import csv
+import io
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import anyio
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import models, schemas, student_stats
+from app.columnar import columnar_snapshot
+from app.config import settings
+from app.pagination import students_changes
+
+COLUMNS = ("name", "class_name", "section", "marks")
+# VARCHAR limits, checked up front so one long value doesn't fail a whole batch
+MAX_LENGTHS = {
+    column: models.Student.__table__.c[column].type.length
+    for column in COLUMNS
+    if getattr(models.Student.__table__.c[column].type, "length", None)
+}
+
+
+@dataclass
+class BatchReport:
+    batch: int
+    first_row: int  # 1-based position of the batch's first row in the input
+    rows: int = 0
+    inserted: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    error_count: int = 0
+    failed: Optional[str] = None  # database error when the batch was rolled back
+
+    def add_error(self, row: int, error: str, limit: int):
+        self.error_count += 1
+        if len(self.errors) < limit:
+            self.errors.append({"row": row, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "batch": self.batch,
+            "first_row": self.first_row,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "failed": self.failed,
+        }
+
+
+def validate_record(record: Any) -> Tuple[Optional[tuple], Optional[str]]:
+    """(name, class_name, section, marks) for a valid record, else an error message"""
+    if isinstance(record, list):
+        return None, f"wrong number of fields ({len(record)})"
+    if not isinstance(record, dict):
+        return None, "expected an object with name, class_name, section and marks"
+    try:
+        student = schemas.StudentCreate.model_validate(record)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    values = (student.name, student.class_name, student.section, student.marks)
+    for column, value in zip(COLUMNS, values):
+        limit = MAX_LENGTHS.get(column)
+        if limit and len(value) > limit:
+            return None, f"{column}: longer than {limit} characters"
+    return values, None
+
+
+def _copy_statement() -> str:
+    # csv.writer leaves "" unquoted, which COPY reads as NULL unless told otherwise
+    text_columns = ", ".join(column for column in COLUMNS if column in MAX_LENGTHS)
+    return f"COPY students ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({text_columns}))"
+
+
+def _copy_rows(db: Session, rows: List[tuple]):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(_copy_statement(), buffer)
+    finally:
+        cursor.close()
+
+
+def insert_rows(db: Session, rows: List[tuple]):
+    """Insert validated rows in the current transaction"""
+    if db.get_bind().dialect.driver == "psycopg2":
+        _copy_rows(db, rows)
+    else:
+        db.execute(insert(models.Student.__table__), [dict(zip(COLUMNS, row)) for row in rows])
+    if settings.STUDENT_STATS_ENABLED:
+        student_stats.record_students(db, [(row[1], row[2], row[3]) for row in rows])
+
+
+class BulkLoader:
+    def __init__(self, db: Session, batch_size: Optional[int] = None, max_errors_per_batch: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.BULK_LOAD_BATCH_SIZE
+        self.max_errors_per_batch = max_errors_per_batch or settings.BULK_LOAD_MAX_ERRORS_PER_BATCH
+        self.reports: List[BatchReport] = []
+        self._pending: List[tuple] = []
+        self._report: Optional[BatchReport] = None
+        self._row = 0
+
+    def add(self, record: Any):
+        self._row += 1
+        if self._report is None:
+            self._report = BatchReport(batch=len(self.reports) + 1, first_row=self._row)
+        self._report.rows += 1
+
+        values, error = validate_record(record)
+        if error:
+            self._report.add_error(self._row, error, self.max_errors_per_batch)
+        else:
+            self._pending.append(values)
+        if self._report.rows >= self.batch_size:
+            self.flush()
+
+    def add_all(self, records: Iterable[Any]) -> "BulkLoader":
+        for record in records:
+            self.add(record)
+        self.flush()
+        return self
+
+    def flush(self):
+        """Commit the current batch"""
+        report, rows = self._report, self._pending
+        self._report, self._pending = None, []
+        if report is None:
+            return
+        self.reports.append(report)
+        if not rows:
+            return
+        try:
+            insert_rows(self.db, rows)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            report.failed = (str(e).splitlines() or [type(e).__name__])[0]
+            return
+        report.inserted = len(rows)
+        columnar_snapshot.invalidate()
+        students_changes.bump()
+
+    def summary(self) -> dict:
+        return {
+            "rows": self._row,
+            "inserted": sum(r.inserted for r in self.reports),
+            "rejected": sum(r.error_count for r in self.reports),
+            "failed_batches": sum(1 for r in self.reports if r.failed),
+            "batches": [r.as_dict() for r in self.reports],
+        }
+
+
+def load_records(db: Session, records: Iterable[Any], batch_size: Optional[int] = None) -> dict:
+    """Load an iterable of student dicts; returns the summary with per-batch reports"""
+    return BulkLoader(db, batch_size).add_all(records).summary()
+
+
+def iter_csv_records(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[Dict[str, str]]:
+    """
+    Parse a CSV byte stream with a header row into dicts, without holding more
+    than one chunk in memory. Quoted fields may span chunk boundaries.
+    """
+    def lines() -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        tail = ""
+        for chunk in chunks:
+            tail += decoder.decode(chunk)
+            *complete, tail = tail.split("\n")
+            for line in complete:
+                yield line + "\n"
+        tail += decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    reader = csv.reader(lines())
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip().lstrip("\ufeff") for name in header]
+    for values in reader:
+        if not values:
+            continue  # blank line
+        if len(values) != len(header):
+            yield values  # reported as a malformed row by validate_record
+            continue
+        yield dict(zip(header, values))
+
+
+def iterate_from_thread(chunks: AsyncIterable[bytes]) -> Iterator[bytes]:
+    """
+    Consume an async byte stream (a request body) from a worker thread, so the
+    whole upload can be parsed and loaded off the event loop as it arrives.
+    """
+    iterator = chunks.__aiter__()
+
+    async def next_chunk():
+        try:
+            return await iterator.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while True:
+        chunk = anyio.from_thread.run(next_chunk)
+        if chunk is None:
+            return
+        if chunk:
+            yield chunk
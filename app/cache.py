@@ -0,0 +1,352 @@
+"""
+Caches for the app's in-process state.
+
+``LRUCache`` is per process. With several uvicorn workers each keeps its own
+copy and a new worker starts cold, so caches of generated SQL are built with
+``make_cache``: when CACHE_BACKEND is "sqlite" it puts a ``TieredCache`` in
+front, the process's LRU as L1 over a ``SQLiteCache`` file shared by every
+worker on the host as L2. Each L2 write is logged. Before every L1 read a
+worker checks the file's data_version (one pragma, no I/O unless another
+process wrote) and drops the L1 entries other workers changed, so deletes
+and overwrites apply everywhere before the next lookup.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.config import settings
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with optional TTL and hit/miss counters.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SQLiteCache:
+    """
+    Cache in a local SQLite file, shared by the processes on one host. WAL
+    mode lets readers run alongside a writer and reads go through mmap.
+    Values are stored as JSON, never pickled, so whoever can write the file
+    can't run code in the app; ``encode``/``decode`` convert other types to
+    and from JSON-compatible data. The file's directory is created private
+    to the app's user (0700). Every write is logged in cache_invalidations
+    for ``TieredCache`` to follow.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            namespace TEXT NOT NULL,
+            key TEXT,  -- NULL: the whole namespace was cleared
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_cache_invalidations_namespace ON cache_invalidations (namespace, id);
+        CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 100000,
+                 ttl_seconds: Optional[float] = None, log_retention_seconds: float = 300.0,
+                 prune_every: int = 500, encode: Optional[Callable[[Any], Any]] = None,
+                 decode: Optional[Callable[[Any], Any]] = None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.log_retention_seconds = log_retention_seconds
+        self.prune_every = prune_every
+        self._encode = encode or (lambda value: value)
+        self._decode = decode or (lambda value: value)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.executescript(self._SCHEMA)
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        # Cache keys are strings or tuples of strings, whose repr is stable
+        return repr(key)
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits to the file"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, self._key(key)),
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                self.misses += 1
+                return default
+            try:
+                value = self._decode(json.loads(row[0]))
+            except (TypeError, ValueError, KeyError):
+                # Not written by this version (e.g. an old pickled value): treat as missing
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def _write(self, statement: str, params: tuple, key: Optional[str]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(statement, params)
+                self._conn.execute(
+                    "INSERT INTO cache_invalidations (namespace, key, created_at) VALUES (?, ?, ?)",
+                    (self.namespace, key, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        key = self._key(key)
+        self._write(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(self._encode(value)), expires_at),
+            key,
+        )
+
+    def delete(self, key: Hashable):
+        key = self._key(key)
+        self._write("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key), key)
+
+    def clear(self):
+        self._write("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,), None)
+
+    def _prune(self):
+        """Drop expired entries, the oldest beyond max_entries, and old log rows (lock held)"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, now)
+            )
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE rowid IN (SELECT rowid FROM cache_entries WHERE namespace = ? "
+                "ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.max_entries),
+            )
+            pruned = self._conn.execute(
+                "SELECT MAX(id) FROM cache_invalidations WHERE created_at < ?", (now - self.log_retention_seconds,)
+            ).fetchone()[0]
+            if pruned is not None:
+                self._conn.execute("DELETE FROM cache_invalidations WHERE id <= ?", (pruned,))
+                self._conn.execute(
+                    "INSERT INTO cache_meta (name, value) VALUES ('pruned_through', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (pruned,),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def changes_since(self, last_id: int):
+        """
+        (newest log id, keys written since ``last_id``). Keys are None when
+        the namespace was cleared or the log no longer reaches back to
+        ``last_id``: drop everything.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, key FROM cache_invalidations WHERE namespace = ? AND id > ? ORDER BY id",
+                (self.namespace, last_id),
+            ).fetchall()
+            pruned = self._conn.execute("SELECT value FROM cache_meta WHERE name = 'pruned_through'").fetchone()
+            newest = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+        pruned = pruned[0] if pruned is not None else 0
+        newest = max(newest, pruned, rows[-1][0] if rows else 0, last_id)
+        if pruned > last_id or any(key is None for _, key in rows):
+            return newest, None
+        return newest, {key for _, key in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            hits, misses = self.hits, self.misses
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """
+    Process-local LRU (L1) over a shared cache (L2). Reads fill L1 from L2;
+    writes go to both. L1 entries written or deleted by other processes are
+    dropped before each read, from the L2's write log.
+    """
+
+    def __init__(self, l1: LRUCache, l2: SQLiteCache):
+        self.l1 = l1
+        self.l2 = l2
+        self._lock = threading.Lock()
+        self._data_version = l2.data_version()
+        self._last_change, _ = l2.changes_since(0)
+        self.invalidations = 0
+
+    @property
+    def max_entries(self) -> int:
+        return self.l1.max_entries
+
+    @property
+    def ttl_seconds(self) -> Optional[float]:
+        return self.l1.ttl_seconds
+
+    def _sync(self):
+        version = self.l2.data_version()
+        with self._lock:
+            if version == self._data_version:
+                return
+            self._data_version = version
+            self._last_change, keys = self.l2.changes_since(self._last_change)
+            if keys is None:
+                self.l1.clear()
+                self.invalidations += 1
+                return
+            for key in keys:
+                self.l1.delete(key)
+            self.invalidations += len(keys)
+
+    # L1 is keyed like the L2 and its write log, so logged keys can be dropped directly
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self._sync()
+        value = self.l1.get(self.l2._key(key), LRUCache._MISSING)
+        if value is not LRUCache._MISSING:
+            return value
+        value = self.l2.get(key, LRUCache._MISSING)
+        if value is LRUCache._MISSING:
+            return default
+        self.l1.set(self.l2._key(key), value)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.l1.set(self.l2._key(key), value)
+        self.l2.set(key, value)
+
+    def delete(self, key: Hashable):
+        self.l1.delete(self.l2._key(key))
+        self.l2.delete(key)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def stats(self) -> dict:
+        return {**self.l1.stats(), "l2": self.l2.stats(), "invalidations": self.invalidations}
+
+
+CACHE_BACKENDS = ("memory", "sqlite")
+
+
+def make_cache(namespace: str, max_entries: int = 1000, ttl_seconds: Optional[float] = None,
+               encode: Optional[Callable[[Any], Any]] = None, decode: Optional[Callable[[Any], Any]] = None):
+    """
+    A cache for ``namespace``: an in-process LRU, in front of the shared L2
+    file when CACHE_BACKEND is "sqlite". Values that aren't JSON need
+    ``encode``/``decode`` for the L2.
+    """
+    l1 = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    if settings.CACHE_BACKEND == "memory":
+        return l1
+    if settings.CACHE_BACKEND == "sqlite":
+        l2 = SQLiteCache(settings.CACHE_L2_PATH, namespace,
+                         max_entries=settings.CACHE_L2_MAX_ENTRIES, ttl_seconds=ttl_seconds,
+                         encode=encode, decode=decode)
+        return TieredCache(l1, l2)
+    raise ValueError(f"Unknown CACHE_BACKEND: {settings.CACHE_BACKEND}. Use one of {', '.join(CACHE_BACKENDS)}")
@@ -0,0 +1,49 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """Work stopped because its CancelToken was set"""
+
+
+class CancelToken(threading.Event):
+    """
+    An Event that also runs callbacks when set, so blocking work (a running
+    database query, an Ollama stream) can be interrupted rather than only
+    checked between steps.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def set(self):
+        with self._callbacks_lock:
+            callbacks = list(self._callbacks)
+            super().set()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Cancel callback failed: %s", e)
+
+    def raise_if_set(self):
+        if self.is_set():
+            raise Cancelled()
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run ``callback`` if the token is set while the block runs"""
+        with self._callbacks_lock:
+            self.raise_if_set()
+            self._callbacks.append(callback)
+        try:
+            yield
+        finally:
+            with self._callbacks_lock:
+                self._callbacks.remove(callback)
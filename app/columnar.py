@@ -0,0 +1,563 @@
+"""
+Optional in-process columnar snapshot of ``students`` for simple queries.
+
+The table is loaded into NumPy arrays (integers as int64, strings dictionary
+encoded as int32 codes plus their distinct values) and answers the subset of
+SELECTs the LLM produces most often with vectorized operations:
+
+* WHERE: comparisons with literals, AND/OR/NOT, IN lists, BETWEEN, LIKE/ILIKE
+* COUNT(*)/COUNT(col)/COUNT(DISTINCT col), SUM, AVG, MIN, MAX, ROUND
+* GROUP BY columns, HAVING, ORDER BY, LIMIT/OFFSET
+
+Anything else (joins, subqueries, string ordering whose result depends on the
+database collation, ...) raises ``Unsupported`` internally and the caller runs
+the query on the database instead. The snapshot is marked stale on writes made
+through this process and reloaded at most every ``max_age_seconds`` otherwise.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, String, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.lazy_import import optional_module
+from app.sql_parser import (
+    Between, Binary, Column, Func, InList, IsNull, Literal, Select, Star, Table, Unary,
+    contains_aggregate, is_aggregate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+np = None  # optional; imported by _numpy() the first time the snapshot is used
+
+
+def _numpy():
+    global np
+    if np is None:
+        np = optional_module("numpy")
+    return np
+
+
+_COMPARISONS = {"=", "<>", "!=", "<", "<=", ">", ">="}
+_FLIPPED = {"=": "=", "<>": "<>", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+class Unsupported(Exception):
+    """The query is outside what the snapshot can answer exactly"""
+
+
+class _TableData:
+    def __init__(self, name: str, columns: List[str], numeric: Dict[str, "np.ndarray"],
+                 strings: Dict[str, Tuple["np.ndarray", "np.ndarray"]], row_count: int):
+        self.name = name
+        self.columns = columns
+        self.numeric = numeric
+        self.strings = strings  # name -> (codes, sorted distinct values)
+        self.row_count = row_count
+
+
+def _number(literal: Literal):
+    return int(literal.value) if re.fullmatch(r"-?\d+", literal.value) else float(literal.value)
+
+
+def _like_regex(pattern: str, case_insensitive: bool) -> "re.Pattern":
+    if "\\" in pattern:
+        # An escape character in PostgreSQL, a literal in SQLite: leave it to the database
+        raise Unsupported("backslash in LIKE pattern")
+    parts = []
+    for char in pattern:
+        parts.append(".*" if char == "%" else "." if char == "_" else re.escape(char))
+    return re.compile("".join(parts), re.S | (re.I if case_insensitive else 0))
+
+
+def _round_half_away(values, digits: int):
+    scale = 10.0 ** digits
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+class _Query:
+    def __init__(self, data: _TableData, select: Select):
+        self.data = data
+        self.select = select
+        table = select.from_
+        self.qualifiers = {None, data.name, getattr(table, "alias", None)}
+
+    # -- row level ------------------------------------------------------------
+
+    def _column_name(self, column: Column) -> str:
+        name = column.name.lower()
+        if column.table not in self.qualifiers or name not in self.data.columns:
+            raise Unsupported(f"unknown column {column.name}")
+        return name
+
+    def _row_operand(self, expr, rows):
+        """("num", values) | ("str", codes, categories) | ("lit", value)"""
+        if isinstance(expr, Column):
+            name = self._column_name(expr)
+            if name in self.data.numeric:
+                return ("num", self.data.numeric[name][rows])
+            codes, categories = self.data.strings[name]
+            return ("str", codes[rows], categories)
+        if isinstance(expr, Literal) and expr.kind in ("number", "string"):
+            return ("lit", _number(expr) if expr.kind == "number" else expr.value)
+        raise Unsupported(f"operand {type(expr).__name__}")
+
+    def _string_match(self, operand, matches):
+        _, codes, categories = operand
+        wanted = np.flatnonzero(np.fromiter((matches(value) for value in categories), bool, len(categories)))
+        return np.isin(codes, wanted)
+
+    def _compare(self, op: str, left, right):
+        if left[0] == "lit" and right[0] != "lit":
+            left, right, op = right, left, _FLIPPED[op]
+        if left[0] == "num" and right[0] in ("num", "lit"):
+            other = right[1]
+            if right[0] == "lit" and isinstance(other, str):
+                raise Unsupported("string compared with number")
+            values = left[1]
+            return {
+                "=": values == other, "<>": values != other, "!=": values != other,
+                "<": values < other, "<=": values <= other, ">": values > other, ">=": values >= other,
+            }[op]
+        if left[0] == "str" and right[0] == "lit" and isinstance(right[1], str) and op in ("=", "<>", "!="):
+            equal = self._string_match(left, lambda value: value == right[1])
+            return equal if op == "=" else ~equal
+        raise Unsupported(f"comparison {op}")
+
+    def _predicate(self, expr, rows):
+        if isinstance(expr, Binary) and expr.op in ("AND", "OR"):
+            left, right = self._predicate(expr.left, rows), self._predicate(expr.right, rows)
+            return left & right if expr.op == "AND" else left | right
+        if isinstance(expr, Unary) and expr.op == "NOT":
+            return ~self._predicate(expr.operand, rows)
+        if isinstance(expr, Binary) and expr.op in _COMPARISONS:
+            return self._compare(expr.op, self._row_operand(expr.left, rows), self._row_operand(expr.right, rows))
+        if isinstance(expr, Binary) and expr.op in ("LIKE", "ILIKE", "NOT LIKE", "NOT ILIKE"):
+            operand, pattern = self._row_operand(expr.left, rows), self._row_operand(expr.right, rows)
+            if operand[0] != "str" or pattern[0] != "lit" or not isinstance(pattern[1], str):
+                raise Unsupported("LIKE outside string column vs pattern")
+            regex = _like_regex(pattern[1], "ILIKE" in expr.op)
+            matched = self._string_match(operand, lambda value: regex.fullmatch(value) is not None)
+            return ~matched if expr.op.startswith("NOT") else matched
+        if isinstance(expr, InList):
+            operand = self._row_operand(expr.expr, rows)
+            mask = np.zeros(len(rows), dtype=bool)
+            for value in expr.values:
+                mask |= self._compare("=", operand, self._row_operand(value, rows))
+            return ~mask if expr.negated else mask
+        if isinstance(expr, Between):
+            operand = self._row_operand(expr.expr, rows)
+            mask = self._compare(">=", operand, self._row_operand(expr.low, rows)) & \
+                self._compare("<=", operand, self._row_operand(expr.high, rows))
+            return ~mask if expr.negated else mask
+        if isinstance(expr, IsNull):
+            self._row_operand(expr.expr, rows)  # snapshot columns never hold NULL
+            return np.full(len(rows), expr.negated)
+        raise Unsupported(f"predicate {type(expr).__name__}")
+
+    # -- group level ----------------------------------------------------------
+
+    def _aggregate(self, func: Func, rows, inverse, group_count, counts):
+        if func.over is not None or len(func.args) != 1:
+            raise Unsupported("window or multi-argument aggregate")
+        arg = func.args[0]
+        if func.name == "COUNT":
+            if func.distinct:
+                operand = self._row_operand(arg, rows)
+                if operand[0] == "lit":
+                    raise Unsupported("COUNT(DISTINCT literal)")
+                values = operand[1]
+                if len(values) == 0:
+                    return np.zeros(group_count), True
+                pairs = np.unique(np.stack([inverse, values.astype(np.int64)]), axis=1)
+                return np.bincount(pairs[0], minlength=group_count).astype(float), True
+            if isinstance(arg, Column):
+                self._column_name(arg)  # snapshot columns are NOT NULL: COUNT(col) = COUNT(*)
+                return counts.astype(float), True
+            if (isinstance(arg, Star) and arg.table is None) or \
+                    (isinstance(arg, Literal) and arg.kind in ("number", "string")):
+                return counts.astype(float), True
+            raise Unsupported("COUNT argument")
+        if func.distinct:
+            raise Unsupported(f"{func.name}(DISTINCT)")
+
+        operand = self._row_operand(arg, rows)
+        if operand[0] != "num":
+            raise Unsupported(f"{func.name} of non-numeric")
+        values = operand[1].astype(float)
+        empty = counts == 0
+        if func.name in ("SUM", "AVG"):
+            sums = np.bincount(inverse, weights=values, minlength=group_count)
+            result = sums if func.name == "SUM" else sums / np.where(empty, 1, counts)
+            is_int = func.name == "SUM"
+        elif func.name in ("MIN", "MAX"):
+            result = np.full(group_count, np.inf if func.name == "MIN" else -np.inf)
+            (np.minimum if func.name == "MIN" else np.maximum).at(result, inverse, values)
+            is_int = True
+        else:
+            raise Unsupported(f"aggregate {func.name}")
+        return np.where(empty, np.nan, result), is_int
+
+    def _group_operand(self, expr, ctx):
+        """("num", float values per group, is_int) | ("str", values per group) | ("lit", value)"""
+        if isinstance(expr, Literal) and expr.kind in ("number", "string"):
+            return ("lit", _number(expr) if expr.kind == "number" else expr.value)
+        if isinstance(expr, Column):
+            name = self._column_name(expr)
+            if name not in ctx["keys"]:
+                raise Unsupported(f"{name} is neither grouped nor aggregated")
+            return ctx["keys"][name]
+        if isinstance(expr, Func) and is_aggregate(expr):
+            values, is_int = self._aggregate(expr, ctx["rows"], ctx["inverse"], ctx["groups"], ctx["counts"])
+            return ("num", values, is_int)
+        if isinstance(expr, Func) and expr.name == "ROUND" and expr.over is None and 1 <= len(expr.args) <= 2:
+            operand = self._group_operand(expr.args[0], ctx)
+            digits = 0
+            if len(expr.args) == 2:
+                digits_operand = self._group_operand(expr.args[1], ctx)
+                if digits_operand[0] != "lit" or not isinstance(digits_operand[1], int):
+                    raise Unsupported("ROUND digits")
+                digits = digits_operand[1]
+            if operand[0] != "num":
+                raise Unsupported("ROUND of non-numeric")
+            return ("num", _round_half_away(operand[1], digits), operand[2] and digits >= 0)
+        if isinstance(expr, Binary) and expr.op in ("+", "-", "*", "/"):
+            left, right = self._group_operand(expr.left, ctx), self._group_operand(expr.right, ctx)
+            if any(side[0] == "str" or (side[0] == "lit" and isinstance(side[1], str)) for side in (left, right)):
+                raise Unsupported("arithmetic on strings")
+            left_values = left[1] if left[0] == "num" else float(left[1])
+            right_values = right[1] if right[0] == "num" else float(right[1])
+            both_int = (left[2] if left[0] == "num" else isinstance(left[1], int)) and \
+                (right[2] if right[0] == "num" else isinstance(right[1], int))
+            if expr.op == "/":
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    if np.any(np.asarray(right_values) == 0):
+                        raise Unsupported("division by zero")
+                    result = np.asarray(left_values) / right_values
+                result = np.trunc(result) if both_int else result
+            else:
+                result = {"+": np.add, "-": np.subtract, "*": np.multiply}[expr.op](left_values, right_values)
+            return ("num", np.asarray(result, dtype=float) * np.ones(ctx["groups"]), both_int)
+        raise Unsupported(f"expression {type(expr).__name__}")
+
+    def _group_predicate(self, expr, ctx):
+        if isinstance(expr, Binary) and expr.op in ("AND", "OR"):
+            left, right = self._group_predicate(expr.left, ctx), self._group_predicate(expr.right, ctx)
+            return left & right if expr.op == "AND" else left | right
+        if isinstance(expr, Unary) and expr.op == "NOT":
+            operand = expr.operand
+            if isinstance(operand, Binary) and operand.op in _COMPARISONS:
+                # NOT of a comparison with NULL is still not true
+                left = self._group_operand(operand.left, ctx)
+                right = self._group_operand(operand.right, ctx)
+                return ~self._group_compare(operand.op, left, right) & self._not_null(left, right, ctx)
+            raise Unsupported("NOT in HAVING")
+        if isinstance(expr, Binary) and expr.op in _COMPARISONS:
+            return self._group_compare(expr.op, self._group_operand(expr.left, ctx),
+                                       self._group_operand(expr.right, ctx))
+        raise Unsupported(f"HAVING {type(expr).__name__}")
+
+    @staticmethod
+    def _not_null(left, right, ctx):
+        mask = np.ones(ctx["groups"], dtype=bool)
+        for side in (left, right):
+            if side[0] == "num":
+                mask &= ~np.isnan(side[1])
+        return mask
+
+    @staticmethod
+    def _group_compare(op, left, right):
+        if left[0] == "str" or right[0] == "str":
+            raise Unsupported("string comparison in HAVING")
+        left_values = left[1]
+        right_values = right[1]
+        if any(isinstance(v, str) for v in (left_values, right_values)):
+            raise Unsupported("string literal in HAVING")
+        return {
+            "=": np.equal, "<>": np.not_equal, "!=": np.not_equal, "<": np.less,
+            "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+        }[op](left_values, right_values) & ~np.isnan(np.asarray(left_values, dtype=float) + np.asarray(right_values, dtype=float))
+
+    # -- execution ------------------------------------------------------------
+
+    def _check_shape(self):
+        select = self.select
+        if not isinstance(select.from_, Table) or select.from_.name.lower() != self.data.name \
+                or select.from_.schema is not None:
+            raise Unsupported("not a plain scan of the snapshot table")
+        if select.joins or select.ctes:
+            raise Unsupported("joins or CTEs")
+
+    def _limit(self, node) -> Optional[int]:
+        if node is None:
+            return None
+        if isinstance(node, Literal) and node.kind == "number" and re.fullmatch(r"\d+", node.value):
+            return int(node.value)
+        raise Unsupported("non-literal LIMIT/OFFSET")
+
+    def _order(self, sort_keys: List, size: int) -> "np.ndarray":
+        # np.lexsort sorts by the last key first; the trailing arange keeps ties in input order
+        keys = [np.arange(size)]
+        for values, descending in reversed(sort_keys):
+            keys.append(-values if descending else values)
+        return np.lexsort(keys)
+
+    def run(self) -> Tuple[List[str], List[tuple]]:
+        self._check_shape()
+        select = self.select
+        rows = np.arange(self.data.row_count)
+        if select.where is not None:
+            rows = rows[self._predicate(select.where, rows)]
+
+        grouped = bool(select.group_by) or select.having is not None or \
+            any(contains_aggregate(item.expr) for item in select.items)
+        if grouped:
+            columns, outputs, order_keys = self._run_grouped(rows)
+        else:
+            columns, outputs, order_keys = self._run_projection(rows)
+
+        size = len(outputs[0][1]) if outputs else 0
+        order = self._order(order_keys, size) if order_keys else np.arange(size)
+        offset = self._limit(select.offset) or 0
+        limit = self._limit(select.limit)
+        order = order[offset:] if limit is None else order[offset:offset + limit]
+
+        result_columns = []
+        for kind, values, is_int in outputs:
+            picked = values[order].tolist()
+            if kind == "num":
+                # Group-level values are floats with NaN for NULL
+                picked = [None if v != v else (int(v) if is_int else v) for v in picked]
+            result_columns.append(picked)
+        return columns, list(zip(*result_columns)) if result_columns else []
+
+    def _run_projection(self, rows):
+        select = self.select
+        if select.distinct:
+            raise Unsupported("DISTINCT")
+        columns, outputs, names = [], [], {}
+        for item in select.items:
+            if isinstance(item.expr, Star) and item.expr.table in self.qualifiers:
+                expanded = self.data.columns
+            elif isinstance(item.expr, Column):
+                expanded = [self._column_name(item.expr)]
+            else:
+                raise Unsupported("computed projection")
+            for name in expanded:
+                output_name = item.alias or name
+                columns.append(output_name)
+                names[output_name] = name
+                outputs.append(self._base_output(name, rows))
+
+        order_keys = []
+        for order_item in select.order_by:
+            expr = order_item.expr
+            if isinstance(expr, Literal) and expr.kind == "number" and re.fullmatch(r"\d+", expr.value):
+                position = int(expr.value) - 1
+                if not 0 <= position < len(columns):
+                    raise Unsupported("ORDER BY position")
+                name = names[columns[position]]
+            elif isinstance(expr, Column) and expr.table is None and expr.name in names:
+                name = names[expr.name]
+            elif isinstance(expr, Column):
+                name = self._column_name(expr)
+            else:
+                raise Unsupported("ORDER BY expression")
+            if name not in self.data.numeric:
+                raise Unsupported("ORDER BY string column depends on collation")
+            order_keys.append((self.data.numeric[name][rows].astype(float), order_item.descending))
+        return columns, outputs, order_keys
+
+    def _base_output(self, name, rows):
+        if name in self.data.numeric:
+            return ("int", self.data.numeric[name][rows], True)
+        codes, categories = self.data.strings[name]
+        return ("str", categories[codes[rows]], False)
+
+    def _run_grouped(self, rows):
+        select = self.select
+        if select.distinct:
+            raise Unsupported("DISTINCT with aggregates")
+
+        key_names = []
+        for expr in select.group_by:
+            if not isinstance(expr, Column):
+                raise Unsupported("GROUP BY expression")
+            key_names.append(self._column_name(expr))
+
+        if key_names:
+            key_arrays = [
+                self.data.numeric[name][rows] if name in self.data.numeric else self.data.strings[name][0][rows]
+                for name in key_names
+            ]
+            if len(rows):
+                unique, inverse = np.unique(np.stack(key_arrays, axis=1), axis=0, return_inverse=True)
+                inverse = inverse.reshape(-1)
+            else:
+                unique, inverse = np.empty((0, len(key_names)), dtype=np.int64), np.empty(0, dtype=np.int64)
+            groups = len(unique)
+        else:
+            unique, inverse, groups = None, np.zeros(len(rows), dtype=np.int64), 1
+
+        keys = {}
+        for position, name in enumerate(key_names):
+            column = unique[:, position]
+            if name in self.data.numeric:
+                keys[name] = ("num", column.astype(float), True)
+            else:
+                keys[name] = ("str", self.data.strings[name][1][column])
+        ctx = {
+            "rows": rows, "inverse": inverse, "groups": groups, "keys": keys,
+            "counts": np.bincount(inverse, minlength=groups),
+        }
+
+        columns, outputs, by_alias = [], [], {}
+        for item in select.items:
+            operand = self._group_operand(item.expr, ctx)
+            if operand[0] == "lit":
+                raise Unsupported("literal select item")
+            if item.alias:
+                name = item.alias
+            elif isinstance(item.expr, Column):
+                name = item.expr.name
+            elif isinstance(item.expr, Func):
+                name = item.expr.name.lower()
+            else:
+                name = "?column?"
+            columns.append(name)
+            by_alias[name] = operand
+            outputs.append(("num", operand[1], operand[2]) if operand[0] == "num" else ("str", operand[1], False))
+
+        if select.having is not None:
+            keep = np.flatnonzero(self._group_predicate(select.having, ctx))
+            outputs = [(kind, values[keep], is_int) for kind, values, is_int in outputs]
+            ctx = dict(ctx, keep=keep)
+        else:
+            keep = None
+
+        order_keys = []
+        for order_item in select.order_by:
+            expr = order_item.expr
+            if isinstance(expr, Literal) and expr.kind == "number" and re.fullmatch(r"\d+", expr.value):
+                position = int(expr.value) - 1
+                if not 0 <= position < len(outputs):
+                    raise Unsupported("ORDER BY position")
+                kind, values, _ = outputs[position]
+            else:
+                if isinstance(expr, Column) and expr.table is None and expr.name in by_alias:
+                    operand = by_alias[expr.name]
+                else:
+                    operand = self._group_operand(expr, ctx)
+                kind, values = operand[0], operand[1]
+                values = values[keep] if keep is not None and kind != "lit" else values
+            if kind != "num":
+                raise Unsupported("ORDER BY string or constant depends on collation")
+            order_keys.append((values, order_item.descending))
+        return columns, outputs, order_keys
+
+
+class ColumnarSnapshot:
+    def __init__(self, table: str = "students", max_rows: int = 1_000_000, max_age_seconds: float = 60):
+        self.table = table
+        self.max_rows = max_rows
+        self.max_age_seconds = max_age_seconds
+        self._data: Optional[_TableData] = None
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+        self.loads = 0
+
+    @property
+    def available(self) -> bool:
+        return _numpy() is not None
+
+    def invalidate(self):
+        """Mark the snapshot stale; the next query reloads it"""
+        self._stale = True
+
+    def _table_columns(self):
+        from app.models import Base
+        table = Base.metadata.tables[self.table]
+        numeric = [c.name for c in table.columns if isinstance(c.type, Integer)]
+        strings = [c.name for c in table.columns if isinstance(c.type, String)]
+        return [c.name for c in table.columns if c.name in numeric or c.name in strings], numeric
+
+    def load(self, db: Session):
+        if _numpy() is None:
+            raise ValueError("The columnar snapshot requires the 'numpy' package")
+        names, numeric_names = self._table_columns()
+        count = db.execute(text(f"SELECT COUNT(*) FROM {self.table}")).scalar()
+        if count > self.max_rows:
+            logger.info("Columnar snapshot disabled: %s has %d rows (> %d)", self.table, count, self.max_rows)
+            self._data = None
+            self._stale = False
+            self._loaded_at = time.monotonic()
+            return
+
+        result = db.execute(text(f"SELECT {', '.join(names)} FROM {self.table} ORDER BY id")).fetchall()
+        columns = list(zip(*result)) if result else [() for _ in names]
+        numeric, strings = {}, {}
+        for name, values in zip(names, columns):
+            if any(value is None for value in values):
+                raise ValueError(f"column {name} contains NULLs")
+            if name in numeric_names:
+                numeric[name] = np.asarray(values, dtype=np.int64)
+            else:
+                categories, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+                strings[name] = (codes.astype(np.int32).reshape(-1), categories)
+
+        self._data = _TableData(self.table, names, numeric, strings, len(result))
+        self._loaded_at = time.monotonic()
+        self._stale = False
+        self.loads += 1
+
+    def ensure_fresh(self, db: Session):
+        expired = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.max_age_seconds
+        if self._stale or expired:
+            with self._lock:
+                if self._stale or self._loaded_at is None or \
+                        time.monotonic() - self._loaded_at >= self.max_age_seconds:
+                    self.load(db)
+
+    def execute(self, db: Session, select: Optional[Select]) -> Optional[Tuple[List[str], List[tuple]]]:
+        """(columns, rows) answered from the snapshot, or None to run the query on the database"""
+        if select is None or _numpy() is None:
+            return None
+        try:
+            self.ensure_fresh(db)
+        except Exception as e:
+            logger.warning("Columnar snapshot load failed: %s", e)
+            return None
+        data = self._data
+        if data is None:
+            return None
+        try:
+            answer = _Query(data, select).run()
+        except Unsupported:
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        return answer
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.available,
+            "rows": self._data.row_count if self._data is not None else None,
+            "age_seconds": time.monotonic() - self._loaded_at if self._loaded_at is not None else None,
+            "loads": self.loads,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+        }
+
+
+columnar_snapshot = ColumnarSnapshot(
+    max_rows=settings.COLUMNAR_SNAPSHOT_MAX_ROWS,
+    max_age_seconds=settings.COLUMNAR_SNAPSHOT_MAX_AGE_SECONDS,
+)
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -9,6 +10,132 @@ class Settings(BaseSettings):
     # GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+
+    # Connection pool for admin/write paths
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # create_all at startup; turn off where migrations own the schema to skip it on cold start
+    DB_CREATE_TABLES_ON_STARTUP: bool = os.getenv("DB_CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
+
+    # Separate pool for the interactive NL query path (primary and replicas)
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", "20"))
+    DB_READ_POOL_TIMEOUT: float = float(os.getenv("DB_READ_POOL_TIMEOUT", "5"))
+
+    # Read replicas (comma-separated URLs) for NL-generated read-only queries
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_SELECTION: str = os.getenv("REPLICA_SELECTION", "round_robin")  # or "least_connections"
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_LAG_CHECK_INTERVAL: float = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "10"))
+
+    # Rewrite stage between SQL generation and execution
+    SQL_REWRITE_ENABLED: bool = os.getenv("SQL_REWRITE_ENABLED", "true").lower() == "true"
+    # EXPLAIN before and after each rewrite and log the planner costs (extra round trips per query)
+    SQL_REWRITE_LOG_COSTS: bool = os.getenv("SQL_REWRITE_LOG_COSTS", "false").lower() == "true"
+
+    # Validated SQL memoized by exact text
+    SQL_VALIDATION_CACHE_SIZE: int = int(os.getenv("SQL_VALIDATION_CACHE_SIZE", "5000"))
+
+    # Bind WHERE/HAVING/ON literals as parameters; prepared statements per pooled connection (0 disables)
+    SQL_PARAMETERIZE_ENABLED: bool = os.getenv("SQL_PARAMETERIZE_ENABLED", "true").lower() == "true"
+    SQL_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("SQL_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+
+    # Exact-question and question-template caches in front of the LLM
+    NL_CACHE_ENABLED: bool = os.getenv("NL_CACHE_ENABLED", "true").lower() == "true"
+    NL_CACHE_SIZE: int = int(os.getenv("NL_CACHE_SIZE", "1000"))
+    NL_CACHE_TTL_SECONDS: float = float(os.getenv("NL_CACHE_TTL_SECONDS", "3600"))
+
+    # Distinct values of low-cardinality text columns: incremental top-up, periodic full reload
+    VALUE_INDEX_REFRESH_SECONDS: float = float(os.getenv("VALUE_INDEX_REFRESH_SECONDS", "30"))
+    VALUE_INDEX_FULL_REFRESH_SECONDS: float = float(os.getenv("VALUE_INDEX_FULL_REFRESH_SECONDS", "600"))
+    VALUE_INDEX_MAX_VALUES: int = int(os.getenv("VALUE_INDEX_MAX_VALUES", "200"))
+    VALUE_INDEX_FUZZY_CUTOFF: float = float(os.getenv("VALUE_INDEX_FUZZY_CUTOFF", "0.8"))
+
+    # Per class/section marks aggregates maintained on insert; simple aggregates read from them
+    STUDENT_STATS_ENABLED: bool = os.getenv("STUDENT_STATS_ENABLED", "true").lower() == "true"
+
+    # Optional NumPy snapshot of students answering simple queries in-process
+    COLUMNAR_SNAPSHOT_ENABLED: bool = os.getenv("COLUMNAR_SNAPSHOT_ENABLED", "false").lower() == "true"
+    COLUMNAR_SNAPSHOT_MAX_ROWS: int = int(os.getenv("COLUMNAR_SNAPSHOT_MAX_ROWS", "1000000"))
+    COLUMNAR_SNAPSHOT_MAX_AGE_SECONDS: float = float(os.getenv("COLUMNAR_SNAPSHOT_MAX_AGE_SECONDS", "60"))
+
+    # Background health checks behind /health, /count and /ollama-status
+    HEALTH_MONITOR_ENABLED: bool = os.getenv("HEALTH_MONITOR_ENABLED", "true").lower() == "true"
+    HEALTH_MONITOR_INTERVAL_SECONDS: float = float(os.getenv("HEALTH_MONITOR_INTERVAL_SECONDS", "5"))
+    HEALTH_MONITOR_STALE_AFTER_SECONDS: float = float(os.getenv("HEALTH_MONITOR_STALE_AFTER_SECONDS", "30"))
+
+    # /students/ ETags: how often to re-check the table for writes made by other processes
+    STUDENTS_ETAG_SYNC_SECONDS: float = float(os.getenv("STUDENTS_ETAG_SYNC_SECONDS", "1"))
+
+    # Coalesce concurrent /students/create calls into one multi-row INSERT ... RETURNING
+    WRITE_COALESCE_ENABLED: bool = os.getenv("WRITE_COALESCE_ENABLED", "false").lower() == "true"
+    WRITE_COALESCE_WINDOW_MS: float = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "5"))
+    WRITE_COALESCE_MAX_BATCH: int = int(os.getenv("WRITE_COALESCE_MAX_BATCH", "100"))
+
+    # Bulk ingestion: rows per transaction, and row errors listed per batch report
+    BULK_LOAD_BATCH_SIZE: int = int(os.getenv("BULK_LOAD_BATCH_SIZE", "5000"))
+    BULK_LOAD_MAX_ERRORS_PER_BATCH: int = int(os.getenv("BULK_LOAD_MAX_ERRORS_PER_BATCH", "100"))
+
+    # Index recommendations from the predicates and sort keys of executed queries
+    INDEX_ADVISOR_ENABLED: bool = os.getenv("INDEX_ADVISOR_ENABLED", "true").lower() == "true"
+    INDEX_ADVISOR_MIN_QUERIES: int = int(os.getenv("INDEX_ADVISOR_MIN_QUERIES", "10"))
+    INDEX_ADVISOR_MAX_CANDIDATES: int = int(os.getenv("INDEX_ADVISOR_MAX_CANDIDATES", "500"))
+
+    # Required in X-Admin-Key for the /admin endpoints (empty disables them)
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
+
+    # /query/batch: LLM calls in flight across all batches (match Ollama's OLLAMA_NUM_PARALLEL),
+    # worker threads per batch, and questions accepted per request
+    BATCH_QUERY_GENERATION_CONCURRENCY: int = int(os.getenv("BATCH_QUERY_GENERATION_CONCURRENCY", "4"))
+    BATCH_QUERY_MAX_WORKERS: int = int(os.getenv("BATCH_QUERY_MAX_WORKERS", "8"))
+    BATCH_QUERY_MAX_QUESTIONS: int = int(os.getenv("BATCH_QUERY_MAX_QUESTIONS", "500"))
+
+    # Job API: worker threads, queued jobs accepted, and how long finished results are kept
+    JOBS_MAX_WORKERS: int = int(os.getenv("JOBS_MAX_WORKERS", "4"))
+    JOBS_MAX_QUEUED: int = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+    JOBS_RESULT_TTL_SECONDS: float = float(os.getenv("JOBS_RESULT_TTL_SECONDS", "600"))
+    JOBS_MAX_RESULTS: int = int(os.getenv("JOBS_MAX_RESULTS", "1000"))
+
+    # Conversation sessions: sessions kept, idle eviction, turns remembered, and the longest
+    # refined (CTE-wrapped) SQL before a follow-up is generated from scratch instead
+    CONVERSATION_MAX_SESSIONS: int = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+    CONVERSATION_IDLE_SECONDS: float = float(os.getenv("CONVERSATION_IDLE_SECONDS", "1800"))
+    CONVERSATION_MAX_TURNS: int = int(os.getenv("CONVERSATION_MAX_TURNS", "20"))
+    CONVERSATION_MAX_SQL_CHARS: int = int(os.getenv("CONVERSATION_MAX_SQL_CHARS", "4000"))
+
+    # Cache tier for generated SQL: "memory" (per process) or "sqlite" (per-process L1 over a
+    # SQLite file shared by all workers on the host, with invalidation across them). The file's
+    # directory is created private to the app's user; keep it out of shared directories like /tmp
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_L2_PATH: str = os.getenv("CACHE_L2_PATH", os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "nl2sql", "cache.sqlite"
+    ))
+    CACHE_L2_MAX_ENTRIES: int = int(os.getenv("CACHE_L2_MAX_ENTRIES", "100000"))
+
+    # Logging for the app package; per-request detail is logged at DEBUG. LOG_FORMAT: text or json
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+
+    # Per-stage timings in a Server-Timing header and Prometheus histograms on /metrics
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Ollama calls kept for /metrics/llm token and timing rollups (0 keeps none), and the
+    # model load time at or above which a call counts as a cold load
+    LLM_TELEMETRY_MAX_CALLS: int = int(os.getenv("LLM_TELEMETRY_MAX_CALLS", "10000"))
+    LLM_COLD_LOAD_SECONDS: float = float(os.getenv("LLM_COLD_LOAD_SECONDS", "0.5"))
+
+    # Opt-in per-request profiling (X-Profile: collapsed|pstats, with ADMIN_API_KEY in X-Admin-Key):
+    # where artifacts go, how many are kept, and the sampling interval for collapsed stacks
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "nl2sql_profiles"))
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", "50"))
+    PROFILING_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "1"))
+
+    # Recently generated SQL kept for /query/export by sql_id
+    GENERATED_SQL_STORE_SIZE: int = int(os.getenv("GENERATED_SQL_STORE_SIZE", "1000"))
     
     class Config:
         env_file = ".env"
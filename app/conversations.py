@@ -0,0 +1,188 @@
+"""
+Server-side conversation sessions for follow-up questions.
+
+A session remembers its recent turns (question, SQL, result columns). A
+follow-up such as "now only section A" or "sort those by marks" is answered
+by refining the previous query: the model gets a short prompt with that
+query and its columns and writes a SELECT over it, which is run as
+
+    WITH previous AS (<previous SQL>) <refinement>
+
+If the refinement doesn't validate or run, or the nested SQL would grow past
+``max_sql_chars``, the question is generated from scratch with the previous
+question as context.
+
+Sessions live in an LRU with an idle TTL that every access renews; the
+oldest are evicted beyond ``max_sessions``.
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import crud, query_pipeline
+from app.cache import LRUCache
+from app.config import settings
+from app.ollama_service import OllamaService
+from app.sql_store import generated_sql_store
+
+logger = logging.getLogger(__name__)
+
+
+# Opening words of a refinement, or a pronoun pointing at the last answer in a position
+# where it can't belong to a standalone question ("show them ...", "which of those ...",
+# "... instead"); bare words such as "above" or "the same" are too common to count
+_FOLLOW_UP = re.compile(
+    r"^\s*(now|only|just|and|but|also|then|sort|order|filter|limit|exclude|include|"
+    r"what about|how about|same)\b"
+    r"|^\s*\w+\s+(those|them|these|that list)\b"
+    r"|\b(of|from|among)\s+(those|them|these|that list|the previous (results?|list|answer))\b"
+    r"|\b(those|them|these|instead)\s*[?.!]?\s*$",
+    re.IGNORECASE,
+)
+_REFERENCES_PREVIOUS = re.compile(r"\bprevious\b", re.IGNORECASE)
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether the question reads as a refinement of the last answer"""
+    return bool(_FOLLOW_UP.search(question))
+
+
+def compose_sql(previous_sql: str, refinement: str) -> str:
+    """Run a refinement over the previous query, unless it stands on its own"""
+    if _REFERENCES_PREVIOUS.search(refinement) and not refinement.lstrip().upper().startswith("WITH"):
+        return f"WITH previous AS ({previous_sql}) {refinement}"
+    return refinement
+
+
+@dataclass
+class Turn:
+    question: str
+    sql: str
+    columns: List[str]
+    row_count: int
+    refined: bool
+
+
+@dataclass
+class Conversation:
+    id: str
+    max_turns: int = 20
+    created_at: float = field(default_factory=time.time)
+    turns: deque = field(init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.turns = deque(maxlen=self.max_turns)
+
+    @property
+    def last(self) -> Optional[Turn]:
+        return self.turns[-1] if self.turns else None
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "created_at": self.created_at,
+            "turns": [
+                {"question": t.question, "sql_query": t.sql, "columns": t.columns,
+                 "row_count": t.row_count, "refined": t.refined}
+                for t in self.turns
+            ],
+        }
+
+
+class ConversationStore:
+    def __init__(self, max_sessions: int = 1000, idle_seconds: float = 1800.0,
+                 max_turns: int = 20, max_sql_chars: int = 4000):
+        self.max_turns = max_turns
+        self.max_sql_chars = max_sql_chars
+        self._sessions = LRUCache(max_entries=max_sessions, ttl_seconds=idle_seconds)
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "questions": 0, "refined": 0, "refine_fallbacks": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def create(self) -> Conversation:
+        conversation = Conversation(id=uuid.uuid4().hex, max_turns=self.max_turns)
+        self._sessions.set(conversation.id, conversation)
+        self._count("created")
+        return conversation
+
+    def get(self, session_id: str) -> Optional[Conversation]:
+        conversation = self._sessions.get(session_id)
+        if conversation is not None:
+            self._sessions.set(session_id, conversation)  # renews the idle TTL
+        return conversation
+
+    def delete(self, session_id: str):
+        self._sessions.delete(session_id)
+
+    def _refine(self, db: Session, last: Turn, question: str, service: OllamaService):
+        refinement = service.refine_sql(last.sql, last.columns, question)
+        sql_query = compose_sql(last.sql, refinement)
+        if len(sql_query) > self.max_sql_chars:
+            raise ValueError("Refined query too long")
+        # A savepoint, so a refinement that fails to run leaves the session usable for the fallback
+        with db.begin_nested():
+            columns, rows = crud.execute_sql_query(db, sql_query, with_columns=True)
+        return sql_query, columns, rows
+
+    def ask(self, conversation: Conversation, db: Session, question: str,
+            service: OllamaService, refine: Optional[bool] = None) -> dict:
+        """
+        Answer ``question`` in the conversation. ``refine`` forces (True) or
+        prevents (False) refining the last query; by default follow-up
+        phrasing decides.
+        """
+        with conversation.lock:
+            self._count("questions")
+            last = conversation.last
+            follow_up = last is not None and (is_follow_up(question) if refine is None else refine)
+            refined = False
+            if follow_up:
+                try:
+                    sql_query, columns, rows = self._refine(db, last, question, service)
+                    refined = True
+                    self._count("refined")
+                except Exception as e:
+                    logger.info("Refinement failed, generating from scratch: %s", e)
+                    self._count("refine_fallbacks")
+            if not refined:
+                # A follow-up generated from scratch still needs the question it follows
+                standalone = f"{last.question}; then: {question}" if follow_up else question
+                query, columns, rows = query_pipeline.answer(db, standalone, service)
+                sql_query = query.sql
+
+            conversation.turns.append(Turn(question, sql_query, columns, len(rows), refined))
+            return {
+                "session_id": conversation.id,
+                "turn": len(conversation.turns),
+                "refined": refined,
+                "sql_query": sql_query,
+                "sql_id": generated_sql_store.add(sql_query),
+                "columns": columns,
+                "result": rows,
+                "row_count": len(rows),
+                "model_used": service.model,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions), "max_sessions": self._sessions.max_entries,
+                    "idle_seconds": self._sessions.ttl_seconds}
+
+
+conversation_store = ConversationStore(
+    max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+    idle_seconds=settings.CONVERSATION_IDLE_SECONDS,
+    max_turns=settings.CONVERSATION_MAX_TURNS,
+    max_sql_chars=settings.CONVERSATION_MAX_SQL_CHARS,
+)
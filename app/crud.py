@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text 
-from app import models, schemas
+from app import models, schemas, student_stats
 from typing import List, Optional
-import re
+import time
+from app.sql_validator import sql_validator
+from app.sql_params import execute_parameterized, parameterize
+from app.config import settings
+from app.columnar import columnar_snapshot
+from app.index_advisor import index_advisor
+from app.pagination import students_changes
+from app.timing import stage
 
 def create_student(db: Session, student: schemas.StudentCreate):
     db_student = models.Student(
@@ -12,38 +19,92 @@ def create_student(db: Session, student: schemas.StudentCreate):
         marks=student.marks
     )
     db.add(db_student)
+    if settings.STUDENT_STATS_ENABLED:
+        student_stats.record_students(db, [(student.class_name, student.section, student.marks)])
     db.commit()
+    columnar_snapshot.invalidate()
+    students_changes.bump()
     db.refresh(db_student)
     return db_student
 
-def get_students(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Student).offset(skip).limit(limit).all()
+def get_students(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Students in id order. With ``after_id`` (keyset pagination) the page starts
+    right after that id, which stays fast however deep the page is.
+    """
+    query = db.query(models.Student).order_by(models.Student.id)
+    if after_id is not None:
+        query = query.filter(models.Student.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def validate_sql_query(sql_query: str) -> str:
+    """
+    Check the query is a single read-only SELECT and return it ready to execute
+    """
+    return sql_validator.validate(sql_query).sql
 
-def execute_sql_query(db: Session, sql_query: str):
+def execute_sql_query(db: Session, sql_query: str, with_columns: bool = False):
     """
-    Execute raw SQL query safely with SQLAlchemy text() wrapper
+    Execute raw SQL query safely with SQLAlchemy text() wrapper.
+    With ``with_columns`` returns (column names, rows) instead of rows.
     """
     try:
-        sql_query = sql_query.strip()
-        
-        query_upper = sql_query.upper()
+        with stage("validate"):
+            validated = sql_validator.validate(sql_query)
+        sql_query = validated.sql
         
-        if not query_upper.startswith('SELECT'):
-            raise ValueError("Only SELECT queries are allowed for security reasons")
+        if settings.COLUMNAR_SNAPSHOT_ENABLED:
+            with stage("execute"):
+                answer = columnar_snapshot.execute(db, validated.ast)
+            if answer is not None:
+                return answer if with_columns else answer[1]
         
-        forbidden_keywords = ['DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'UPDATE', 'INSERT']
-        for keyword in forbidden_keywords:
-            if keyword in query_upper:
-                raise ValueError(f"Query contains forbidden keyword: {keyword}")
+        start = time.perf_counter()
+        with stage("execute"):
+            if settings.SQL_PARAMETERIZE_ENABLED:
+                result = execute_parameterized(db, sql_query)
+            else:
+                result = db.execute(text(sql_query))
+            columns = list(result.keys())
+            rows = result.fetchall()
         
-        if sql_query.endswith(';'):
-            sql_query = sql_query[:-1]
-        
-        result = db.execute(text(sql_query))
-        rows = result.fetchall()
+        if settings.INDEX_ADVISOR_ENABLED:
+            index_advisor.observe(validated.ast, sql_query, (time.perf_counter() - start) * 1000)
         
         # Convert to list of tuples
-        return [tuple(row) for row in rows]
+        rows = [tuple(row) for row in rows]
+        return (columns, rows) if with_columns else rows
         
+    except ValueError:
+        raise
     except Exception as e:
-        raise Exception(f"Error executing query: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error executing query: {str(e)}")
+
+def stream_sql_query(db: Session, sql_query: str, batch_size: int = 10000):
+    """
+    Execute a validated SELECT on a server-side cursor.
+    Returns (column names, iterator over row batches) without materializing the result.
+    """
+    sql_query = validate_sql_query(sql_query)
+    statement = text(sql_query)
+    if settings.SQL_PARAMETERIZE_ENABLED:
+        # Server-side cursors can't EXECUTE a prepared statement; bind only
+        query = parameterize(sql_query)
+        statement = text(query.sql).bindparams(**query.params)
+    
+    result = db.execute(
+        statement,
+        execution_options={"stream_results": True, "yield_per": batch_size}
+    )
+    columns = list(result.keys())
+    
+    def batches():
+        try:
+            for partition in result.partitions(batch_size):
+                yield [tuple(row) for row in partition]
+        finally:
+            result.close()
+    
+    return columns, batches()
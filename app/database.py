@@ -1,12 +1,111 @@
+import threading
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.pool_metrics import InstrumentedQueuePool, instrument_engine
+from app.replicas import ReplicaRouter, parse_replica_urls
 
-# Create PostgreSQL engine
-engine = create_engine(settings.DATABASE_URL)
+def create_pooled_engine(url: str, name: str, pool_size: int, max_overflow: int, pool_timeout: float):
+    """
+    Create an engine with the configured pool settings and pool instrumentation
+    """
+    if url.startswith("sqlite"):
+        # SQLite uses its own single-connection/file pools; only instrument them
+        engine = create_engine(url)
+    else:
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    instrument_engine(engine, name)
+    return engine
+
+# Engines are created on first use rather than at import, so importing the app
+# (and every cold start) doesn't pay for driver imports and pool setup up front
+_resources = {}
+_resources_lock = threading.RLock()
+
+def _resource(name: str, factory):
+    with _resources_lock:
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
+
+def get_engine() -> Engine:
+    """PostgreSQL engine (admin/write paths)"""
+    return _resource("engine", lambda: create_pooled_engine(
+        settings.DATABASE_URL,
+        "primary",
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    ))
+
+def get_read_engine() -> Engine:
+    """
+    Interactive NL query path gets its own pool so it can't starve writes
+    (a second SQLite engine could point at a different in-memory database)
+    """
+    if settings.DATABASE_URL.startswith("sqlite"):
+        return get_engine()
+    return _resource("read_engine", lambda: create_pooled_engine(
+        settings.DATABASE_URL,
+        "primary-read",
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW,
+        pool_timeout=settings.DB_READ_POOL_TIMEOUT,
+    ))
+
+def get_replica_router() -> ReplicaRouter:
+    """Optional read replicas for the NL query path"""
+    return _resource("replica_router", lambda: ReplicaRouter.from_urls(
+        parse_replica_urls(settings.DATABASE_REPLICA_URLS),
+        engine_factory=lambda url, index: create_pooled_engine(
+            url,
+            f"replica-{index}",
+            pool_size=settings.DB_READ_POOL_SIZE,
+            max_overflow=settings.DB_READ_MAX_OVERFLOW,
+            pool_timeout=settings.DB_READ_POOL_TIMEOUT,
+        ),
+        strategy=settings.REPLICA_SELECTION,
+        max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+        lag_check_interval=settings.REPLICA_LAG_CHECK_INTERVAL,
+    ))
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker that binds to ``engine_factory()`` when the first session is opened"""
+
+    def __init__(self, engine_factory, **kw):
+        super().__init__(**kw)
+        self.engine_factory = engine_factory
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_factory())
+        return super().__call__(**local_kw)
+
+SessionLocal = LazySessionmaker(get_engine, autocommit=False, autoflush=False)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = LazySessionmaker(get_read_engine, autocommit=False, autoflush=False)
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "read_engine": get_read_engine,
+    "replica_router": get_replica_router,
+}
+
+def __getattr__(name):
+    # ``from app.database import engine`` keeps working; the engine is created on access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
@@ -14,8 +113,28 @@ def get_db():
     """
     Database dependency for FastAPI
     """
-    db = SessionLocal()
-    try:
+    with SessionLocal() as db:
+        yield db
+
+def get_read_session_factory():
+    """
+    Where read-only sessions come from: a healthy replica if one is configured,
+    otherwise the primary's read pool. A dependency for endpoints that open
+    several sessions, e.g. one per worker thread.
+    """
+    return get_replica_router().session_factory() or ReadSessionLocal
+
+def get_read_db():
+    """
+    Read-only database dependency
+    """
+    with get_read_session_factory()() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+def init_db():
+    """
+    Create missing tables. Runs at startup (DB_CREATE_TABLES_ON_STARTUP) or
+    from seed_database.py, never on import.
+    """
+    from app import models  # noqa: F401  registers the tables on Base.metadata
+    Base.metadata.create_all(bind=get_engine())
@@ -0,0 +1,132 @@
+import datetime
+import decimal
+import json
+from typing import Any, List, Optional, Sequence
+
+from fastapi.responses import Response
+
+from app.lazy_import import optional_module
+
+pa = None  # Arrow IPC output is optional; imported by _pyarrow() on first use
+
+
+def _pyarrow():
+    global pa
+    if pa is None:
+        pa = optional_module("pyarrow")
+    return pa
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+RESULT_FORMATS = ("rows", "rows-fast", "columnar")
+
+_PYTHON_TYPE_NAMES = (
+    (bool, "boolean"),
+    (int, "integer"),
+    (float, "float"),
+    (decimal.Decimal, "numeric"),
+    (str, "string"),
+    (datetime.datetime, "timestamp"),
+    (datetime.date, "date"),
+    (datetime.time, "time"),
+    (bytes, "binary"),
+)
+
+
+def _type_name(value: Any) -> str:
+    for python_type, name in _PYTHON_TYPE_NAMES:
+        if isinstance(value, python_type):
+            return name
+    return "unknown"
+
+
+def infer_column_types(rows: Sequence[tuple], column_count: int) -> List[str]:
+    """Type of each column, taken from its first non-null value"""
+    types = ["null"] * column_count
+    missing = set(range(column_count))
+    for row in rows:
+        for index in list(missing):
+            if row[index] is not None:
+                types[index] = _type_name(row[index])
+                missing.discard(index)
+        if not missing:
+            break
+    return types
+
+
+def to_columnar(columns: List[str], rows: Sequence[tuple]) -> dict:
+    """Column names and types once, then one array per column"""
+    types = infer_column_types(rows, len(columns))
+    data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    return {
+        "columns": [{"name": name, "type": type_name} for name, type_name in zip(columns, types)],
+        "data": data,
+    }
+
+
+def _json_default(value: Any):
+    # Matches fastapi.encoders.jsonable_encoder for the types a query can return
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+
+
+def fast_json_response(payload: dict) -> Response:
+    """Serialize directly with json, skipping per-row pydantic validation"""
+    return Response(content=dumps(payload), media_type="application/json")
+
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    return bool(accept) and ARROW_STREAM_MEDIA_TYPE in accept
+
+
+def arrow_ipc_bytes(columns: List[str], rows: Sequence[tuple], metadata: Optional[dict] = None) -> bytes:
+    """Encode the result as an Arrow IPC stream; metadata goes in the schema"""
+    if _pyarrow() is None:
+        raise ValueError("Arrow output requires the 'pyarrow' package")
+
+    arrays = [pa.array(list(values)) for values in zip(*rows)] if rows else [pa.array([]) for _ in columns]
+    table = pa.Table.from_arrays(arrays, names=list(columns))
+    if metadata:
+        table = table.replace_schema_metadata({key: str(value) for key, value in metadata.items()})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_sql_response(payload: dict, columns: List[str], rows: List[tuple],
+                        result_format: str = "rows", accept: Optional[str] = None):
+    """
+    Build the /query/ response in the requested encoding.
+
+    ``payload`` holds the scalar fields (sql_query, explanation, ...). The
+    default "rows" format returns a plain dict validated by SQLResponse;
+    the other formats bypass response_model validation entirely.
+    """
+    if wants_arrow(accept):
+        return Response(
+            content=arrow_ipc_bytes(columns, rows, metadata=payload),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+        )
+
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}. Use one of {', '.join(RESULT_FORMATS)}")
+
+    if result_format == "columnar":
+        return fast_json_response({**payload, "format": "columnar", "result": None, **to_columnar(columns, rows)})
+
+    if result_format == "rows-fast":
+        return fast_json_response({**payload, "format": "rows", "result": rows})
+
+    return {**payload, "result": rows}
@@ -0,0 +1,141 @@
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, List
+
+from app.lazy_import import optional_module
+
+# Parquet export is optional; imported by parquet_available() on first use
+pa = None
+pq = None
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    global pa, pq
+    if pq is None:
+        pq = optional_module("pyarrow.parquet")
+        pa = optional_module("pyarrow")
+    return pq is not None
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream chunk by chunk"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_stream(columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Header row, then one encoded chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_schema(columns: List[str], rows: List[tuple]):
+    arrays = [pa.array(list(values)) for values in zip(*rows)]
+    # A column that is all NULL in the first row group has no usable type yet
+    return pa.schema([
+        pa.field(name, pa.string() if array.type == pa.null() else array.type)
+        for name, array in zip(columns, arrays)
+    ])
+
+
+def _arrow_table(rows: List[tuple], schema):
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if field.type == pa.string():
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(list(values), type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def parquet_stream(columns: List[str], batches: Iterable[List[tuple]],
+                   row_group_size: int = 100000, compression: str = "snappy") -> Iterator[bytes]:
+    """
+    Parquet file written one row group at a time; at most ``row_group_size``
+    rows are held in memory.
+    """
+    if not parquet_available():
+        raise ValueError("Parquet export requires the 'pyarrow' package")
+
+    sink = _ChunkSink()
+    writer = None
+    pending: List[tuple] = []
+
+    def flush_row_group():
+        nonlocal writer
+        if writer is None:
+            writer = pq.ParquetWriter(sink, _arrow_schema(columns, pending), compression=compression)
+        writer.write_table(_arrow_table(pending, writer.schema))
+        pending.clear()
+
+    for batch in batches:
+        pending.extend(batch)
+        while len(pending) >= row_group_size:
+            overflow = pending[row_group_size:]
+            del pending[row_group_size:]
+            flush_row_group()
+            pending.extend(overflow)
+            yield sink.drain()
+
+    if pending:
+        flush_row_group()
+    elif writer is None:
+        # Empty result: still a valid file with the column names
+        empty_schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+        writer = pq.ParquetWriter(sink, empty_schema, compression=compression)
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(columns: List[str], batches: Iterable[List[tuple]], export_format: str = "csv",
+                  gzip: bool = False, row_group_size: int = 100000) -> Iterator[bytes]:
+    if export_format == "parquet":
+        # Parquet compresses internally; gzip selects the page codec instead
+        return parquet_stream(columns, batches, row_group_size, compression="gzip" if gzip else "snappy")
+
+    stream = csv_stream(columns, batches)
+    return gzip_stream(stream) if gzip else stream
+
+
+def export_filename(export_format: str, gzip: bool) -> str:
+    if export_format == "parquet":
+        return "export.parquet"
+    return "export.csv.gz" if gzip else "export.csv"
@@ -0,0 +1,214 @@
+"""
+Background health monitor.
+
+A daemon thread re-checks the database, the student count and Ollama every
+``interval_seconds`` and keeps the result as a snapshot, so /health, /count
+and /ollama-status answer probes from memory instead of doing live work per
+request. Each snapshot records when it was taken; one older than
+``stale_after_seconds`` is reported as stale (the monitor is stuck or the
+checks are hanging). ``check`` runs the same checks live, for deep probes.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import student_stats
+from app.config import settings
+from app.database import ReadSessionLocal
+from app.pagination import students_changes
+
+logger = logging.getLogger(__name__)
+
+
+def count_students(db: Session) -> int:
+    if settings.STUDENT_STATS_ENABLED:
+        return student_stats.total_students(db)
+    return db.execute(text("SELECT COUNT(*) FROM students")).scalar()
+
+
+def check_database(db: Session) -> dict:
+    start = time.perf_counter()
+    try:
+        db.execute(text("SELECT 1"))
+        version = students_changes.version()
+        count = count_students(db)
+        status = "connected"
+    except Exception as e:
+        version, count, status = None, None, f"error: {e}"
+    return {
+        "status": status,
+        "student_count": count,
+        "students_version": version,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def check_ollama(base_url: str, timeout: float = 3.0) -> dict:
+    start = time.perf_counter()
+    try:
+        response = requests.get(f"{base_url}/api/tags", timeout=timeout)
+        if response.status_code == 200:
+            models = [m["name"] for m in response.json().get("models", [])]
+            status, message = "connected", None
+        else:
+            models, status, message = [], "error", f"HTTP {response.status_code}"
+    except Exception as e:
+        models, status, message = [], "not_connected", str(e)
+    return {
+        "status": status,
+        "models": models,
+        "message": message,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        ollama_base_url: str,
+        interval_seconds: float = 5.0,
+        stale_after_seconds: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.ollama_base_url = ollama_base_url
+        self.interval_seconds = interval_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self._snapshot: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+
+    def _check_database(self, db: Optional[Session]) -> dict:
+        if db is not None:
+            return check_database(db)
+        with self.session_factory() as own_session:
+            return check_database(own_session)
+
+    def check(self, db: Optional[Session] = None) -> dict:
+        """Run every check now"""
+        return {
+            "database": self._check_database(db),
+            "ollama": check_ollama(self.ollama_base_url),
+            "checked_at": time.time(),
+        }
+
+    def refresh(self) -> dict:
+        database = self._check_database(None)
+        with self._lock:
+            if self._snapshot is None:
+                # Publish the database result right away on the first round, so
+                # probes during a cold start don't wait for a slow Ollama
+                self._snapshot = {
+                    "database": database,
+                    "ollama": {"status": "unknown", "models": [], "message": "not checked yet", "duration_ms": None},
+                    "checked_at": time.time(),
+                }
+        snapshot = {
+            "database": database,
+            "ollama": check_ollama(self.ollama_base_url),
+            "checked_at": time.time(),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self.refreshes += 1
+        return snapshot
+
+    def update_student_count(self, count: int, version: str):
+        """Fold a live count read by a request into the snapshot"""
+        with self._lock:
+            if self._snapshot is not None:
+                database = dict(self._snapshot["database"], student_count=count, students_version=version)
+                self._snapshot = dict(self._snapshot, database=database)
+
+    def snapshot(self) -> Optional[dict]:
+        """Latest snapshot with its age, or None before the first check completes"""
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        age = time.time() - snapshot["checked_at"]
+        return dict(snapshot, age_seconds=round(age, 3), stale=age > self.stale_after_seconds)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Health monitor check failed: %s", e)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+
+class StartupChecks:
+    """
+    One-off checks run concurrently in background threads at startup, so a
+    slow or unreachable dependency doesn't delay serving. Results are kept
+    for /health.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, dict] = {}
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def start(self, checks: Dict[str, Callable[[], Any]]):
+        if not checks:
+            return
+        executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="startup-check")
+        with self._lock:
+            for name in checks:
+                self._results[name] = {"status": "running"}
+        self._futures = [executor.submit(self._run, name, check) for name, check in checks.items()]
+        executor.shutdown(wait=False)
+
+    def _run(self, name: str, check: Callable[[], Any]):
+        start = time.perf_counter()
+        try:
+            status = "failed" if check() is False else "ok"
+        except Exception as e:
+            status = f"error: {e}"
+        with self._lock:
+            self._results[name] = {"status": status, "duration_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True once every check has finished"""
+        _, pending = wait(self._futures, timeout=timeout)
+        return not pending
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: dict(result) for name, result in self._results.items()}
+
+
+startup_checks = StartupChecks()
+
+health_monitor = HealthMonitor(
+    session_factory=ReadSessionLocal,
+    ollama_base_url=settings.OLLAMA_BASE_URL,
+    interval_seconds=settings.HEALTH_MONITOR_INTERVAL_SECONDS,
+    stale_after_seconds=settings.HEALTH_MONITOR_STALE_AFTER_SECONDS,
+)
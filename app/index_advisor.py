@@ -0,0 +1,274 @@
+"""
+Index advisor fed by the predicates and sort keys of executed generated SQL.
+
+Every query executed through ``crud.execute_sql_query`` is reduced to the
+index it could use: equality columns first (in a stable order), then at most
+one range or sort column. Candidates are aggregated by frequency and observed
+execution time. Recommendations estimate each candidate's benefit by
+comparing plans with and without a hypothetical index (PostgreSQL with the
+HypoPG extension), or from column selectivity when that isn't available.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.sql_parser import (
+    Between, Binary, Column, InList, OrderItem, Select, Table, conjuncts, walk,
+)
+
+logger = logging.getLogger(__name__)
+
+
+_EQUALITY_OPS = {"="}
+_RANGE_OPS = {"<", "<=", ">", ">="}
+_MAX_SAMPLES = 5
+
+
+@dataclass
+class CandidateStats:
+    table: str
+    columns: Tuple[str, ...]
+    count: int = 0
+    total_ms: float = 0.0
+    samples: List[str] = field(default_factory=list)
+    status: Optional[str] = None  # None, "pending", "creating", "created" or "failed: ..."
+
+    @property
+    def name(self) -> str:
+        return f"ix_{self.table}_{'_'.join(self.columns)}"
+
+    @property
+    def ddl(self) -> str:
+        return f"CREATE INDEX {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+
+def _table_columns(select: Select, tables: Optional[set] = None) -> Optional[Tuple[str, set]]:
+    """(table, qualifiers) when the query reads a single plain table, and it is one of ``tables``"""
+    table = select.from_
+    if not isinstance(table, Table) or select.joins or select.ctes:
+        return None  # FROM may name a CTE, which has no indexes
+    if tables is not None and table.name.lower() not in tables:
+        return None
+    return table.name.lower(), {None, table.name.lower(), table.alias}
+
+
+def _column(node, qualifiers: set) -> Optional[str]:
+    if isinstance(node, Column) and node.table in qualifiers:
+        return node.name.lower()
+    return None
+
+
+def _is_constant(node) -> bool:
+    return not any(isinstance(n, Column) for n in walk(node))
+
+
+def index_candidate(select: Select, tables: Optional[set] = None) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """(table, columns) of the index that would serve this query best, if any"""
+    found = _table_columns(select, tables)
+    if found is None:
+        return None
+    table, qualifiers = found
+
+    equality, ranges = [], []
+    for term in conjuncts(select.where):
+        if isinstance(term, Binary) and term.op in _EQUALITY_OPS | _RANGE_OPS:
+            for side, other in ((term.left, term.right), (term.right, term.left)):
+                name = _column(side, qualifiers)
+                if name and _is_constant(other):
+                    (equality if term.op in _EQUALITY_OPS else ranges).append(name)
+        elif isinstance(term, InList) and not term.negated:
+            name = _column(term.expr, qualifiers)
+            if name:
+                equality.append(name)
+        elif isinstance(term, Between) and not term.negated:
+            name = _column(term.expr, qualifiers)
+            if name:
+                ranges.append(name)
+
+    sort = [_column(item.expr, qualifiers) for item in select.order_by if isinstance(item, OrderItem)]
+    sort = [name for name in sort if name]
+
+    columns = sorted(set(equality))
+    trailing = next((name for name in ranges + sort if name not in columns), None)
+    if trailing:
+        columns.append(trailing)
+    if not columns:
+        return None
+    return table, tuple(columns)
+
+
+class IndexAdvisor:
+    def __init__(self, max_candidates: int = 500, min_queries: int = 10, tables: Optional[set] = None):
+        self.max_candidates = max_candidates
+        self.min_queries = min_queries
+        self.tables = tables  # known table names; None accepts any
+        self._candidates: Dict[Tuple[str, Tuple[str, ...]], CandidateStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, select: Optional[Select], sql: str, duration_ms: float):
+        """Record the index candidate of an executed query"""
+        if select is None:
+            return
+        candidate = index_candidate(select, self.tables)
+        if candidate is None:
+            return
+        with self._lock:
+            stats = self._candidates.get(candidate)
+            if stats is None:
+                if len(self._candidates) >= self.max_candidates:
+                    return
+                stats = self._candidates[candidate] = CandidateStats(*candidate)
+            stats.count += 1
+            stats.total_ms += duration_ms
+            if len(stats.samples) < _MAX_SAMPLES and sql not in stats.samples:
+                stats.samples.append(sql)
+
+    def candidates(self) -> List[CandidateStats]:
+        with self._lock:
+            return sorted(self._candidates.values(), key=lambda c: c.total_ms, reverse=True)
+
+    def get(self, name: str) -> Optional[CandidateStats]:
+        return next((c for c in self.candidates() if c.name == name), None)
+
+    def reset(self):
+        with self._lock:
+            self._candidates.clear()
+
+    # -- recommendations -----------------------------------------------------
+
+    @staticmethod
+    def existing_indexes(db: Session, table: str) -> List[Tuple[str, ...]]:
+        inspector = inspect(db.get_bind())
+        indexes = [tuple(c.lower() for c in index["column_names"] if c) for index in inspector.get_indexes(table)]
+        primary_key = inspector.get_pk_constraint(table).get("constrained_columns") or []
+        if primary_key:
+            indexes.append(tuple(c.lower() for c in primary_key))
+        return indexes
+
+    @staticmethod
+    def _covered(columns: Tuple[str, ...], existing: List[Tuple[str, ...]]) -> bool:
+        # An index whose leading columns are the candidate already serves it
+        return any(index[:len(columns)] == columns for index in existing)
+
+    @staticmethod
+    def _hypopg_available(db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        try:
+            return bool(db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")).scalar())
+        except Exception:
+            db.rollback()
+            return False
+
+    @staticmethod
+    def _hypothetical_estimate(db: Session, candidate: CandidateStats) -> Optional[dict]:
+        from app.sql_rewriter import estimate_cost
+        try:
+            before = [estimate_cost(db, sql) for sql in candidate.samples]
+            db.execute(text("SELECT * FROM hypopg_create_index(:ddl)"), {"ddl": candidate.ddl})
+            after = [estimate_cost(db, sql) for sql in candidate.samples]
+        except Exception as e:
+            # Leave the aborted transaction so the reset below can run; fall back to selectivity
+            logger.warning("Hypothetical index %s failed: %s", candidate.name, e)
+            db.rollback()
+            return None
+        finally:
+            db.execute(text("SELECT hypopg_reset()"))
+        pairs = [(b, a) for b, a in zip(before, after) if b is not None and a is not None]
+        if not pairs:
+            return None
+        cost_before = sum(b for b, _ in pairs) / len(pairs)
+        cost_after = sum(a for _, a in pairs) / len(pairs)
+        return {"method": "hypopg", "cost_before": cost_before, "cost_after": cost_after}
+
+    @staticmethod
+    def _selectivity_estimate(db: Session, candidate: CandidateStats) -> dict:
+        # Rows read without the index vs. rows matching one value of each key column
+        rows = db.execute(text(f"SELECT COUNT(*) FROM {candidate.table}")).scalar() or 0
+        matching = float(rows)
+        for column in candidate.columns:
+            distinct = db.execute(text(f"SELECT COUNT(DISTINCT {column}) FROM {candidate.table}")).scalar() or 1
+            matching /= distinct
+        return {"method": "selectivity", "cost_before": float(rows), "cost_after": max(matching, 1.0)}
+
+    def recommendations(self, db: Session, limit: int = 10) -> List[dict]:
+        """Candidates seen at least ``min_queries`` times that no index covers, best first"""
+        existing_by_table: Dict[str, List[Tuple[str, ...]]] = {}
+        hypopg = self._hypopg_available(db)
+        recommendations = []
+        for candidate in self.candidates():
+            if candidate.count < self.min_queries:
+                continue
+            if candidate.table not in existing_by_table:
+                existing_by_table[candidate.table] = self.existing_indexes(db, candidate.table)
+            if self._covered(candidate.columns, existing_by_table[candidate.table]) and candidate.status != "created":
+                continue
+
+            estimate = self._hypothetical_estimate(db, candidate) if hypopg else None
+            estimate = estimate or self._selectivity_estimate(db, candidate)
+            before, after = estimate["cost_before"], estimate["cost_after"]
+            improvement = (before - after) / before if before else 0.0
+            if improvement <= 0 and candidate.status is None:
+                continue
+            recommendations.append({
+                "name": candidate.name,
+                "table": candidate.table,
+                "columns": list(candidate.columns),
+                "ddl": candidate.ddl,
+                "queries": candidate.count,
+                "total_ms": round(candidate.total_ms, 2),
+                "avg_ms": round(candidate.total_ms / candidate.count, 3),
+                "estimate_method": estimate["method"],
+                "cost_before": before,
+                "cost_after": after,
+                "estimated_improvement": round(improvement, 4),
+                # Observed time that the index would have saved at the estimated improvement
+                "estimated_benefit_ms": round(candidate.total_ms * improvement, 2),
+                "status": candidate.status,
+                "sample_queries": list(candidate.samples),
+            })
+        recommendations.sort(key=lambda r: r["estimated_benefit_ms"], reverse=True)
+        return recommendations[:limit]
+
+    # -- applying ------------------------------------------------------------
+
+    def apply(self, engine: Engine, candidate: CandidateStats):
+        """
+        Create the index. On PostgreSQL this uses CREATE INDEX CONCURRENTLY, which
+        can't run in a transaction, so it goes through an autocommit connection.
+        """
+        candidate.status = "creating"
+        concurrently = engine.dialect.name == "postgresql"
+        ddl = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{candidate.name} ON {candidate.table} ({', '.join(candidate.columns)})"
+        )
+        start = time.perf_counter()
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(ddl))
+        except Exception as e:
+            candidate.status = f"failed: {e}"
+            logger.warning("Index %s failed: %s", candidate.name, e)
+            return
+        candidate.status = "created"
+        logger.info("Created index %s in %.2fs", candidate.name, time.perf_counter() - start)
+
+
+def _create_advisor() -> IndexAdvisor:
+    from app.models import Base
+    return IndexAdvisor(
+        max_candidates=settings.INDEX_ADVISOR_MAX_CANDIDATES,
+        min_queries=settings.INDEX_ADVISOR_MIN_QUERIES,
+        tables={name.lower() for name in Base.metadata.tables},
+    )
+
+
+index_advisor = _create_advisor()
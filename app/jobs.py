@@ -0,0 +1,228 @@
+"""
+Asynchronous jobs for questions that may outlast a gateway timeout.
+
+A job is submitted, answered on a worker pool through the same pipeline as
+/query/batch (sharing its Ollama slots), and its result kept for
+``result_ttl_seconds`` after it finishes. Clients poll (optionally
+long-polling with ``wait``) or subscribe to the job's events. Cancelling a
+queued job drops it; cancelling a running one stops its Ollama stream or
+interrupts its query, so the slot and the connection are released.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.batch_query import BatchQueryRunner, batch_query_runner
+from app.cache import LRUCache
+from app.cancellation import CancelToken
+from app.config import settings
+from app.database import get_read_session_factory
+from app.ollama_service import OllamaService, ollama_service
+from app.query_stream import sse_event
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class QueueFull(Exception):
+    """No room for another queued job"""
+
+
+@dataclass
+class Job:
+    id: str
+    question: str
+    model: Optional[str] = None
+    explain: bool = True
+    status: str = "queued"  # then running, and one of FINISHED_STATUSES
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    cancel: CancelToken = field(default_factory=CancelToken, repr=False)
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        def ms(start, end):
+            return round((end - start) * 1000, 3) if start is not None and end is not None else None
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "question": self.question,
+            "model": self.model,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_ms": ms(self.created_at, self.started_at or self.finished_at),
+            "run_ms": ms(self.started_at, self.finished_at),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        runner: BatchQueryRunner = batch_query_runner,
+        max_workers: int = 4,
+        max_queued: int = 100,
+        result_ttl_seconds: float = 600.0,
+        max_results: int = 1000,
+        max_samples: int = 1000,
+    ):
+        # None: the read session factory (replica or read pool) at the time each job runs
+        self.session_factory = session_factory
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._active: Dict[str, Job] = {}
+        self._finished = LRUCache(max_entries=max_results, ttl_seconds=result_ttl_seconds)
+        self._queue_samples = deque(maxlen=max_samples)
+        self._run_samples = deque(maxlen=max_samples)
+        self._counts = {"submitted": 0, "rejected": 0, **{status: 0 for status in FINISHED_STATUSES}}
+
+    def _queued(self) -> int:
+        return sum(1 for job in self._active.values() if job.status == "queued")
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._queued()
+
+    def submit(self, question: str, model: Optional[str] = None, explain: bool = True) -> Job:
+        job = Job(id=uuid.uuid4().hex, question=question, model=model, explain=explain)
+        with self._lock:
+            if self._queued() >= self.max_queued:
+                self._counts["rejected"] += 1
+                raise QueueFull(f"{self.max_queued} jobs already queued")
+            self._active[job.id] = job
+            self._counts["submitted"] += 1
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._active.get(job_id)
+        return job or self._finished.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, "cancelled")
+        return job
+
+    def _run(self, job: Job):
+        with self._lock:
+            cancelled = job.cancel.is_set()
+            if not cancelled:
+                job.status = "running"
+                job.started_at = time.time()
+        if cancelled:
+            # Cancelled after the worker picked it up, too late for future.cancel()
+            self._finish(job, "cancelled")
+            return
+        service = OllamaService(model=job.model) if job.model else ollama_service
+        item = self.runner.answer(
+            self.session_factory or get_read_session_factory(), job.question, service,
+            explain=job.explain, cancel=job.cancel
+        )
+        status = item.pop("status")
+        if status == "ok":
+            self._finish(job, "succeeded", result=item)
+        elif status == "cancelled":
+            self._finish(job, "cancelled")
+        else:
+            self._finish(job, "failed", error=item.get("error"))
+
+    def _finish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            if job.finished:
+                return
+            job.status, job.result, job.error = status, result, error
+            job.finished_at = time.time()
+            self._finished.set(job.id, job)
+            self._active.pop(job.id, None)
+            self._counts[status] += 1
+            if job.started_at is not None:
+                self._queue_samples.append(job.started_at - job.created_at)
+                self._run_samples.append(job.finished_at - job.started_at)
+        job.done.set()
+
+    @staticmethod
+    def _latency(samples: List[float]) -> dict:
+        ordered = sorted(samples)
+
+        def percentile(fraction):
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000 if ordered else 0.0
+        return {"count": len(ordered), "p50": percentile(0.50), "p99": percentile(0.99),
+                "max": ordered[-1] * 1000 if ordered else 0.0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._active.values()]
+            queue_samples, run_samples = list(self._queue_samples), list(self._run_samples)
+            counts = dict(self._counts)
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "stored_results": len(self._finished),
+            **counts,
+            "queue_wait_ms": self._latency(queue_samples),
+            "run_ms": self._latency(run_samples),
+        }
+
+    def shutdown(self):
+        """Cancel everything still queued or running"""
+        with self._lock:
+            active = list(self._active)
+        for job_id in active:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def job_events(request: Request, job: Job, keepalive_seconds: float = 15.0) -> AsyncIterator[bytes]:
+    """SSE: a status event now and on each change, then the finished job as "result"."""
+    last_status, last_sent = None, time.monotonic()
+    while True:
+        if job.status != last_status:
+            last_status = job.status
+            if job.finished:
+                yield sse_event("result", job.to_dict())
+                return
+            yield sse_event("status", {"job_id": job.id, "status": job.status})
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= keepalive_seconds:
+            yield b": keepalive\n\n"
+            last_sent = time.monotonic()
+        if await request.is_disconnected():
+            return
+        # Wakes on completion; the timeout catches queued -> running
+        await run_in_threadpool(job.done.wait, 1.0)
+
+
+job_queue = JobQueue(
+    max_workers=settings.JOBS_MAX_WORKERS,
+    max_queued=settings.JOBS_MAX_QUEUED,
+    result_ttl_seconds=settings.JOBS_RESULT_TTL_SECONDS,
+    max_results=settings.JOBS_MAX_RESULTS,
+)
@@ -0,0 +1,18 @@
+"""
+Optional dependencies imported on first use.
+
+NumPy and pyarrow each add tens of milliseconds to importing the app, which
+is on the critical path of every cold start, while most requests never
+touch them.
+"""
+import importlib
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def optional_module(name: str):
+    """The imported module, or None if it isn't installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
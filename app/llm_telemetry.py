@@ -0,0 +1,158 @@
+"""
+Per-call Ollama telemetry and rollups for sizing hardware and tuning prompts.
+
+Every /api/generate response ends with counters the SQL and explanation
+paths used to throw away:
+
+    prompt_eval_count, prompt_eval_duration   prompt tokens evaluated, and how long
+    eval_count, eval_duration                 output tokens generated, and how long
+    load_duration                             time spent loading the model
+    total_duration                            the whole call, server side
+
+Durations are in nanoseconds. Each call is kept as an ``LLMCall`` in a
+bounded ring (the newest ``max_calls``) and rolled up on demand by model
+and by prompt version. A prompt version is a short hash of the prompt
+template, so editing a prompt starts a new version without anyone bumping
+a number. A call whose load took at least ``cold_load_seconds`` counts as a
+cold load; a warm model reports a few milliseconds.
+
+Prompt tokens can be far fewer than the prompt's length when Ollama reuses
+the cached prefix of the previous prompt, which the shared schema prompt
+makes common.
+"""
+import hashlib
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from app.config import settings
+
+_NANOSECONDS = 1e9
+
+
+@lru_cache(maxsize=64)
+def prompt_version(template: str) -> str:
+    return hashlib.sha1(template.encode()).hexdigest()[:10]
+
+
+@dataclass
+class LLMCall:
+    model: str
+    kind: str  # generate_sql, refine_sql, explain
+    prompt_version: str
+    ok: bool = True
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    load_seconds: float = 0.0
+    prompt_eval_seconds: float = 0.0
+    eval_seconds: float = 0.0
+    total_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_response(cls, model: str, kind: str, prompt_version: str, data: dict,
+                      wall_seconds: float) -> "LLMCall":
+        """From the final (done) object of an /api/generate response"""
+        return cls(
+            model=model,
+            kind=kind,
+            prompt_version=prompt_version,
+            prompt_tokens=data.get("prompt_eval_count") or 0,
+            output_tokens=data.get("eval_count") or 0,
+            load_seconds=(data.get("load_duration") or 0) / _NANOSECONDS,
+            prompt_eval_seconds=(data.get("prompt_eval_duration") or 0) / _NANOSECONDS,
+            eval_seconds=(data.get("eval_duration") or 0) / _NANOSECONDS,
+            total_seconds=(data.get("total_duration") or 0) / _NANOSECONDS,
+            wall_seconds=wall_seconds,
+        )
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def _per_second(tokens: int, seconds: float) -> Optional[float]:
+    return tokens / seconds if seconds > 0 else None
+
+
+class LLMTelemetry:
+    def __init__(self, max_calls: int = 10000, cold_load_seconds: float = 0.5):
+        self.cold_load_seconds = cold_load_seconds
+        self._calls = deque(maxlen=max_calls)
+        self._lock = threading.Lock()
+
+    @property
+    def max_calls(self) -> int:
+        return self._calls.maxlen
+
+    def record(self, call: LLMCall):
+        with self._lock:
+            self._calls.append(call)
+
+    def record_response(self, model: str, kind: str, template: str, data: dict, wall_seconds: float):
+        self.record(LLMCall.from_response(model, kind, prompt_version(template), data, wall_seconds))
+
+    def record_error(self, model: str, kind: str, template: str, wall_seconds: float):
+        self.record(LLMCall(model=model, kind=kind, prompt_version=prompt_version(template),
+                            ok=False, wall_seconds=wall_seconds))
+
+    def calls(self, since: Optional[float] = None) -> List[LLMCall]:
+        with self._lock:
+            calls = list(self._calls)
+        return calls if since is None else [call for call in calls if call.at >= since]
+
+    def _summarize(self, calls: List[LLMCall]) -> dict:
+        ok = [call for call in calls if call.ok]
+        prompt_tokens = sum(call.prompt_tokens for call in ok)
+        output_tokens = sum(call.output_tokens for call in ok)
+        loads = [call.load_seconds for call in ok]
+        durations = sorted(call.total_seconds for call in ok)
+        return {
+            "calls": len(calls),
+            "errors": len(calls) - len(ok),
+            "prompt_tokens": {"total": prompt_tokens, "avg": prompt_tokens / len(ok) if ok else 0.0},
+            "output_tokens": {"total": output_tokens, "avg": output_tokens / len(ok) if ok else 0.0},
+            "prompt_tokens_per_second": _per_second(prompt_tokens, sum(call.prompt_eval_seconds for call in ok)),
+            "output_tokens_per_second": _per_second(output_tokens, sum(call.eval_seconds for call in ok)),
+            "load_seconds": {"avg": sum(loads) / len(loads) if loads else 0.0, "max": max(loads, default=0.0)},
+            "cold_loads": sum(1 for load in loads if load >= self.cold_load_seconds),
+            "duration_ms": {
+                "p50": _percentile(durations, 0.50) * 1000,
+                "p99": _percentile(durations, 0.99) * 1000,
+            },
+        }
+
+    def rollup(self, by: Sequence[str], since: Optional[float] = None) -> List[dict]:
+        """One summary per distinct value of the ``by`` fields, busiest first"""
+        groups: Dict[tuple, List[LLMCall]] = {}
+        for call in self.calls(since):
+            groups.setdefault(tuple(getattr(call, name) for name in by), []).append(call)
+        rows = [{**dict(zip(by, key)), **self._summarize(calls)} for key, calls in groups.items()]
+        return sorted(rows, key=lambda row: row["calls"], reverse=True)
+
+    def stats(self, since_seconds: Optional[float] = None, recent: int = 0) -> dict:
+        since = time.time() - since_seconds if since_seconds else None
+        calls = self.calls(since)
+        data = {
+            "max_calls": self.max_calls,
+            "calls": len(calls),
+            "oldest_at": calls[0].at if calls else None,
+            "cold_load_seconds": self.cold_load_seconds,
+            "by_model": self.rollup(("model",), since),
+            "by_prompt_version": self.rollup(("model", "kind", "prompt_version"), since),
+        }
+        if recent:
+            data["recent"] = [asdict(call) for call in calls[-recent:]]
+        return data
+
+
+llm_telemetry = LLMTelemetry(
+    max_calls=settings.LLM_TELEMETRY_MAX_CALLS,
+    cold_load_seconds=settings.LLM_COLD_LOAD_SECONDS,
+)
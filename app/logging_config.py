@@ -0,0 +1,46 @@
+"""
+Logging for the ``app`` package.
+
+Modules log through ``logging.getLogger(__name__)``. Per-request detail
+(the question, generated SQL, row counts, Ollama latency) is logged at
+DEBUG with %-style arguments, so at the default INFO level it costs a level
+check and nothing is formatted. LOG_FORMAT=json writes one JSON object per
+line including any ``extra={...}`` fields.
+"""
+import json
+import logging
+import time
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def configure_logging(level: str = "INFO", log_format: str = "text"):
+    """
+    Set the ``app`` logger's level. A handler is added to the root logger
+    only if nothing (uvicorn --log-config, a test runner) configured one.
+    """
+    logging.getLogger("app").setLevel(level.upper())
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
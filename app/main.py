@@ -1,42 +1,79 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Header, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 from typing import List, Optional
+import json
+import logging
+import os
 
-from app import schemas, crud, models
-from app.database import engine, get_db
+from app import schemas, crud
+from app.database import (
+    SessionLocal, get_db, get_read_db, get_read_session_factory, get_engine, get_replica_router, init_db
+)
 # from app.gemini_service import gemini_service
 from app.ollama_service import ollama_service
+from app import pool_metrics, encoding, export, student_stats, bulk_load, batch_query, query_stream, query_pipeline
+from app.sql_store import generated_sql_store
+from app.sql_validator import sql_validator
+from app.sql_params import plan_cache_stats
+from app.nl_cache import nl_query_cache
+from app.columnar import columnar_snapshot
+from app.index_advisor import index_advisor
+from app.write_coalescer import write_coalescer
+from app.batch_query import batch_query_runner
+from app.jobs import job_queue, job_events, QueueFull
+from app.conversations import conversation_store
+from app.llm_telemetry import llm_telemetry
+from app.pagination import students_changes, encode_cursor, decode_cursor
+from app.health import health_monitor, startup_checks, check_ollama, count_students
+from app.metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.timing import TimingMiddleware, stage, label
+from app.logging_config import configure_logging
+from app.profiling import ProfiledRoute, ProfilingMiddleware, profile_store, authorized as profiling_authorized
+from app.config import settings
 
-# Creating database tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="Natural Language to SQL API (Ollama)",
-    description="Convert natural language questions to SQL queries using Ollama LLM",
-    version="2.0.0"
-)
+logger = logging.getLogger(__name__)
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Sync endpoints join a profiled request's profile in their worker thread
+router = APIRouter(route_class=ProfiledRoute if settings.PROFILING_ENABLED else APIRoute)
 
-@app.on_event("startup")
-async def startup_event():
-    """Check Ollama connection on startup"""
-    print("Checking Ollama connection...")
+def _check_ollama() -> bool:
+    logger.info("Checking Ollama connection...")
     if ollama_service.test_connection():
-        print("Ollama connected successfully!")
-    else:
-        print("Warning: Ollama not connected. /query endpoint may fail.")
+        logger.info("Ollama connected successfully!")
+        return True
+    logger.warning("Ollama not connected. /query endpoint may fail.")
+    return False
+
+def _verify_student_stats():
+    with SessionLocal() as db:
+        student_stats.ensure_consistent(db)
 
-@app.get("/")
+def startup_event():
+    """
+    Create missing tables if configured, then start the Ollama and
+    student_stats checks in the background; serving doesn't wait for them
+    """
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        init_db()
+    
+    checks = {"ollama": _check_ollama}
+    if settings.STUDENT_STATS_ENABLED:
+        checks["student_stats"] = _verify_student_stats
+    startup_checks.start(checks)
+    
+    if settings.HEALTH_MONITOR_ENABLED:
+        health_monitor.start()
+
+def shutdown_event():
+    health_monitor.stop()
+    job_queue.shutdown()
+
+@router.get("/")
 def read_root():
     return {
         "message": "Welcome to Natural Language to SQL API",
@@ -45,45 +82,222 @@ def read_root():
             "/": "This documentation",
             "/students/": "Get all students",
             "/students/create": "Create new student (POST)",
+            "/students/bulk": "Bulk load students from a JSON array or a streamed CSV body (POST)",
             "/query/": "Convert natural language to SQL and execute (POST)",
+            "/query/stream": "Server-Sent Events: SQL, rows and explanation as each stage completes (GET)",
+            "/query/batch": "Answer many questions concurrently, streamed as NDJSON or a JSON array (POST)",
+            "/jobs": "Submit a question as a background job (POST); GET /jobs/{id} to poll, /jobs/{id}/events to subscribe, DELETE to cancel",
+            "/sessions": "Start a conversation (POST); POST /sessions/{id}/query refines the previous query for follow-ups",
+            "/query/export": "Stream full query results as CSV or Parquet (POST)",
             "/test-sql/": "Test SQL query execution (POST)",
-            "/health": "Health check with Ollama status",
+            "/health": "Health check from the background monitor (?deep=true checks live)",
             "/count": "Get student count directly",
-            "/ollama-status": "Check Ollama connection status"
+            "/ollama-status": "Check Ollama connection status",
+            "/metrics/pool": "Connection pool metrics",
+            "/metrics/sql": "SQL validation, plan and question cache hit rates",
+            "/metrics/jobs": "Job queue depth, outcomes and latency",
+            "/metrics/llm": "Ollama tokens, tokens/sec, load time and cold loads by model and prompt version",
+            "/metrics": "Prometheus request and per-stage latency histograms",
+            "/admin/index-recommendations": "Index recommendations from observed queries; POST .../apply to create them",
+            "/admin/profiles": "Request profiles taken with X-Profile: collapsed|pstats when PROFILING_ENABLED"
         }
     }
 
-@app.get("/ollama-status")
-def get_ollama_status():
+def _monitor_snapshot(deep: bool) -> Optional[dict]:
+    """The background monitor's latest snapshot, unless a live check was asked for"""
+    if deep or not settings.HEALTH_MONITOR_ENABLED:
+        return None
+    return health_monitor.snapshot()
+
+@router.get("/ollama-status")
+def get_ollama_status(deep: bool = Query(False, description="Check Ollama now instead of using the last background check")):
     """Check Ollama connection and model info"""
+    snapshot = _monitor_snapshot(deep)
+    ollama = snapshot["ollama"] if snapshot else check_ollama(ollama_service.base_url, timeout=5)
+    freshness = {"checked_at": snapshot["checked_at"], "age_seconds": snapshot["age_seconds"]} if snapshot else {}
+    
+    if ollama["status"] == "connected":
+        return {
+            "status": "connected",
+            "models": ollama["models"],
+            "current_model": ollama_service.model,
+            "base_url": ollama_service.base_url,
+            **freshness
+        }
+    return {"status": "error", "message": ollama["message"] or "Cannot reach Ollama", **freshness}
+
+@router.get("/metrics/pool")
+def get_pool_metrics():
+    """Connection pool checkouts, wait times, in-use/idle counts, replica lag and write batching"""
+    return {
+        "pools": pool_metrics.collect(),
+        "replicas": get_replica_router().status(),
+        "write_coalescer": write_coalescer.stats()
+    }
+
+@router.get("/metrics/sql")
+def get_sql_metrics():
+    """Validation cache and prepared statement (plan cache) hit rates"""
+    return {
+        "validation_cache": sql_validator.stats(),
+        "plan_cache": plan_cache_stats.snapshot(),
+        "nl_cache": nl_query_cache.stats(),
+        "columnar_snapshot": columnar_snapshot.stats(),
+        "batch_query": batch_query_runner.stats(),
+        "conversations": conversation_store.stats()
+    }
+
+@router.get("/metrics")
+def get_prometheus_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@router.get("/metrics/llm")
+def get_llm_metrics(
+    since_seconds: Optional[float] = Query(None, gt=0, description="Only calls from the last N seconds"),
+    recent: int = Query(0, ge=0, le=1000, description="Also list the newest N calls")
+):
+    """Ollama token counts, tokens/sec, load times and cold loads per model and per prompt version"""
+    return llm_telemetry.stats(since_seconds=since_seconds, recent=recent)
+
+@router.get("/metrics/jobs")
+def get_job_metrics():
+    """Queue depth, outcome counts and queue wait / run time percentiles"""
+    return job_queue.stats()
+
+@router.get("/admin/index-recommendations")
+def get_index_recommendations(
+    limit: int = Query(10, gt=0),
+    db: Session = Depends(get_db),
+    x_admin_key: Optional[str] = Header(None)
+):
+    """Indexes that would serve frequently executed generated SQL, by estimated time saved"""
+    if not settings.ADMIN_API_KEY or x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin key required")
+    return {
+        "min_queries": index_advisor.min_queries,
+        "observed_shapes": len(index_advisor.candidates()),
+        "recommendations": index_advisor.recommendations(db, limit=limit)
+    }
+
+@router.post("/admin/index-recommendations/apply", status_code=202)
+def apply_index_recommendations(
+    request: schemas.IndexApplyRequest,
+    background_tasks: BackgroundTasks,
+    x_admin_key: Optional[str] = Header(None)
+):
+    """Create recommended indexes in the background (CONCURRENTLY on PostgreSQL)"""
+    if not settings.ADMIN_API_KEY or x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin key required")
+    candidates = [index_advisor.get(name) for name in request.names]
+    unknown = [name for name, candidate in zip(request.names, candidates) if candidate is None]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown recommendations: {', '.join(unknown)}")
+    for candidate in candidates:
+        candidate.status = "pending"
+        background_tasks.add_task(index_advisor.apply, get_engine(), candidate)
+    return {"accepted": [candidate.name for candidate in candidates]}
+
+def _require_profiling(x_admin_key: Optional[str]):
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiling_authorized(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+@router.get("/admin/profiles")
+def list_profiles(x_admin_key: Optional[str] = Header(None)):
+    """Stored request profiles, newest first"""
+    _require_profiling(x_admin_key)
+    return {"profiles": profile_store.list(), "max_files": profile_store.max_files}
+
+@router.get("/admin/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("file", description="file: the pstats or collapsed-stack artifact; text: a readable summary"),
+    x_admin_key: Optional[str] = Header(None)
+):
+    _require_profiling(x_admin_key)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(profile_store.summary(profile_id))
+    return FileResponse(profile["path"], filename=os.path.basename(profile["path"]),
+                        media_type="application/octet-stream")
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match list"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+@router.get("/students/", response_model=List[schemas.StudentResponse])
+def get_all_students(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Students in id order. Pass the previous page's ``X-Next-Cursor`` as
+    ``cursor`` for the next page. Responses carry a weak ETag; polling with
+    If-None-Match gets 304 while the table is unchanged.
+    """
     try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            return {
-                "status": "connected",
-                "models": [m["name"] for m in models],
-                "current_model": ollama_service.model,
-                "base_url": ollama_service.base_url
-            }
-        else:
-            return {"status": "error", "message": "Cannot reach Ollama"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+        after_id = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/students/", response_model=List[schemas.StudentResponse])
-def get_all_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    students = crud.get_students(db, skip=skip, limit=limit)
+    etag = f'W/"students-{students_changes.etag(db)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    students = crud.get_students(db, skip=skip, limit=limit, after_id=after_id)
+    response.headers.update(headers)
+    if limit > 0 and len(students) == limit:
+        next_cursor = encode_cursor(students[-1].id)
+        next_url = request.url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
     return students
 
-@app.post("/students/create", response_model=schemas.StudentResponse)
+@router.post("/students/create", response_model=schemas.StudentResponse)
 def create_student(student: schemas.StudentCreate, db: Session = Depends(get_db)):
+    if settings.WRITE_COALESCE_ENABLED:
+        return write_coalescer.submit(db, student)
     return crud.create_student(db=db, student=student)
 
-@app.post("/test-sql/")
-def test_sql_query(query: str, db: Session = Depends(get_db)):
+@router.post("/students/bulk")
+async def bulk_create_students(
+    request: Request,
+    batch_size: Optional[int] = Query(None, gt=0, description="Rows per transaction"),
+    db: Session = Depends(get_db)
+):
+    """
+    Load many students at once. Send a JSON array of students, or CSV with a
+    header row as ``text/csv`` (streamed, never held in memory as a whole).
+    Each batch commits on its own; the response reports every batch's errors.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/csv":
+        records = bulk_load.iter_csv_records(bulk_load.iterate_from_thread(request.stream()))
+    elif content_type in ("application/json", ""):
+        try:
+            records = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of students")
+    else:
+        raise HTTPException(status_code=415, detail="Send application/json or text/csv")
+    return await run_in_threadpool(bulk_load.load_records, db, records, batch_size)
+
+@router.post("/test-sql/")
+def test_sql_query(query: str, db: Session = Depends(get_read_db)):
     """
     Direct SQL query testing endpoint
     """
@@ -97,91 +311,315 @@ def test_sql_query(query: str, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/count")
-def get_student_count(db: Session = Depends(get_db)):
+@router.get("/count")
+def get_student_count(db: Session = Depends(get_read_db)):
     """
-    Direct endpoint to get student count
+    Direct endpoint to get student count. Answered from the health monitor's
+    snapshot unless this process has written students since it was taken.
     """
+    snapshot = _monitor_snapshot(deep=False)
+    version = students_changes.version()
+    if snapshot and not snapshot["stale"]:
+        database = snapshot["database"]
+        if database["student_count"] is not None and database["students_version"] == version:
+            return {"count": database["student_count"]}
+    
     try:
-        result = db.execute(text("SELECT COUNT(*) FROM students"))
-        count = result.scalar()
+        count = count_students(db)
+        health_monitor.update_student_count(count, version)
         return {"count": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+@router.get("/health")
+def health_check(
+    deep: bool = Query(False, description="Run every check now instead of using the last background check"),
+    db: Session = Depends(get_read_db)
+):
     """
-    Comprehensive health check
+    Comprehensive health check, from the background monitor's latest snapshot.
+    ``deep=true`` (or no snapshot yet) runs the checks live and includes timings.
     """
+    snapshot = _monitor_snapshot(deep)
+    source = "snapshot" if snapshot else "live"
+    if snapshot is None:
+        snapshot = health_monitor.check(db)
+    
+    database, ollama = snapshot["database"], snapshot["ollama"]
     health_status = {
         "api": "running",
-        "database": "unknown",
-        "ollama": "unknown",
-        "student_count": 0
+        "database": database["status"],
+        "ollama": ollama["status"],
+        "student_count": database["student_count"] or 0,
+        "source": source,
+        "checked_at": snapshot["checked_at"],
+        "age_seconds": snapshot.get("age_seconds", 0.0),
+        "stale": snapshot.get("stale", False),
+        "startup_checks": startup_checks.status()
     }
-    
-    try:
-        db.execute(text("SELECT 1"))
-        health_status["database"] = "connected"
-        
-        result = db.execute(text("SELECT COUNT(*) FROM students"))
-        health_status["student_count"] = result.scalar()
-        
-    except Exception as e:
-        health_status["database"] = f"error: {str(e)}"
-    
-    # Check Ollama
-    try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=3)
-        if response.status_code == 200:
-            health_status["ollama"] = "connected"
-        else:
-            health_status["ollama"] = "error"
-    except:
-        health_status["ollama"] = "not_connected"
-    
+    if source == "live":
+        health_status["checks"] = {"database": database, "ollama": ollama}
     return health_status
 
-@app.post("/query/", response_model=schemas.SQLResponse)
+@router.post("/query/", response_model=schemas.SQLResponse)
 def natural_language_to_sql(
     query: schemas.NLQuery, 
-    db: Session = Depends(get_db),
-    model: Optional[str] = Query(None, description="Optional: Specify Ollama model to use")
+    db: Session = Depends(get_read_db),
+    model: Optional[str] = Query(None, description="Optional: Specify Ollama model to use"),
+    format: str = Query("rows", description="Result encoding: rows, rows-fast or columnar"),
+    accept: Optional[str] = Header(None, description="application/vnd.apache.arrow.stream for Arrow IPC")
 ):
 
     try:
-        print(f"Processing question: {query.question}")
+        logger.debug("Processing question: %s", query.question)
         
         if model:
             # Use specified model
             from app.ollama_service import OllamaService
-            temp_service = OllamaService(model=model)
-            sql_query = temp_service.generate_sql(query.question)
+            service = OllamaService(model=model)
         else:
-            sql_query = ollama_service.generate_sql(query.question)
+            service = ollama_service
         
-        print(f"Generated SQL: {sql_query}")
+        prepared = query_pipeline.prepare(db, query.question, service)
+        label(model=service.model,
+              cache=(prepared.cache_kind or "miss") if settings.NL_CACHE_ENABLED else "disabled")
+        if prepared.cache_hit:
+            logger.debug("SQL from %s cache: %s", prepared.cache_kind, prepared.generated_sql)
         
-        result = crud.execute_sql_query(db, sql_query)
-        print(f"Query returned {len(result)} rows")
+        columns, result = query_pipeline.execute(db, prepared)
+        sql_query = prepared.sql
+        logger.debug("Query returned %d rows", len(result))
         
-        if model:
-            explanation = temp_service.explain_query(sql_query, result)
-        else:
-            explanation = ollama_service.explain_query(sql_query, result)
+        with stage("explain"):
+            explanation = service.explain_query(sql_query, result)
         
-        return {
-            "sql_query": sql_query,
-            "result": result,
-            "explanation": explanation,
-            "row_count": len(result),
-            "model_used": model or ollama_service.model
-        }
+        with stage("serialize"):
+            response = encoding.encode_sql_response(
+                {
+                    "sql_query": sql_query,
+                    "explanation": explanation,
+                    "row_count": len(result),
+                    "model_used": service.model,
+                    "sql_id": generated_sql_store.add(sql_query),
+                    "fingerprint": sql_validator.validate(sql_query).fingerprint,
+                    "cache": prepared.cache_kind
+                },
+                columns,
+                result,
+                result_format=format,
+                accept=accept
+            )
+            if isinstance(response, dict):
+                # Rendered here, as response_model would after returning, so the time counts as this stage
+                response = JSONResponse(jsonable_encoder(schemas.SQLResponse.model_validate(response)))
+        return response
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error details: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
\ No newline at end of file
+        logger.exception("Error processing query")
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+@router.get("/query/stream")
+async def stream_natural_language_to_sql(
+    request: Request,
+    question: str = Query(..., min_length=1),
+    model: Optional[str] = Query(None, description="Optional: Specify Ollama model to use"),
+    explain: bool = Query(True, description="Stream an explanation after the rows"),
+    chunk_size: int = Query(500, gt=0, le=10000, description="Rows per rows event"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    /query/ as Server-Sent Events: the SQL, then the rows, then the
+    explanation are each sent as soon as their stage completes
+    """
+    if model:
+        from app.ollama_service import OllamaService
+        service = OllamaService(model=model)
+    else:
+        service = ollama_service
+    return StreamingResponse(
+        query_stream.query_events(request, db, question, service, chunk_size=chunk_size, explain=explain),
+        media_type=query_stream.EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query/batch")
+def batch_natural_language_to_sql(
+    batch: schemas.BatchQuery,
+    session_factory=Depends(get_read_session_factory),
+    format: str = Query("ndjson", description="ndjson: one line per question as it completes; json: array in question order")
+):
+    """
+    Answer a list of questions concurrently. Each item carries its own status
+    ("ok", "invalid" or "error"), so one bad question doesn't fail the batch
+    """
+    if len(batch.questions) > settings.BATCH_QUERY_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_QUERY_MAX_QUESTIONS} questions per batch"
+        )
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="Unknown format: use ndjson or json")
+
+    items = batch_query_runner.run(session_factory, batch.questions, model=batch.model, explain=batch.explain)
+    if format == "json":
+        return StreamingResponse(batch_query.json_array_stream(batch_query.ordered(items)), media_type="application/json")
+    return StreamingResponse(batch_query.ndjson_stream(items), media_type=batch_query.NDJSON_MEDIA_TYPE)
+
+def _get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return job
+
+@router.post("/jobs", status_code=202)
+def submit_job(request: schemas.JobCreate, response: Response):
+    """Queue a question and return its job id right away"""
+    try:
+        job = job_queue.submit(request.question, model=request.model, explain=request.explain)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the job to finish")):
+    job = _get_job(job_id)
+    if wait and not job.finished:
+        job.done.wait(wait)
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+def subscribe_job(job_id: str, request: Request):
+    """Server-Sent Events: status changes, then the finished job as a result event"""
+    job = _get_job(job_id)
+    return StreamingResponse(
+        job_events(request, job),
+        media_type=query_stream.EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job; a finished one is returned unchanged"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return job.to_dict()
+
+def _get_conversation(session_id: str):
+    conversation = conversation_store.get(session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return conversation
+
+@router.post("/sessions", status_code=201)
+def create_session():
+    return conversation_store.create().to_dict()
+
+@router.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    return _get_conversation(session_id).to_dict()
+
+@router.delete("/sessions/{session_id}", status_code=204)
+def delete_session(session_id: str):
+    conversation_store.delete(session_id)
+    return Response(status_code=204)
+
+@router.post("/sessions/{session_id}/query")
+def session_query(session_id: str, query: schemas.SessionQuery, db: Session = Depends(get_read_db)):
+    """
+    Ask within a conversation. Follow-ups ("now only section A", "sort those
+    by marks") edit the previous query instead of regenerating it
+    """
+    conversation = _get_conversation(session_id)
+    if query.model:
+        from app.ollama_service import OllamaService
+        service = OllamaService(model=query.model)
+    else:
+        service = ollama_service
+    try:
+        return conversation_store.ask(conversation, db, query.question, service, refine=query.refine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Error processing session query")
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+@router.post("/query/export")
+def export_query_results(request: schemas.ExportRequest, db: Session = Depends(get_read_db)):
+    """
+    Stream the full result of a question (or a previously generated sql_id)
+    as CSV or Parquet, reading from a server-side cursor in batches
+    """
+    if request.sql_id:
+        sql_query = generated_sql_store.get(request.sql_id)
+        if sql_query is None:
+            raise HTTPException(status_code=404, detail=f"Unknown sql_id: {request.sql_id}")
+    elif request.question:
+        try:
+            sql_query = query_pipeline.prepare(db, request.question, ollama_service).sql
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+        generated_sql_store.add(sql_query)
+    else:
+        raise HTTPException(status_code=400, detail="Provide either a question or a sql_id")
+
+    if request.format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires the 'pyarrow' package")
+
+    try:
+        columns, batches = crud.stream_sql_query(db, sql_query, batch_size=request.batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error executing query: {str(e)}")
+
+    filename = export.export_filename(request.format, request.gzip)
+    return StreamingResponse(
+        export.export_stream(
+            columns,
+            batches,
+            export_format=request.format,
+            gzip=request.gzip,
+            row_group_size=request.row_group_size
+        ),
+        media_type=export.MEDIA_TYPES[request.format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-SQL-Id": generated_sql_store.make_id(sql_query)
+        }
+    )
+
+def create_app() -> FastAPI:
+    """
+    Build the application. Nothing here touches the database or Ollama;
+    engines are created on first use and startup checks run in the background.
+    """
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+    
+    application = FastAPI(
+        title="Natural Language to SQL API (Ollama)",
+        description="Convert natural language questions to SQL queries using Ollama LLM",
+        version="2.0.0"
+    )
+    
+    # Add CORS middleware
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    if settings.PROFILING_ENABLED:
+        application.add_middleware(ProfilingMiddleware)
+    if settings.METRICS_ENABLED:
+        application.add_middleware(TimingMiddleware)
+    application.include_router(router)
+    application.add_event_handler("startup", startup_event)
+    application.add_event_handler("shutdown", shutdown_event)
+    return application
+
+app = create_app()
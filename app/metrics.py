@@ -0,0 +1,113 @@
+"""
+Prometheus histograms and the text exposition format served on /metrics.
+
+Kept to what the app needs (labelled histograms) rather than depending on
+prometheus_client. Every worker process keeps its own series; scrape each
+worker, or aggregate with the usual sum by (le) across instances.
+"""
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# From 0.5 ms (cache lookups, validation) to 30 s (a slow LLM call)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """
+    A histogram with a fixed set of label names. Label sets beyond
+    ``max_series`` are dropped (and counted) so a user-chosen label such as
+    the model name can't grow the output without bound.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 1000):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.max_series = max_series
+        self.dropped = 0
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (last is +Inf)..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    self.dropped += 1
+                    return
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> Dict[Tuple[str, ...], dict]:
+        """Per label set: cumulative bucket counts, count and sum"""
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        result = {}
+        for key, values in series.items():
+            cumulative, running = [], 0
+            for count in values[:-1]:
+                running += count
+                cumulative.append(running)
+            result[key] = {"buckets": cumulative, "count": running, "sum": values[-1]}
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = self.buckets + (float("inf"),)
+        for key, sample in sorted(self.samples().items()):
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(bounds, sample["buckets"]):
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_number(sample['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {sample['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Histogram] = []
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "nl2sql_stage_duration_seconds",
+    "Time spent in each stage of answering a question",
+    ("stage", "model", "cache"),
+)
+request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response is sent",
+    ("method", "route", "status"),
+)
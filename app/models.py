@@ -11,4 +11,19 @@ class Student(Base):
     marks = Column(Integer, nullable=False)
     
     def __repr__(self):
-        return f"<Student(name='{self.name}', class='{self.class_name}', marks={self.marks})>"
\ No newline at end of file
+        return f"<Student(name='{self.name}', class='{self.class_name}', marks={self.marks})>"
+
+
+class StudentStats(Base):
+    """Per class/section aggregates of marks, maintained alongside students"""
+    __tablename__ = "student_stats"
+    
+    class_name = Column(String(50), primary_key=True)
+    section = Column(String(10), primary_key=True)
+    student_count = Column(Integer, nullable=False, default=0)
+    marks_sum = Column(Integer, nullable=False, default=0)
+    marks_min = Column(Integer, nullable=True)
+    marks_max = Column(Integer, nullable=True)
+    
+    def __repr__(self):
+        return f"<StudentStats(class='{self.class_name}', section='{self.section}', count={self.student_count})>"
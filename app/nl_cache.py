@@ -0,0 +1,172 @@
+"""
+Caches that answer a question without calling the LLM.
+
+* exact: normalized question text -> generated SQL
+* template: question with entity values masked ("average marks in {class_name}
+  class") -> SQL with those values as slots; a new question of the same shape
+  is answered by filling in its own values.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.cache import make_cache
+from app.config import settings
+from app.sql_parser import SQLSyntaxError, tokenize
+from app.value_index import Mention, ValueIndex, value_index
+
+
+@dataclass(frozen=True)
+class SQLTemplate:
+    fragments: Tuple[str, ...]   # SQL text around the slots, len(slots) + 1 pieces
+    slots: Tuple[int, ...]       # index of the question mention filling each slot
+
+    def fill(self, values: List[str]) -> str:
+        parts = [self.fragments[0]]
+        for slot, fragment in zip(self.slots, self.fragments[1:]):
+            parts.append("'" + values[slot].replace("'", "''") + "'")
+            parts.append(fragment)
+        return "".join(parts)
+
+    def to_json(self) -> dict:
+        return {"fragments": list(self.fragments), "slots": list(self.slots)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "SQLTemplate":
+        return cls(tuple(data["fragments"]), tuple(data["slots"]))
+
+
+@dataclass(frozen=True)
+class CacheHit:
+    sql: str
+    kind: str  # "exact" or "template"
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+
+def question_shape(question: str, mentions: List[Mention]) -> str:
+    parts = []
+    last = 0
+    for mention in mentions:
+        parts.append(question[last:mention.start])
+        parts.append("{" + mention.column + "}")
+        last = mention.end
+    parts.append(question[last:])
+    return "".join(parts)
+
+
+def build_template(sql: str, mentions: List[Mention]) -> Optional[SQLTemplate]:
+    """
+    Turn generated SQL into a template whose slots are the string literals
+    equal to the question's mentions. Returns None when any mention is missing
+    from the SQL or a literal can't be attributed to exactly one mention.
+    """
+    try:
+        tokens = tokenize(sql)
+    except SQLSyntaxError:
+        return None
+
+    by_value = {}
+    for index, mention in enumerate(mentions):
+        if mention.value in by_value:
+            return None  # same value mentioned twice: ambiguous slot
+        by_value[mention.value] = index
+
+    fragments = []
+    slots = []
+    used = set()
+    last = 0
+    for token in tokens:
+        if token.kind != "string":
+            continue
+        value = token.value[1:-1].replace("''", "'")
+        if value not in by_value:
+            continue
+        fragments.append(sql[last:token.pos])
+        slots.append(by_value[value])
+        used.add(by_value[value])
+        last = token.pos + len(token.value)
+    fragments.append(sql[last:])
+
+    if not mentions or len(used) != len(mentions):
+        return None
+    return SQLTemplate(tuple(fragments), tuple(slots))
+
+
+class QueryCache:
+    def __init__(self, index: ValueIndex, max_entries: int = 1000, ttl_seconds: Optional[float] = None):
+        self.index = index
+        self._exact = make_cache("nl_exact", max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._templates = make_cache("nl_templates", max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                     encode=SQLTemplate.to_json, decode=SQLTemplate.from_json)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.template_hits = 0
+        self.misses = 0
+        self.templates_stored = 0
+
+    def lookup(self, question: str, model: str) -> Optional[CacheHit]:
+        normalized = normalize_question(question)
+        sql = self._exact.get((model, normalized))
+        if sql is not None:
+            self._count("exact_hits")
+            return CacheHit(sql, "exact")
+
+        mentions = self.index.find_mentions(normalized)
+        if mentions:
+            template = self._templates.get((model, question_shape(normalized, mentions)))
+            if template is not None:
+                sql = template.fill([mention.value for mention in mentions])
+                self._exact.set((model, normalized), sql)
+                self._count("template_hits")
+                return CacheHit(sql, "template")
+
+        self._count("misses")
+        return None
+
+    def store(self, question: str, model: str, sql: str):
+        """Remember SQL that was generated for a question and executed successfully"""
+        normalized = normalize_question(question)
+        self._exact.set((model, normalized), sql)
+
+        mentions = self.index.find_mentions(normalized)
+        template = build_template(sql, mentions) if mentions else None
+        if template is not None:
+            self._templates.set((model, question_shape(normalized, mentions)), template)
+            self._count("templates_stored")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        self._exact.clear()
+        self._templates.clear()
+        with self._lock:
+            self.exact_hits = self.template_hits = self.misses = self.templates_stored = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.template_hits + self.misses
+            return {
+                "lookups": lookups,
+                "exact_hits": self.exact_hits,
+                "template_hits": self.template_hits,
+                "misses": self.misses,
+                "exact_hit_rate": self.exact_hits / lookups if lookups else 0.0,
+                "template_hit_rate": self.template_hits / lookups if lookups else 0.0,
+                "exact_entries": len(self._exact),
+                "templates": len(self._templates),
+                "templates_stored": self.templates_stored,
+                "backend": self._exact.stats(),
+            }
+
+
+nl_query_cache = QueryCache(
+    value_index,
+    max_entries=settings.NL_CACHE_SIZE,
+    ttl_seconds=settings.NL_CACHE_TTL_SECONDS or None
+)
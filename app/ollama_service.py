@@ -1,8 +1,16 @@
 import requests
 import json
-from typing import List, Optional
+from typing import Iterator, List, Optional
+import logging
 import time
+from contextlib import contextmanager
+from app.cancellation import CancelToken, Cancelled
 from app.config import settings
+from app.llm_telemetry import llm_telemetry
+from app.timing import stage
+from app.value_index import value_index
+
+logger = logging.getLogger(__name__)
 
 class OllamaService:
     def __init__(self, model: Optional[str] = None):
@@ -49,17 +57,64 @@ SQL: SELECT * FROM students ORDER BY name ASC
 
 NOW CONVERT THIS QUESTION:
 """
+        
+        self.refine_prompt_template = """Edit a PostgreSQL query to answer a follow-up question.
+The previous query's result is available as the table "previous" with columns: {columns}.
+Write ONE SELECT over previous that answers the follow-up. Return ONLY the SQL, no markdown.
+If previous lacks a needed column, select from students (id, name, class_name, section, marks) instead.
+{value_hints}
+Previous SQL: {previous_sql}
+Follow-up: {follow_up}
+SQL:"""
+        
+        self.explanation_prompt_template = """Explain this SQL query and its result in simple, clear terms.
+
+SQL Query: {sql_query}
+
+Query Result: {result}  # Show first 5 rows
+
+Provide a brief 1-2 sentence explanation of:
+1. What the SQL query does
+2. What the result means
+
+Explanation:"""
+    
+    @contextmanager
+    def _telemetry(self, kind: str, template: str):
+        """
+        Record the call in llm_telemetry. The block puts the final response
+        object (with Ollama's token and duration counters) into the yielded
+        dict; a call that raises or leaves it empty counts as an error.
+        """
+        final = {}
+        start = time.perf_counter()
+        try:
+            yield final
+        except Cancelled:
+            raise
+        except Exception:
+            llm_telemetry.record_error(self.model, kind, template, time.perf_counter() - start)
+            raise
+        if final:
+            llm_telemetry.record_response(self.model, kind, template, final, time.perf_counter() - start)
+        else:
+            llm_telemetry.record_error(self.model, kind, template, time.perf_counter() - start)
     
-    def generate_sql(self, natural_language_query: str) -> str:
-        """Convert natural language to SQL query using Ollama"""
+    def generate_sql(self, natural_language_query: str, cancel: Optional[CancelToken] = None) -> str:
+        """
+        Convert natural language to SQL query using Ollama. With ``cancel`` the
+        response is streamed, and setting the token closes the connection,
+        which stops Ollama generating and frees its slot.
+        """
         try:
-            full_prompt = f"{self.sql_prompt}\nQuestion: {natural_language_query}\nSQL:"
+            with stage("prompt"):
+                full_prompt = f"{self.sql_prompt}{self._value_hints(natural_language_query)}\nQuestion: {natural_language_query}\nSQL:"
             
             # Prepare request to Ollama
             payload = {
                 "model": self.model,
                 "prompt": full_prompt,
-                "stream": False,
+                "stream": cancel is not None,
                 "options": {
                     "temperature": 0.1, 
                     "num_predict": 300,  
@@ -68,30 +123,35 @@ NOW CONVERT THIS QUESTION:
                 }
             }
             
-            print(f"Calling Ollama with model: {self.model}")
+            logger.debug("Calling Ollama with model: %s", self.model)
             start_time = time.time()
             
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=30  # 30 second timeout
-            )
-            
-            response_time = time.time() - start_time
-            print(f"Ollama response time: {response_time:.2f}s")
-            
-            if response.status_code != 200:
-                raise Exception(f"Ollama API error {response.status_code}: {response.text}")
-            
-            result = response.json()
-            sql_query = result["response"].strip()
+            with stage("llm"), self._telemetry("generate_sql", self.sql_prompt) as final:
+                response = requests.post(
+                    f"{self.base_url}/api/generate",
+                    json=payload,
+                    timeout=30,  # 30 second timeout
+                    stream=cancel is not None
+                )
+                
+                if response.status_code != 200:
+                    raise Exception(f"Ollama API error {response.status_code}: {response.text}")
+                
+                if cancel is None:
+                    final.update(response.json())
+                    sql_query = final["response"].strip()
+                else:
+                    sql_query = self._read_stream(response, cancel, final).strip()
+            logger.debug("Ollama response time: %.2fs", time.time() - start_time)
             
             # Clean up the response
             sql_query = self._clean_sql(sql_query)
             
-            print(f"Generated SQL: {sql_query}")
+            logger.debug("Generated SQL: %s", sql_query)
             return sql_query
             
+        except Cancelled:
+            raise
         except requests.exceptions.ConnectionError:
             raise Exception(f"Cannot connect to Ollama at {self.base_url}. Is Ollama running?")
         except requests.exceptions.Timeout:
@@ -99,6 +159,82 @@ NOW CONVERT THIS QUESTION:
         except Exception as e:
             raise Exception(f"Error generating SQL with Ollama: {str(e)}")
     
+    def _read_stream(self, response, cancel: CancelToken, final: Optional[dict] = None) -> str:
+        """
+        Concatenate a streamed /api/generate response, stopping when cancelled.
+        The last object, which carries the counters, is copied into ``final``.
+        """
+        parts = []
+        with response, cancel.on_cancel(response.close):
+            try:
+                for line in response.iter_lines():
+                    cancel.raise_if_set()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    parts.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        if final is not None:
+                            final.update(chunk)
+                        break
+            except Exception:
+                # Closing the response from the cancelling thread surfaces as a read error
+                cancel.raise_if_set()
+                raise
+        return "".join(parts)
+    
+    def _refine_prompt(self, previous_sql: str, columns: List[str], follow_up: str) -> str:
+        return self.refine_prompt_template.format(
+            columns=", ".join(columns),
+            value_hints=self._value_hints(follow_up),
+            previous_sql=previous_sql,
+            follow_up=follow_up,
+        )
+    
+    def refine_sql(self, previous_sql: str, columns: List[str], follow_up: str) -> str:
+        """
+        Answer a follow-up by editing the previous query rather than starting
+        over: the model sees only that query and its columns, not the full
+        schema prompt, and writes a SELECT over it (see conversations.compose_sql)
+        """
+        payload = {
+            "model": self.model,
+            "prompt": self._refine_prompt(previous_sql, columns, follow_up),
+            "stream": False,
+            "options": {
+                "temperature": 0.1,
+                "num_predict": 200,
+                "top_p": 0.9,
+                "top_k": 40
+            }
+        }
+        try:
+            with stage("llm"), self._telemetry("refine_sql", self.refine_prompt_template) as final:
+                response = requests.post(f"{self.base_url}/api/generate", json=payload, timeout=30)
+                if response.status_code != 200:
+                    raise Exception(f"Ollama API error {response.status_code}: {response.text}")
+                final.update(response.json())
+                sql_query = self._clean_sql(final["response"].strip())
+            logger.debug("Refined SQL: %s", sql_query)
+            return sql_query
+        except requests.exceptions.ConnectionError:
+            raise Exception(f"Cannot connect to Ollama at {self.base_url}. Is Ollama running?")
+        except requests.exceptions.Timeout:
+            raise Exception("Ollama request timed out. Try a smaller model or check system resources.")
+        except Exception as e:
+            raise Exception(f"Error refining SQL with Ollama: {str(e)}")
+    
+    def _value_hints(self, natural_language_query: str) -> str:
+        """Stored values relevant to the question, so literals match the data exactly"""
+        relevant = value_index.relevant_values(natural_language_query)
+        if not relevant:
+            return ""
+        lines = [
+            f"- {column}: " + ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+            for column, values in relevant.items()
+        ]
+        return "\nUse these exact stored values where the question refers to them:\n" + "\n".join(lines) + "\n"
+    
     def _clean_sql(self, sql_query: str) -> str:
         """Clean up SQL query from Ollama response"""
         # Remove markdown code blocks
@@ -117,58 +253,83 @@ NOW CONVERT THIS QUESTION:
         
         return sql_query
     
+    def _explanation_payload(self, sql_query: str, result: List[tuple], stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "prompt": self.explanation_prompt_template.format(sql_query=sql_query, result=result[:5]),
+            "stream": stream,
+            "options": {
+                "temperature": 0.7,  # Slightly higher for more natural explanations
+                "num_predict": 150
+            }
+        }
+    
     def explain_query(self, sql_query: str, result: List[tuple]) -> str:
         """Generate explanation for the query result"""
-        explanation_prompt = f"""Explain this SQL query and its result in simple, clear terms.
-
-SQL Query: {sql_query}
-
-Query Result: {result[:5]}  # Show first 5 rows
-
-Provide a brief 1-2 sentence explanation of:
-1. What the SQL query does
-2. What the result means
-
-Explanation:"""
-        
         try:
-            payload = {
-                "model": self.model,
-                "prompt": explanation_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,  # Slightly higher for more natural explanations
-                    "num_predict": 150
-                }
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=15
-            )
+            with self._telemetry("explain", self.explanation_prompt_template) as final:
+                response = requests.post(
+                    f"{self.base_url}/api/generate",
+                    json=self._explanation_payload(sql_query, result),
+                    timeout=15
+                )
+                if response.status_code == 200:
+                    final.update(response.json())
             
-            if response.status_code == 200:
-                result = response.json()
-                explanation = result["response"].strip()
-                return explanation
-            else:
-                return f"Query returned {len(result)} rows. SQL: {sql_query}"
+            if final:
+                return final["response"].strip()
+            return f"Query returned {len(result)} rows. SQL: {sql_query}"
                 
         except Exception as e:
-            print(f"Could not generate explanation: {e}")
+            logger.warning("Could not generate explanation: %s", e)
             return f"Query returned {len(result)} rows. SQL: {sql_query}"
     
+    def stream_explanation(self, sql_query: str, result: List[tuple]) -> Iterator[str]:
+        """
+        Explanation tokens as Ollama produces them. Closing the iterator closes
+        the connection, which makes Ollama stop generating.
+        """
+        fallback = f"Query returned {len(result)} rows. SQL: {sql_query}"
+        with self._telemetry("explain", self.explanation_prompt_template) as final:
+            try:
+                response = requests.post(
+                    f"{self.base_url}/api/generate",
+                    json=self._explanation_payload(sql_query, result, stream=True),
+                    timeout=15,
+                    stream=True
+                )
+            except Exception as e:
+                logger.warning("Could not generate explanation: %s", e)
+                yield fallback
+                return
+            
+            with response:
+                if response.status_code != 200:
+                    yield fallback
+                    return
+                try:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            final.update(chunk)
+                            break
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    logger.warning("Explanation stream interrupted: %s", e)
+    
     def test_connection(self) -> bool:
         """Test if Ollama is running and accessible"""
         try:
             response = requests.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 models = response.json().get("models", [])
-                print(f"Ollama is running. Available models: {[m['name'] for m in models]}")
+                logger.info("Ollama is running. Available models: %s", [m["name"] for m in models])
                 return True
         except requests.exceptions.ConnectionError:
-            print(f"Cannot connect to Ollama at {self.base_url}")
+            logger.warning("Cannot connect to Ollama at %s", self.base_url)
             return False
         return False
 
@@ -0,0 +1,87 @@
+"""
+Keyset pagination cursors and the change counter behind /students/ ETags.
+
+Cursors are opaque to clients: URL-safe base64 of the last id on the page.
+ETags are built from a cheap table signature (max id and row count from
+student_stats), so every worker tags an unchanged table the same way. The
+signature is re-read at most every ``sync_seconds``; between those reads a
+conditional GET is answered without touching the database. Every write path
+in this process bumps the counter, which forces a re-read on the next poll,
+so a local write shows up in the ETag immediately.
+"""
+import base64
+import json
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import student_stats
+from app.config import settings
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"after": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Id to continue after; ValueError for anything that isn't one of our cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        after = json.loads(raw)["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(after, int) or isinstance(after, bool) or after < 0:
+        raise ValueError("Invalid cursor")
+    return after
+
+
+class TableChangeCounter:
+    def __init__(self, table: str, sync_seconds: float = 1.0):
+        self.table = table
+        self.sync_seconds = sync_seconds
+        self._version = 0
+        self._signature = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self.syncs = 0
+
+    def bump(self):
+        """Record a write made by this process; the next ``etag`` re-reads the table"""
+        with self._lock:
+            self._version += 1
+            self._synced_at = 0.0
+
+    def _read_signature(self, db: Session) -> tuple:
+        max_id = db.execute(text(f"SELECT MAX(id) FROM {self.table}")).scalar()
+        if settings.STUDENT_STATS_ENABLED:
+            rows = student_stats.total_students(db)
+        else:
+            rows = db.execute(text(f"SELECT COUNT(*) FROM {self.table}")).scalar()
+        return max_id or 0, rows or 0
+
+    def version(self) -> str:
+        """Writes made by this process so far; changes whenever this process writes"""
+        return str(self._version)
+
+    def etag(self, db: Session) -> str:
+        """Table signature, the same in every process; re-read when the last read is old"""
+        now = time.monotonic()
+        with self._lock:
+            stale = self._signature is None or now - self._synced_at >= self.sync_seconds
+            version = self._version
+        if stale:
+            signature = self._read_signature(db)
+            with self._lock:
+                self._signature = signature
+                # A write bumped meanwhile may not be in what was just read
+                self._synced_at = now if self._version == version else 0.0
+                self.syncs += 1
+        max_id, rows = self._signature
+        return f"{max_id}.{rows}"
+
+
+students_changes = TableChangeCounter("students", sync_seconds=settings.STUDENTS_ETAG_SYNC_SECONDS)
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Counters and checkout wait-time samples for one connection pool"""
+
+    def __init__(self, name: str, max_samples: int = 1000):
+        self.name = name
+        self._lock = threading.Lock()
+        self._wait_samples = deque(maxlen=max_samples)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.overflow_events = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.checkout_timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self._wait_samples.append(seconds)
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _percentile(self, samples: List[float], fraction: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def snapshot(self, pool=None) -> dict:
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            data = {
+                "name": self.name,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "overflow_events": self.overflow_events,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_ms": {
+                    "count": self.wait_count,
+                    "avg": (self.wait_total / self.wait_count * 1000) if self.wait_count else 0.0,
+                    "p50": self._percentile(samples, 0.50) * 1000,
+                    "p99": self._percentile(samples, 0.99) * 1000,
+                    "max": self.wait_max * 1000,
+                },
+            }
+        if pool is not None:
+            data.update(pool_state(pool))
+        return data
+
+
+def pool_state(pool) -> dict:
+    """In-use vs idle counts for pools that track them (QueuePool and subclasses)"""
+    if not isinstance(pool, QueuePool):
+        return {"pool_class": type(pool).__name__}
+    return {
+        "pool_class": type(pool).__name__,
+        "size": pool.size(),
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait to check out a connection"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.incr("checkout_timeouts")
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+# Pool name -> (engine, metrics), for the metrics endpoint
+registry: Dict[str, tuple] = {}
+
+
+def instrument_engine(engine: Engine, name: str) -> PoolMetrics:
+    """Attach pool event listeners to ``engine`` and register it under ``name``"""
+    metrics = PoolMetrics(name)
+
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.incr("checkins")
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.incr("connects")
+        if isinstance(engine.pool, QueuePool) and engine.pool.overflow() > 0:
+            metrics.incr("overflow_events")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("soft_invalidations")
+
+    registry[name] = (engine, metrics)
+    return metrics
+
+
+def collect() -> List[dict]:
+    return [metrics.snapshot(engine.pool) for engine, metrics in registry.values()]
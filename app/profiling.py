@@ -0,0 +1,298 @@
+"""
+Opt-in profiling of single requests (PROFILING_ENABLED).
+
+A request carrying ``X-Profile: collapsed`` or ``X-Profile: pstats`` (or
+``?profile=...``) and the ADMIN_API_KEY in ``X-Admin-Key`` runs under a
+profiler, and the response says where the artifact went:
+
+    X-Profile-Id: 1739954121-3f9c2a1b
+    X-Profile-Url: /admin/profiles/1739954121-3f9c2a1b
+
+``collapsed`` samples the request's threads every PROFILING_SAMPLE_INTERVAL_MS
+and writes collapsed stacks ("frame;frame;frame count" per line) for
+flamegraph.pl or speedscope. It is wall-clock time, so waiting on Ollama or
+the database shows up as the socket read it blocks in. ``pstats`` runs
+cProfile and writes a file for ``python -m pstats`` or snakeviz;
+``/admin/profiles/{id}?format=text`` prints the top functions.
+
+A request's work is split between the event loop thread (middleware,
+async endpoints, response sending) and a threadpool thread (sync
+endpoints). Both are profiled: ``ProfiledRoute`` makes sync endpoints join
+the request's profile in their worker thread. Anything else running on the
+event loop meanwhile lands in the profile too, so profile on a quiet
+worker. One request is profiled at a time per process; others arriving
+meanwhile run normally with ``X-Profile: busy``.
+
+With PROFILING_ENABLED off neither the middleware nor the route class is
+installed, so requests run exactly as without this module.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from app.config import settings
+
+PROFILE_MODES = ("collapsed", "pstats")
+_EXTENSIONS = {"collapsed": ".collapsed", "pstats": ".pstats"}
+_PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+_one_at_a_time = threading.Lock()
+
+
+def requested_mode(value: Optional[str]) -> Optional[str]:
+    """The profiler a request asked for; any other non-empty value means the default, collapsed"""
+    if not value or value.lower() in ("0", "false", "no"):
+        return None
+    return value.lower() if value.lower() in PROFILE_MODES else "collapsed"
+
+
+def authorized(admin_key: Optional[str]) -> bool:
+    """Profiling needs ADMIN_API_KEY in X-Admin-Key; without a configured key it is off"""
+    return bool(settings.ADMIN_API_KEY) and admin_key == settings.ADMIN_API_KEY
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class ProfileSession:
+    """One profiled request: per-thread cProfile runs, or stack samples of its threads"""
+
+    def __init__(self, mode: str, sample_interval_seconds: float = 0.001):
+        self.id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.mode = mode
+        self.sample_interval_seconds = sample_interval_seconds
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+        self._threads = {}  # thread id -> label in collapsed stacks
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @contextmanager
+    def attach(self, label: str):
+        """Profile the calling thread until the block exits"""
+        if self.mode == "pstats":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._profiles.append(profile)
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = label
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.pop(ident, None)
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval_seconds):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = dict(self._threads)
+            for ident, label in threads.items():
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[";".join([label] + stack[::-1])] += 1
+            self.samples += 1
+
+    def start(self):
+        if self.mode == "collapsed":
+            self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def write(self, path: str):
+        if self.mode == "pstats":
+            with self._lock:
+                profiles = list(self._profiles)
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+
+class ProfileStore:
+    """Profile artifacts on disk, with a JSON sidecar each; only the newest ``max_files`` are kept"""
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, session: ProfileSession, meta: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        session.write(self._path(session.id, _EXTENSIONS[session.mode]))
+        with open(self._path(session.id, ".json"), "w") as f:
+            json.dump({"id": session.id, "mode": session.mode, "samples": session.samples, **meta}, f)
+        for old in self.list()[self.max_files:]:
+            for suffix in (_EXTENSIONS[old["mode"]], ".json"):
+                try:
+                    os.remove(self._path(old["id"], suffix))
+                except OSError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda meta: meta.get("created_at", 0), reverse=True)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        """The profile's metadata with the artifact's ``path``, or None"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self._path(profile_id, _EXTENSIONS[meta["mode"]])
+        return {**meta, "path": path} if os.path.exists(path) else None
+
+    def summary(self, profile_id: str, limit: int = 40) -> Optional[str]:
+        """Top functions by cumulative time for pstats, the heaviest stacks for collapsed"""
+        meta = self.get(profile_id)
+        if meta is None:
+            return None
+        if meta["mode"] == "collapsed":
+            with open(meta["path"]) as f:
+                return "".join(f.readlines()[:limit])
+        out = io.StringIO()
+        pstats.Stats(meta["path"], stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def _joins_profile(endpoint):
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _current.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        with session.attach("worker"):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route whose sync endpoint joins the request's profile in its threadpool thread"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _joins_profile(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running requests that ask for it under a ProfileSession"""
+
+    def __init__(self, app, store: "ProfileStore" = None, sample_interval_ms: float = None):
+        self.app = app
+        self.store = store or profile_store
+        self.sample_interval_seconds = (sample_interval_ms or settings.PROFILING_SAMPLE_INTERVAL_MS) / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        value = headers.get(b"x-profile", b"").decode("latin-1")
+        if not value and b"profile=" in scope.get("query_string", b""):
+            value = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[0]
+        mode = requested_mode(value)
+        if mode is None or not authorized(headers.get(b"x-admin-key", b"").decode("latin-1") or None):
+            await self.app(scope, receive, send)
+            return
+        if not _one_at_a_time.acquire(blocking=False):
+            await self.app(scope, receive, self._busy(send))
+            return
+
+        session = ProfileSession(mode, self.sample_interval_seconds)
+        token = _current.set(session)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_profile(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append("X-Profile-Id", session.id)
+                response_headers.append("X-Profile-Url", f"/admin/profiles/{session.id}")
+            await send(message)
+
+        try:
+            session.start()
+            with session.attach("event_loop"):
+                await self.app(scope, receive, send_with_profile)
+        finally:
+            session.stop()
+            _current.reset(token)
+            try:
+                await run_in_threadpool(self.store.save, session, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": (time.perf_counter() - start) * 1000,
+                    "created_at": time.time(),
+                })
+            finally:
+                _one_at_a_time.release()
+
+    @staticmethod
+    def _busy(send):
+        """Tell the client its request wasn't profiled because another one is"""
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile", "busy")
+            await send(message)
+        return wrapped
+
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
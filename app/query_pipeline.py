@@ -0,0 +1,79 @@
+"""
+The question -> SQL -> rows pipeline shared by every natural language entry
+point (/query/, /query/stream, /query/batch and jobs, conversations and
+/query/export):
+
+    lookup    exact and template question caches (NL_CACHE_ENABLED)
+    generate  the model, on a cache miss
+    rewrite   sql_rewriter (SQL_REWRITE_ENABLED)
+    execute   crud.execute_sql_query: validation, parameters, plan cache
+    store     generated SQL that executed goes into the question cache
+
+``answer`` runs them all. Entry points that act between stages (streaming
+the SQL before the rows, generating before taking a connection, streaming
+the rows from a cursor) call the steps themselves.
+"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.config import settings
+from app.nl_cache import CacheHit, nl_query_cache
+from app.ollama_service import OllamaService
+from app.sql_rewriter import sql_rewriter
+from app.timing import stage
+from app.value_index import value_index
+
+
+@dataclass
+class PreparedQuery:
+    question: str
+    model: str
+    generated_sql: str  # as generated or cached; what the question cache keeps
+    sql: str            # after rewriting; what runs
+    cache_hit: Optional[CacheHit] = None
+
+    @property
+    def cache_kind(self) -> Optional[str]:
+        return self.cache_hit.kind if self.cache_hit else None
+
+
+def generate(question: str, service: OllamaService,
+             generate_sql: Optional[Callable[[str], str]] = None) -> PreparedQuery:
+    """Cached SQL for the question, else ``generate_sql`` (the service's by default)"""
+    cache_hit = None
+    if settings.NL_CACHE_ENABLED:
+        with stage("cache"):
+            cache_hit = nl_query_cache.lookup(question, service.model)
+    sql = cache_hit.sql if cache_hit else (generate_sql or service.generate_sql)(question)
+    return PreparedQuery(question, service.model, sql, sql, cache_hit)
+
+
+def rewrite(db: Session, query: PreparedQuery) -> PreparedQuery:
+    if settings.SQL_REWRITE_ENABLED:
+        with stage("rewrite"):
+            query.sql = sql_rewriter.rewrite_and_log(db, query.generated_sql, query.question)
+    return query
+
+
+def prepare(db: Session, question: str, service: OllamaService) -> PreparedQuery:
+    """Refresh the value index (it feeds the caches and the prompt), then generate and rewrite"""
+    value_index.ensure_fresh(db)
+    return rewrite(db, generate(question, service))
+
+
+def execute(db: Session, query: PreparedQuery) -> Tuple[List[str], list]:
+    """Run the query; generated SQL that ran is remembered for the question"""
+    columns, rows = crud.execute_sql_query(db, query.sql, with_columns=True)
+    if settings.NL_CACHE_ENABLED and query.cache_hit is None:
+        with stage("cache"):
+            nl_query_cache.store(query.question, query.model, query.generated_sql)
+    return columns, rows
+
+
+def answer(db: Session, question: str, service: OllamaService) -> Tuple[PreparedQuery, List[str], list]:
+    query = prepare(db, question, service)
+    columns, rows = execute(db, query)
+    return query, columns, rows
@@ -0,0 +1,96 @@
+"""
+Server-Sent Events for /query/stream.
+
+The /query/ pipeline runs stage by stage and each stage is sent as soon as
+it finishes, so the client sees the SQL after generation instead of after
+the whole pipeline:
+
+    sql          generated (or cached) SQL, sql_id and cache kind
+    columns      column names and row count
+    rows         result rows, ``chunk_size`` per event with their offset
+    explanation  explanation tokens as Ollama streams them
+    done         row count and per-stage timings
+    error        {"status", "detail"} in place of the remaining events
+
+Blocking stages run in the threadpool. The stream checks for a client
+disconnect before each stage and between events, and stops there; closing
+the explanation stream makes Ollama stop generating.
+"""
+import logging
+import time
+from typing import Any, AsyncIterator
+
+from fastapi import Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app import encoding, query_pipeline
+from app.ollama_service import OllamaService
+from app.sql_store import generated_sql_store
+from app.sql_validator import sql_validator
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + encoding.dumps(data) + b"\n\n"
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+async def query_events(request: Request, db: Session, question: str, service: OllamaService,
+                       chunk_size: int = 500, explain: bool = True) -> AsyncIterator[bytes]:
+    start = time.perf_counter()
+    timings = {}
+    try:
+        stage = time.perf_counter()
+        query = await run_in_threadpool(query_pipeline.prepare, db, question, service)
+        sql_query = query.sql
+        timings["generate_ms"] = _elapsed_ms(stage)
+        yield sse_event("sql", {
+            "sql_query": sql_query,
+            "sql_id": generated_sql_store.add(sql_query),
+            "fingerprint": sql_validator.validate(sql_query).fingerprint,
+            "cache": query.cache_kind,
+            "model_used": service.model,
+        })
+
+        if await request.is_disconnected():
+            return
+        stage = time.perf_counter()
+        columns, rows = await run_in_threadpool(query_pipeline.execute, db, query)
+        timings["execute_ms"] = _elapsed_ms(stage)
+
+        yield sse_event("columns", {"columns": columns, "row_count": len(rows)})
+        for offset in range(0, len(rows), chunk_size):
+            if await request.is_disconnected():
+                return
+            yield sse_event("rows", {"offset": offset, "rows": rows[offset:offset + chunk_size]})
+
+        if explain:
+            if await request.is_disconnected():
+                return
+            stage = time.perf_counter()
+            tokens = service.stream_explanation(sql_query, rows)
+            try:
+                async for token in iterate_in_threadpool(tokens):
+                    yield sse_event("explanation", {"token": token})
+                    if await request.is_disconnected():
+                        return
+            finally:
+                tokens.close()
+            timings["explain_ms"] = _elapsed_ms(stage)
+
+        timings["total_ms"] = _elapsed_ms(start)
+        yield sse_event("done", {"row_count": len(rows), "timings": timings})
+
+    except ValueError as e:
+        yield sse_event("error", {"status": 400, "detail": str(e)})
+    except Exception as e:
+        logger.exception("Error processing streamed query")
+        yield sse_event("error", {"status": 500, "detail": f"Error processing query: {str(e)}"})
@@ -0,0 +1,136 @@
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+POSTGRES_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+def parse_replica_urls(value: str) -> List[str]:
+    """Split the comma-separated DATABASE_REPLICA_URLS setting"""
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica for read-only sessions.
+
+    Replicas whose replication lag exceeds ``max_lag_seconds`` (or whose lag
+    cannot be measured) are skipped; when none are usable, ``session_factory``
+    returns None and callers fall back to the primary. Lag is measured on a
+    background thread, so a request never waits on a slow or unreachable
+    replica; until its first measurement lands a replica counts as unusable.
+    """
+
+    STRATEGIES = ("round_robin", "least_connections")
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        strategy: str = "round_robin",
+        max_lag_seconds: float = 5.0,
+        lag_check_interval: float = 10.0,
+    ):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown replica selection strategy: {strategy}")
+
+        self.engines = list(engines)
+        self.strategy = strategy
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_interval = lag_check_interval
+
+        self._sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for engine in self.engines
+        ]
+        self._lag: List[Optional[float]] = [None] * len(self.engines)
+        self._lag_checked_at = [0.0] * len(self.engines)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_urls(cls, urls: List[str], engine_factory=None, **kwargs) -> "ReplicaRouter":
+        engine_factory = engine_factory or (lambda url, index: create_engine(url))
+        return cls([engine_factory(url, index) for index, url in enumerate(urls)], **kwargs)
+
+    def _measure_lag(self, engine: Engine) -> Optional[float]:
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name != "postgresql":
+                    connection.execute(text("SELECT 1"))
+                    return 0.0
+                return float(connection.execute(text(POSTGRES_LAG_QUERY)).scalar() or 0)
+        except Exception as e:
+            logger.warning("Replica lag check failed for %s: %s", engine.url.render_as_string(), e)
+            return None
+
+    def refresh_lag(self, index: int) -> Optional[float]:
+        """Measure the replica's lag now and remember it"""
+        self._lag[index] = self._measure_lag(self.engines[index])
+        return self._lag[index]
+
+    def replica_lag(self, index: int) -> Optional[float]:
+        """Last measured replication lag; a re-measure starts in the background every lag_check_interval"""
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._lag_checked_at[index] >= self.lag_check_interval
+            if stale:
+                # Claim the check so concurrent callers keep using the cached value
+                self._lag_checked_at[index] = now
+        if stale:
+            threading.Thread(
+                target=self.refresh_lag, args=(index,), name=f"replica-lag-{index}", daemon=True
+            ).start()
+        return self._lag[index]
+
+    def healthy_replicas(self) -> List[int]:
+        healthy = []
+        for index in range(len(self.engines)):
+            lag = self.replica_lag(index)
+            if lag is not None and lag <= self.max_lag_seconds:
+                healthy.append(index)
+        return healthy
+
+    def choose(self) -> Optional[int]:
+        """Index of the replica to use, or None to fall back to the primary"""
+        candidates = self.healthy_replicas()
+        if not candidates:
+            return None
+
+        if self.strategy == "least_connections":
+            return min(candidates, key=lambda i: self._checked_out(self.engines[i]))
+
+        return candidates[next(self._counter) % len(candidates)]
+
+    @staticmethod
+    def _checked_out(engine: Engine) -> int:
+        checkedout = getattr(engine.pool, "checkedout", None)
+        return checkedout() if checkedout else 0
+
+    def session_factory(self) -> Optional[sessionmaker]:
+        index = self.choose()
+        return None if index is None else self._sessionmakers[index]
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "lag_seconds": self._lag[index],
+                "checked_out": self._checked_out(engine),
+            }
+            for index, engine in enumerate(self.engines)
+        ]
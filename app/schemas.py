@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Literal, Optional, List
 
 # Student schemas
 class StudentBase(BaseModel):
@@ -21,7 +21,62 @@ class StudentResponse(StudentBase):
 class NLQuery(BaseModel):
     question: str
 
+class BatchQuery(BaseModel):
+    questions: List[str] = Field(..., min_length=1)
+    model: Optional[str] = None
+    # Explanations cost a second LLM call per question
+    explain: bool = False
+
+    class Config:
+        protected_namespaces = ()
+
+class JobCreate(BaseModel):
+    question: str
+    model: Optional[str] = None
+    explain: bool = True
+
+    class Config:
+        protected_namespaces = ()
+
+class SessionQuery(BaseModel):
+    question: str
+    model: Optional[str] = None
+    # None: refine the previous query when the question reads as a follow-up
+    refine: Optional[bool] = None
+
+    class Config:
+        protected_namespaces = ()
+
+class ColumnInfo(BaseModel):
+    name: str
+    type: str
+
 class SQLResponse(BaseModel):
     sql_query: str
-    result: List[tuple]
-    explanation: Optional[str] = None
\ No newline at end of file
+    result: Optional[List[tuple]] = None
+    explanation: Optional[str] = None
+    row_count: Optional[int] = None
+    model_used: Optional[str] = None
+    sql_id: Optional[str] = None
+    fingerprint: Optional[str] = None
+    cache: Optional[str] = None  # "exact" or "template" when no LLM call was made
+    # Columnar format: column metadata once, then one array per column
+    format: Optional[str] = None
+    columns: Optional[List[ColumnInfo]] = None
+    data: Optional[List[List[Any]]] = None
+
+    class Config:
+        protected_namespaces = ()
+
+class ExportRequest(BaseModel):
+    # Either a new question or the sql_id returned by /query/
+    question: Optional[str] = None
+    sql_id: Optional[str] = None
+    format: Literal["csv", "parquet"] = "csv"
+    gzip: bool = False
+    batch_size: int = Field(10000, gt=0)
+    row_group_size: int = Field(100000, gt=0)
+
+class IndexApplyRequest(BaseModel):
+    # Recommendation names from GET /admin/index-recommendations
+    names: List[str]
@@ -0,0 +1,251 @@
+"""
+Literal parameterization and per-connection prepared statements.
+
+Generated SQL inlines its literals, so every variant of a question is a new
+statement to the planner. ``parameterize`` moves the literals of WHERE, HAVING
+and ON clauses into bind parameters; queries that differ only in those values
+then share one SQL text ("shape"). On PostgreSQL each pooled connection keeps a
+bounded LRU of ``PREPARE``d shapes and runs them with ``EXECUTE``; on other
+dialects the shared text is what the driver's own statement cache keys on.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.config import settings
+from app.sql_parser import SQLSyntaxError, Token, tokenize
+
+# Clauses whose literals are values rather than structure
+_VALUE_CLAUSES = {"WHERE", "HAVING", "ON"}
+_CLAUSE_KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET",
+    "FETCH", "ON", "JOIN", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "WITH", "USING",
+}
+# Typed literals (INTERVAL '1 day') must stay literals
+_TYPED_LITERAL_PREFIXES = {"INTERVAL", "DATE", "TIME", "TIMESTAMP"}
+
+_STATEMENTS_KEY = "prepared_statements"
+_COUNTER_KEY = "prepared_statement_counter"
+
+
+@dataclass(frozen=True)
+class ParameterizedQuery:
+    sql: str                                   # SQL with :p1, :p2 ... placeholders
+    params: Dict[str, object] = field(default_factory=dict)
+    kinds: tuple = ()                          # parameter types for PREPARE, part of the prepared shape
+    positional: str = ""                       # same SQL with $1, $2 ... for PREPARE
+
+    @property
+    def shape(self) -> tuple:
+        return (self.sql, self.kinds)
+
+
+def _literal_value(token: Token):
+    if token.kind == "string":
+        return token.value[1:-1].replace("''", "'")
+    if any(c in token.value for c in ".eE"):
+        return float(token.value)
+    return int(token.value)
+
+
+def _parameter_type(token: Token) -> str:
+    """
+    What the literal would be as SQL text: integers by size, other numbers
+    numeric, and strings "unknown" so PostgreSQL infers their type from the
+    context (a date column, an enum) exactly as it does for a quoted literal.
+    """
+    if token.kind == "string":
+        return "unknown"
+    value = _literal_value(token)
+    if isinstance(value, float):
+        return "numeric"
+    if -2**31 <= value < 2**31:
+        return "integer"
+    return "bigint" if -2**63 <= value < 2**63 else "numeric"
+
+
+def _bindable_literals(tokens: List[Token]) -> List[Token]:
+    # Each parenthesis level starts in its enclosing clause and may open its own
+    # (a subquery's SELECT); closing the level restores the outer clause.
+    clauses = [None]
+    bindable = []
+    previous = None
+    for token in tokens:
+        if token.kind == "punct" and token.value == "(":
+            clauses.append(clauses[-1])
+        elif token.kind == "punct" and token.value == ")" and len(clauses) > 1:
+            clauses.pop()
+        elif token.kind == "ident" and token.upper in _CLAUSE_KEYWORDS:
+            clauses[-1] = token.upper
+        elif token.kind in ("string", "number") and clauses[-1] in _VALUE_CLAUSES:
+            typed = previous is not None and previous.kind == "ident" and (
+                previous.upper in _TYPED_LITERAL_PREFIXES
+                # A prefix such as X'ff' or N'text' is part of the literal
+                or (token.kind == "string" and previous.pos + len(previous.value) == token.pos)
+            )
+            if not typed:
+                bindable.append(token)
+        previous = token
+    return bindable
+
+
+def _parameterize(sql: str) -> ParameterizedQuery:
+    try:
+        tokens = tokenize(sql)
+    except SQLSyntaxError:
+        return ParameterizedQuery(sql, positional=sql)
+    if any(token.kind == "param" for token in tokens):
+        # Already has placeholders of its own; leave it alone
+        return ParameterizedQuery(sql, positional=sql)
+
+    parts = []
+    positional = []
+    params = {}
+    kinds = []
+    last = 0
+    for index, token in enumerate(_bindable_literals(tokens), start=1):
+        name = f"p{index}"
+        parts.append(sql[last:token.pos])
+        parts.append(f":{name}")
+        positional.append(sql[last:token.pos])
+        positional.append(f"${index}")
+        params[name] = _literal_value(token)
+        kinds.append(_parameter_type(token))
+        last = token.pos + len(token.value)
+    parts.append(sql[last:])
+    positional.append(sql[last:])
+    return ParameterizedQuery("".join(parts), params, tuple(kinds), "".join(positional))
+
+
+_parameterized = LRUCache(max_entries=settings.SQL_VALIDATION_CACHE_SIZE)
+
+
+def parameterize(sql: str) -> ParameterizedQuery:
+    """Replace value literals in validated SQL with bind parameters (memoized)"""
+    cached = _parameterized.get(sql)
+    if cached is None:
+        cached = _parameterize(sql)
+        _parameterized.set(sql, cached)
+    return cached
+
+
+class PlanCacheStats:
+    """
+    Process-wide counters for the per-connection prepared statement caches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.hits = 0
+        self.prepares = 0
+        self.evictions = 0
+        self.literals_bound = 0
+        self.shapes = set()
+
+    def record(self, query: ParameterizedQuery, hit: bool, evicted: int = 0):
+        with self._lock:
+            self.executions += 1
+            self.literals_bound += len(query.params)
+            self.evictions += evicted
+            if hit:
+                self.hits += 1
+            else:
+                self.prepares += 1
+            if len(self.shapes) < 10000:
+                self.shapes.add(query.shape)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "hits": self.hits,
+                "prepares": self.prepares,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / self.executions if self.executions else 0.0,
+                "literals_bound": self.literals_bound,
+                "distinct_shapes": len(self.shapes),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.executions = self.hits = self.prepares = self.evictions = self.literals_bound = 0
+            self.shapes = set()
+
+
+plan_cache_stats = PlanCacheStats()
+
+
+def _statement_cache(db: Session) -> OrderedDict:
+    # ``info`` lives on the pooled DBAPI connection, so it survives checkins and
+    # is discarded together with the server session when the connection is invalidated.
+    info = db.connection().connection.info
+    return info.setdefault(_STATEMENTS_KEY, OrderedDict())
+
+
+def _execute_prepared(db: Session, query: ParameterizedQuery, cache_size: int):
+    statements = _statement_cache(db)
+    info = db.connection().connection.info
+    name = statements.get(query.shape)
+    hit = name is not None
+    evicted = 0
+
+    if hit:
+        statements.move_to_end(query.shape)
+    else:
+        # Fresh names per PREPARE, so a statement left behind by a failed
+        # transaction can never collide with a new one
+        info[_COUNTER_KEY] = info.get(_COUNTER_KEY, 0) + 1
+        name = f"nlsql_{info[_COUNTER_KEY]}"
+        # Declared types, so literal-only predicates (1 = 1, 50 + 10) don't leave the server guessing
+        types = f"({', '.join(query.kinds)})" if query.kinds else ""
+        db.execute(text(f"PREPARE {name}{types} AS {query.positional}"))
+        statements[query.shape] = name
+        while len(statements) > cache_size:
+            _, stale = statements.popitem(last=False)
+            db.execute(text(f"DEALLOCATE {stale}"))
+            evicted += 1
+
+    arguments = ", ".join(f":p{index}" for index in range(1, len(query.params) + 1))
+    statement = f"EXECUTE {name}({arguments})" if arguments else f"EXECUTE {name}"
+    try:
+        result = db.execute(text(statement).bindparams(**query.params))
+    except Exception:
+        statements.pop(query.shape, None)
+        raise
+    plan_cache_stats.record(query, hit, evicted)
+    return result
+
+
+def execute_parameterized(db: Session, sql: str, cache_size: Optional[int] = None):
+    """
+    Execute validated SQL with its literals bound as parameters.
+    On PostgreSQL the statement is prepared once per pooled connection and shape.
+    """
+    query = parameterize(sql)
+    cache_size = settings.SQL_PREPARED_STATEMENT_CACHE_SIZE if cache_size is None else cache_size
+
+    if cache_size > 0 and db.get_bind().dialect.name == "postgresql":
+        return _execute_prepared(db, query, cache_size)
+
+    if cache_size > 0:
+        # No server-side PREPARE; track shapes per connection the same way so
+        # the hit rate reflects reuse of the driver's statement cache
+        statements = _statement_cache(db)
+        hit = query.shape in statements
+        statements[query.shape] = True
+        statements.move_to_end(query.shape)
+        evicted = 0
+        while len(statements) > cache_size:
+            statements.popitem(last=False)
+            evicted += 1
+        result = db.execute(text(query.sql).bindparams(**query.params))
+        plan_cache_stats.record(query, hit, evicted)
+        return result
+
+    return db.execute(text(query.sql).bindparams(**query.params))
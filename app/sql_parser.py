@@ -0,0 +1,900 @@
+"""
+Tokenizer, parser and renderer for the SELECT subset the LLM generates.
+
+Covers single SELECT statements with optional CTEs, joins, derived tables,
+WHERE / GROUP BY / HAVING / ORDER BY / LIMIT / OFFSET, CASE, CAST and ``::``
+casts, window functions and the usual predicates. Anything outside that
+subset raises ``SQLSyntaxError`` so callers can fall back to the raw text.
+"""
+import re
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+class SQLSyntaxError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Token:
+    kind: str  # ident, quoted_ident, string, escape_string, dollar_string, number, param, op, punct, comment
+    value: str
+    pos: int
+
+    @property
+    def upper(self) -> str:
+        return self.value.upper()
+
+    def is_keyword(self, *words: str) -> bool:
+        return self.kind == "ident" and self.value.upper() in words
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<escape_string>[eE]'(?:[^'\\]|\\.|'')*')
+  | (?P<dollar_string>\$(?P<dollar_tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=dollar_tag)\$)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted_ident>"(?:[^"]|"")*")
+  | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+  | (?P<op>::|<>|!=|<=|>=|\|\||[=<>+\-*/%])
+  | (?P<param>:[A-Za-z_]\w*|\$\d+)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<punct>[(),;.])
+""", re.S | re.X)
+
+
+def tokenize(sql: str, keep_comments: bool = False) -> List[Token]:
+    """
+    Split SQL into tokens in a single pass; whitespace is dropped.
+
+    String boundaries follow PostgreSQL: ``E'...'`` strings take backslash
+    escapes and ``$tag$...$tag$`` quotes end only at their tag, so text the
+    server reads as a literal is never taken for SQL or the other way round.
+    The parser doesn't accept those two kinds; queries using them keep their
+    raw text.
+    """
+    tokens = []
+    pos = 0
+    length = len(sql)
+    while pos < length:
+        match = _TOKEN_RE.match(sql, pos)
+        if match is None:
+            snippet = sql[pos:pos + 10]
+            if snippet.startswith(("'", '"', "/*")):
+                raise SQLSyntaxError(f"Unterminated literal or comment at position {pos}")
+            raise SQLSyntaxError(f"Unexpected character {sql[pos]!r} at position {pos}")
+        kind = match.lastgroup
+        if kind != "ws" and (kind != "comment" or keep_comments):
+            tokens.append(Token(kind, match.group(), pos))
+        pos = match.end()
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# AST
+# ---------------------------------------------------------------------------
+
+class Node:
+    pass
+
+
+@dataclass
+class Column(Node):
+    name: str
+    table: Optional[str] = None
+
+
+@dataclass
+class Star(Node):
+    table: Optional[str] = None
+
+
+@dataclass
+class Literal(Node):
+    value: Any  # str for strings and numbers (numbers keep their source text)
+    kind: str   # string, number, null, boolean
+
+
+@dataclass
+class Param(Node):
+    name: str
+
+
+@dataclass
+class Window(Node):
+    partition_by: List[Node] = field(default_factory=list)
+    order_by: List["OrderItem"] = field(default_factory=list)
+
+
+@dataclass
+class Func(Node):
+    name: str
+    args: List[Node] = field(default_factory=list)
+    distinct: bool = False
+    over: Optional[Window] = None
+
+
+@dataclass
+class Cast(Node):
+    expr: Node
+    type_name: str
+    style: str = "::"  # or "CAST"
+
+
+@dataclass
+class Unary(Node):
+    op: str
+    operand: Node
+
+
+@dataclass
+class Binary(Node):
+    op: str
+    left: Node
+    right: Node
+
+
+@dataclass
+class InList(Node):
+    expr: Node
+    values: List[Node]
+    negated: bool = False
+
+
+@dataclass
+class InSubquery(Node):
+    expr: Node
+    select: "Select"
+    negated: bool = False
+
+
+@dataclass
+class Between(Node):
+    expr: Node
+    low: Node
+    high: Node
+    negated: bool = False
+
+
+@dataclass
+class IsNull(Node):
+    expr: Node
+    negated: bool = False
+
+
+@dataclass
+class Case(Node):
+    operand: Optional[Node]
+    whens: List[Tuple[Node, Node]]
+    else_: Optional[Node] = None
+
+
+@dataclass
+class Exists(Node):
+    select: "Select"
+
+
+@dataclass
+class Subquery(Node):
+    select: "Select"
+
+
+@dataclass
+class SelectItem(Node):
+    expr: Node
+    alias: Optional[str] = None
+
+
+@dataclass
+class OrderItem(Node):
+    expr: Node
+    direction: Optional[str] = None  # ASC, DESC or None
+    nulls: Optional[str] = None      # FIRST, LAST or None
+
+    @property
+    def descending(self) -> bool:
+        return self.direction == "DESC"
+
+
+@dataclass
+class Table(Node):
+    name: str
+    schema: Optional[str] = None
+    alias: Optional[str] = None
+
+
+@dataclass
+class DerivedTable(Node):
+    select: "Select"
+    alias: Optional[str] = None
+
+
+@dataclass
+class Join(Node):
+    kind: str  # JOIN, LEFT JOIN, ...
+    right: Node
+    on: Optional[Node] = None
+    using: Optional[List[str]] = None
+
+
+@dataclass
+class CTE(Node):
+    name: str
+    select: "Select"
+
+
+@dataclass
+class Select(Node):
+    items: List[SelectItem]
+    from_: Optional[Node] = None
+    joins: List[Join] = field(default_factory=list)
+    where: Optional[Node] = None
+    group_by: List[Node] = field(default_factory=list)
+    having: Optional[Node] = None
+    order_by: List[OrderItem] = field(default_factory=list)
+    limit: Optional[Node] = None
+    offset: Optional[Node] = None
+    distinct: bool = False
+    ctes: List[CTE] = field(default_factory=list)
+
+
+AGGREGATE_FUNCTIONS = {"COUNT", "SUM", "AVG", "MIN", "MAX", "STDDEV", "VARIANCE", "ARRAY_AGG", "STRING_AGG"}
+
+# Words that end an expression or alias position
+RESERVED = {
+    "SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET", "FETCH",
+    "UNION", "INTERSECT", "EXCEPT", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS",
+    "OUTER", "ON", "USING", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE", "ILIKE",
+    "BETWEEN", "CASE", "WHEN", "THEN", "ELSE", "END", "ASC", "DESC", "NULLS", "DISTINCT",
+    "WITH", "BY", "TRUE", "FALSE", "EXISTS", "OVER", "PARTITION", "ALL", "WINDOW",
+}
+
+COMPARISON_OPS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+class _Parser:
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    # -- token helpers ----------------------------------------------------
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def advance(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise SQLSyntaxError("Unexpected end of query")
+        self.pos += 1
+        return token
+
+    def at_keyword(self, *words: str, offset: int = 0) -> bool:
+        token = self.peek(offset)
+        return token is not None and token.is_keyword(*words)
+
+    def at_value(self, *values: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind in ("op", "punct") and token.value in values
+
+    def accept_keyword(self, *words: str) -> Optional[str]:
+        if self.at_keyword(*words):
+            return self.advance().upper
+        return None
+
+    def expect_keyword(self, word: str):
+        if not self.accept_keyword(word):
+            raise self.error(f"Expected {word}")
+
+    def accept_value(self, *values: str) -> bool:
+        if self.at_value(*values):
+            self.advance()
+            return True
+        return False
+
+    def expect_value(self, value: str):
+        if not self.accept_value(value):
+            raise self.error(f"Expected '{value}'")
+
+    def error(self, message: str) -> SQLSyntaxError:
+        token = self.peek()
+        where = f"near {token.value!r} at position {token.pos}" if token else "at end of query"
+        return SQLSyntaxError(f"{message} {where}")
+
+    def identifier(self) -> str:
+        token = self.advance()
+        if token.kind == "quoted_ident":
+            return token.value
+        if token.kind == "ident" and token.upper not in RESERVED:
+            return token.value
+        self.pos -= 1
+        raise self.error("Expected identifier")
+
+    def optional_alias(self) -> Optional[str]:
+        if self.accept_keyword("AS"):
+            return self.identifier()
+        token = self.peek()
+        if token is not None and (token.kind == "quoted_ident" or (token.kind == "ident" and token.upper not in RESERVED)):
+            return self.advance().value
+        return None
+
+    # -- statements -------------------------------------------------------
+    def parse_statement(self) -> Select:
+        select = self.parse_select()
+        while self.accept_value(";"):
+            pass
+        if self.peek() is not None:
+            if self.at_keyword("UNION", "INTERSECT", "EXCEPT"):
+                raise self.error("Set operations are not supported")
+            raise self.error("Unexpected token")
+        return select
+
+    def parse_select(self) -> Select:
+        ctes = []
+        if self.accept_keyword("WITH"):
+            if self.at_keyword("RECURSIVE"):
+                raise self.error("Recursive CTEs are not supported")
+            while True:
+                name = self.identifier()
+                self.expect_keyword("AS")
+                self.expect_value("(")
+                ctes.append(CTE(name, self.parse_select()))
+                self.expect_value(")")
+                if not self.accept_value(","):
+                    break
+
+        self.expect_keyword("SELECT")
+        distinct = bool(self.accept_keyword("DISTINCT"))
+        if not distinct:
+            self.accept_keyword("ALL")
+        items = [self.parse_select_item()]
+        while self.accept_value(","):
+            items.append(self.parse_select_item())
+
+        select = Select(items=items, distinct=distinct, ctes=ctes)
+
+        if self.accept_keyword("FROM"):
+            select.from_ = self.parse_from_item()
+            while True:
+                if self.accept_value(","):
+                    select.joins.append(Join("CROSS JOIN", self.parse_from_item()))
+                    continue
+                join = self.parse_join()
+                if join is None:
+                    break
+                select.joins.append(join)
+
+        if self.accept_keyword("WHERE"):
+            select.where = self.parse_expr()
+        if self.accept_keyword("GROUP"):
+            self.expect_keyword("BY")
+            select.group_by = self.parse_expr_list()
+        if self.accept_keyword("HAVING"):
+            select.having = self.parse_expr()
+        if self.accept_keyword("ORDER"):
+            self.expect_keyword("BY")
+            select.order_by = self.parse_order_list()
+        self.parse_limit_offset(select)
+        return select
+
+    def parse_limit_offset(self, select: Select):
+        while True:
+            if self.accept_keyword("LIMIT"):
+                if self.accept_keyword("ALL"):
+                    select.limit = None
+                else:
+                    select.limit = self.parse_expr()
+            elif self.accept_keyword("OFFSET"):
+                select.offset = self.parse_expr()
+                self.accept_keyword("ROW", "ROWS")
+            elif self.accept_keyword("FETCH"):
+                self.accept_keyword("FIRST", "NEXT")
+                select.limit = Literal("1", "number") if self.at_keyword("ROW", "ROWS") else self.parse_primary()
+                self.accept_keyword("ROW", "ROWS")
+                self.expect_keyword("ONLY")
+            else:
+                return
+
+    def parse_select_item(self) -> SelectItem:
+        if self.accept_value("*"):
+            return SelectItem(Star())
+        token, dot, star = self.peek(), self.peek(1), self.peek(2)
+        if (token and token.kind in ("ident", "quoted_ident") and dot and dot.value == "."
+                and star and star.value == "*"):
+            self.pos += 3
+            return SelectItem(Star(token.value))
+        expr = self.parse_expr()
+        return SelectItem(expr, self.optional_alias())
+
+    def parse_from_item(self) -> Node:
+        if self.accept_value("("):
+            select = self.parse_select()
+            self.expect_value(")")
+            return DerivedTable(select, self.optional_alias())
+        name = self.identifier()
+        schema = None
+        if self.accept_value("."):
+            schema, name = name, self.identifier()
+        return Table(name, schema, self.optional_alias())
+
+    def parse_join(self) -> Optional[Join]:
+        kind = None
+        if self.accept_keyword("JOIN"):
+            kind = "JOIN"
+        elif self.at_keyword("INNER") and self.at_keyword("JOIN", offset=1):
+            self.pos += 2
+            kind = "INNER JOIN"
+        elif self.at_keyword("LEFT", "RIGHT", "FULL"):
+            side = self.advance().upper
+            self.accept_keyword("OUTER")
+            self.expect_keyword("JOIN")
+            kind = f"{side} JOIN"
+        elif self.at_keyword("CROSS"):
+            self.advance()
+            self.expect_keyword("JOIN")
+            return Join("CROSS JOIN", self.parse_from_item())
+        if kind is None:
+            return None
+
+        right = self.parse_from_item()
+        if self.accept_keyword("ON"):
+            return Join(kind, right, on=self.parse_expr())
+        if self.accept_keyword("USING"):
+            self.expect_value("(")
+            columns = [self.identifier()]
+            while self.accept_value(","):
+                columns.append(self.identifier())
+            self.expect_value(")")
+            return Join(kind, right, using=columns)
+        raise self.error("Expected ON or USING")
+
+    def parse_expr_list(self) -> List[Node]:
+        exprs = [self.parse_expr()]
+        while self.accept_value(","):
+            exprs.append(self.parse_expr())
+        return exprs
+
+    def parse_order_list(self) -> List[OrderItem]:
+        items = []
+        while True:
+            expr = self.parse_expr()
+            direction = self.accept_keyword("ASC", "DESC")
+            nulls = None
+            if self.accept_keyword("NULLS"):
+                nulls = self.accept_keyword("FIRST", "LAST")
+                if nulls is None:
+                    raise self.error("Expected FIRST or LAST")
+            items.append(OrderItem(expr, direction, nulls))
+            if not self.accept_value(","):
+                return items
+
+    # -- expressions ------------------------------------------------------
+    def parse_expr(self) -> Node:
+        left = self.parse_and()
+        while self.accept_keyword("OR"):
+            left = Binary("OR", left, self.parse_and())
+        return left
+
+    def parse_and(self) -> Node:
+        left = self.parse_not()
+        while self.accept_keyword("AND"):
+            left = Binary("AND", left, self.parse_not())
+        return left
+
+    def parse_not(self) -> Node:
+        if self.accept_keyword("NOT"):
+            return Unary("NOT", self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> Node:
+        left = self.parse_additive()
+
+        token = self.peek()
+        if token is not None and token.kind == "op" and token.value in COMPARISON_OPS:
+            self.advance()
+            return Binary(token.value, left, self.parse_additive())
+
+        if self.accept_keyword("IS"):
+            negated = bool(self.accept_keyword("NOT"))
+            self.expect_keyword("NULL")
+            return IsNull(left, negated)
+
+        negated = False
+        if self.at_keyword("NOT") and self.at_keyword("IN", "BETWEEN", "LIKE", "ILIKE", offset=1):
+            self.advance()
+            negated = True
+
+        if self.accept_keyword("IN"):
+            self.expect_value("(")
+            if self.at_keyword("SELECT", "WITH"):
+                select = self.parse_select()
+                self.expect_value(")")
+                return InSubquery(left, select, negated)
+            values = self.parse_expr_list()
+            self.expect_value(")")
+            return InList(left, values, negated)
+
+        if self.accept_keyword("BETWEEN"):
+            low = self.parse_additive()
+            self.expect_keyword("AND")
+            return Between(left, low, self.parse_additive(), negated)
+
+        op = self.accept_keyword("LIKE", "ILIKE")
+        if op:
+            return Binary(f"NOT {op}" if negated else op, left, self.parse_additive())
+
+        if negated:
+            raise self.error("Expected IN, BETWEEN, LIKE or ILIKE after NOT")
+        return left
+
+    def parse_additive(self) -> Node:
+        left = self.parse_multiplicative()
+        while self.at_value("+", "-", "||"):
+            op = self.advance().value
+            left = Binary(op, left, self.parse_multiplicative())
+        return left
+
+    def parse_multiplicative(self) -> Node:
+        left = self.parse_unary()
+        while self.at_value("*", "/", "%"):
+            op = self.advance().value
+            left = Binary(op, left, self.parse_unary())
+        return left
+
+    def parse_unary(self) -> Node:
+        if self.accept_value("-"):
+            operand = self.parse_unary()
+            if isinstance(operand, Literal) and operand.kind == "number":
+                value = operand.value
+                return Literal(value[1:] if value.startswith("-") else f"-{value}", "number")
+            return Unary("-", operand)
+        if self.accept_value("+"):
+            return self.parse_unary()
+        return self.parse_postfix()
+
+    def parse_postfix(self) -> Node:
+        expr = self.parse_primary()
+        while self.accept_value("::"):
+            expr = Cast(expr, self.parse_type_name())
+        return expr
+
+    def parse_type_name(self) -> str:
+        token = self.advance()
+        if token.kind not in ("ident", "quoted_ident"):
+            self.pos -= 1
+            raise self.error("Expected type name")
+        name = token.value
+        while self.at_keyword("PRECISION", "VARYING"):
+            name += " " + self.advance().value
+        if self.accept_value("("):
+            args = [self.advance().value]
+            while self.accept_value(","):
+                args.append(self.advance().value)
+            self.expect_value(")")
+            name += f"({', '.join(args)})"
+        return name
+
+    def parse_primary(self) -> Node:
+        token = self.advance()
+
+        if token.kind == "number":
+            return Literal(token.value, "number")
+        if token.kind == "string":
+            return Literal(token.value[1:-1].replace("''", "'"), "string")
+        if token.kind == "param":
+            return Param(token.value)
+        if token.kind == "punct" and token.value == "(":
+            if self.at_keyword("SELECT", "WITH"):
+                select = self.parse_select()
+                self.expect_value(")")
+                return Subquery(select)
+            expr = self.parse_expr()
+            self.expect_value(")")
+            return expr
+        if token.kind == "quoted_ident":
+            return self.parse_column_ref(token.value)
+        if token.kind != "ident":
+            self.pos -= 1
+            raise self.error("Unexpected token")
+
+        word = token.upper
+        if word == "NULL":
+            return Literal(None, "null")
+        if word in ("TRUE", "FALSE"):
+            return Literal(word, "boolean")
+        if word == "CASE":
+            return self.parse_case()
+        if word == "EXISTS":
+            self.expect_value("(")
+            select = self.parse_select()
+            self.expect_value(")")
+            return Exists(select)
+        if word == "CAST" and self.at_value("("):
+            self.advance()
+            expr = self.parse_expr()
+            self.expect_keyword("AS")
+            type_name = self.parse_type_name()
+            self.expect_value(")")
+            return Cast(expr, type_name, style="CAST")
+        if word in RESERVED:
+            self.pos -= 1
+            raise self.error("Unexpected keyword")
+        if self.at_value("("):
+            return self.parse_function(token.value)
+        return self.parse_column_ref(token.value)
+
+    def parse_column_ref(self, name: str) -> Node:
+        if self.accept_value("."):
+            if self.accept_value("*"):
+                return Star(name)
+            return Column(self.identifier(), table=name)
+        return Column(name)
+
+    def parse_function(self, name: str) -> Func:
+        self.expect_value("(")
+        func = Func(name.upper())
+        if self.accept_value("*"):
+            func.args = [Star()]
+        elif not self.at_value(")"):
+            func.distinct = bool(self.accept_keyword("DISTINCT"))
+            func.args = self.parse_expr_list()
+        self.expect_value(")")
+        if self.accept_keyword("OVER"):
+            self.expect_value("(")
+            window = Window()
+            if self.accept_keyword("PARTITION"):
+                self.expect_keyword("BY")
+                window.partition_by = self.parse_expr_list()
+            if self.accept_keyword("ORDER"):
+                self.expect_keyword("BY")
+                window.order_by = self.parse_order_list()
+            self.expect_value(")")
+            func.over = window
+        return func
+
+    def parse_case(self) -> Case:
+        operand = None if self.at_keyword("WHEN") else self.parse_expr()
+        whens = []
+        while self.accept_keyword("WHEN"):
+            condition = self.parse_expr()
+            self.expect_keyword("THEN")
+            whens.append((condition, self.parse_expr()))
+        if not whens:
+            raise self.error("Expected WHEN")
+        else_ = self.parse_expr() if self.accept_keyword("ELSE") else None
+        self.expect_keyword("END")
+        return Case(operand, whens, else_)
+
+
+def parse(sql: str) -> Select:
+    """Parse a single SELECT statement into an AST"""
+    tokens = tokenize(sql)
+    if not tokens:
+        raise SQLSyntaxError("Empty query")
+    return _Parser(tokens).parse_statement()
+
+
+def parse_tokens(tokens: List[Token]) -> Select:
+    """Parse already-tokenized SQL (comments must have been dropped)"""
+    return _Parser([token for token in tokens if token.kind != "comment"]).parse_statement()
+
+
+# ---------------------------------------------------------------------------
+# Renderer
+# ---------------------------------------------------------------------------
+
+_PRECEDENCE = {"OR": 1, "AND": 2, "NOT": 3}
+_PREDICATE = 4
+_ADDITIVE = 5
+_MULTIPLICATIVE = 6
+_UNARY = 7
+_ATOM = 9
+
+
+def _precedence(node: Node) -> int:
+    if isinstance(node, Binary):
+        if node.op in _PRECEDENCE:
+            return _PRECEDENCE[node.op]
+        if node.op in ("+", "-", "||"):
+            return _ADDITIVE
+        if node.op in ("*", "/", "%"):
+            return _MULTIPLICATIVE
+        return _PREDICATE
+    if isinstance(node, Unary):
+        return _PRECEDENCE["NOT"] if node.op == "NOT" else _UNARY
+    if isinstance(node, (InList, InSubquery, Between, IsNull)):
+        return _PREDICATE
+    return _ATOM
+
+
+def _quote_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _wrap(node: Node, min_precedence: int) -> str:
+    text = to_sql(node)
+    return f"({text})" if _precedence(node) < min_precedence else text
+
+
+def _render_order(items: List[OrderItem]) -> str:
+    parts = []
+    for item in items:
+        text = to_sql(item.expr)
+        if item.direction:
+            text += f" {item.direction}"
+        if item.nulls:
+            text += f" NULLS {item.nulls}"
+        parts.append(text)
+    return ", ".join(parts)
+
+
+def to_sql(node: Node) -> str:
+    """Render an AST node back to SQL text"""
+    if isinstance(node, Select):
+        return _render_select(node)
+    if isinstance(node, Column):
+        return f"{node.table}.{node.name}" if node.table else node.name
+    if isinstance(node, Star):
+        return f"{node.table}.*" if node.table else "*"
+    if isinstance(node, Literal):
+        if node.kind == "string":
+            return _quote_string(node.value)
+        if node.kind == "null":
+            return "NULL"
+        return str(node.value)
+    if isinstance(node, Param):
+        return node.name
+    if isinstance(node, Func):
+        args = ", ".join(to_sql(arg) for arg in node.args)
+        text = f"{node.name}({'DISTINCT ' if node.distinct else ''}{args})"
+        if node.over is not None:
+            window = []
+            if node.over.partition_by:
+                window.append("PARTITION BY " + ", ".join(to_sql(e) for e in node.over.partition_by))
+            if node.over.order_by:
+                window.append("ORDER BY " + _render_order(node.over.order_by))
+            text += f" OVER ({' '.join(window)})"
+        return text
+    if isinstance(node, Cast):
+        if node.style == "CAST":
+            return f"CAST({to_sql(node.expr)} AS {node.type_name})"
+        return f"{_wrap(node.expr, _ATOM)}::{node.type_name}"
+    if isinstance(node, Unary):
+        if node.op == "NOT":
+            return f"NOT {_wrap(node.operand, _PRECEDENCE['NOT'])}"
+        operand = _wrap(node.operand, _UNARY)
+        # "--" would start a comment
+        return f"- {operand}" if operand.startswith("-") else f"-{operand}"
+    if isinstance(node, Binary):
+        precedence = _precedence(node)
+        # Left-associative: the right operand needs parentheses at equal precedence
+        left = _wrap(node.left, precedence)
+        right = _wrap(node.right, precedence + 1)
+        return f"{left} {node.op} {right}"
+    if isinstance(node, InList):
+        values = ", ".join(to_sql(value) for value in node.values)
+        return f"{_wrap(node.expr, _ADDITIVE)} {'NOT IN' if node.negated else 'IN'} ({values})"
+    if isinstance(node, InSubquery):
+        return f"{_wrap(node.expr, _ADDITIVE)} {'NOT IN' if node.negated else 'IN'} ({to_sql(node.select)})"
+    if isinstance(node, Between):
+        keyword = "NOT BETWEEN" if node.negated else "BETWEEN"
+        return f"{_wrap(node.expr, _ADDITIVE)} {keyword} {_wrap(node.low, _ADDITIVE)} AND {_wrap(node.high, _ADDITIVE)}"
+    if isinstance(node, IsNull):
+        return f"{_wrap(node.expr, _ADDITIVE)} IS {'NOT NULL' if node.negated else 'NULL'}"
+    if isinstance(node, Case):
+        parts = ["CASE"]
+        if node.operand is not None:
+            parts.append(to_sql(node.operand))
+        for condition, result in node.whens:
+            parts.append(f"WHEN {to_sql(condition)} THEN {to_sql(result)}")
+        if node.else_ is not None:
+            parts.append(f"ELSE {to_sql(node.else_)}")
+        parts.append("END")
+        return " ".join(parts)
+    if isinstance(node, Exists):
+        return f"EXISTS ({to_sql(node.select)})"
+    if isinstance(node, Subquery):
+        return f"({to_sql(node.select)})"
+    if isinstance(node, SelectItem):
+        text = to_sql(node.expr)
+        return f"{text} AS {node.alias}" if node.alias else text
+    if isinstance(node, Table):
+        text = f"{node.schema}.{node.name}" if node.schema else node.name
+        return f"{text} {node.alias}" if node.alias else text
+    if isinstance(node, DerivedTable):
+        text = f"({to_sql(node.select)})"
+        return f"{text} {node.alias}" if node.alias else text
+    if isinstance(node, Join):
+        if node.kind == "CROSS JOIN" and node.on is None and node.using is None:
+            return f"CROSS JOIN {to_sql(node.right)}"
+        text = f"{node.kind} {to_sql(node.right)}"
+        if node.on is not None:
+            text += f" ON {to_sql(node.on)}"
+        if node.using is not None:
+            text += f" USING ({', '.join(node.using)})"
+        return text
+    raise TypeError(f"Cannot render {type(node).__name__}")
+
+
+def _render_select(select: Select) -> str:
+    parts = []
+    if select.ctes:
+        parts.append("WITH " + ", ".join(f"{cte.name} AS ({to_sql(cte.select)})" for cte in select.ctes))
+    parts.append("SELECT DISTINCT" if select.distinct else "SELECT")
+    parts.append(", ".join(to_sql(item) for item in select.items))
+    if select.from_ is not None:
+        parts.append("FROM " + to_sql(select.from_))
+    for join in select.joins:
+        parts.append(to_sql(join))
+    if select.where is not None:
+        parts.append("WHERE " + to_sql(select.where))
+    if select.group_by:
+        parts.append("GROUP BY " + ", ".join(to_sql(expr) for expr in select.group_by))
+    if select.having is not None:
+        parts.append("HAVING " + to_sql(select.having))
+    if select.order_by:
+        parts.append("ORDER BY " + _render_order(select.order_by))
+    if select.limit is not None:
+        parts.append("LIMIT " + to_sql(select.limit))
+    if select.offset is not None:
+        parts.append("OFFSET " + to_sql(select.offset))
+    return " ".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def walk(node: Any, into_subqueries: bool = True) -> Iterator[Node]:
+    """Depth-first walk over every AST node below (and including) ``node``"""
+    if isinstance(node, (list, tuple)):
+        for item in node:
+            yield from walk(item, into_subqueries)
+        return
+    if not isinstance(node, Node):
+        return
+    yield node
+    if not into_subqueries and isinstance(node, (Subquery, Exists, InSubquery, DerivedTable)):
+        if isinstance(node, InSubquery):
+            yield from walk(node.expr, into_subqueries)
+        return
+    if is_dataclass(node):
+        for f in fields(node):
+            yield from walk(getattr(node, f.name), into_subqueries)
+
+
+def conjuncts(expr: Optional[Node]) -> List[Node]:
+    """Split an AND chain into its terms"""
+    if expr is None:
+        return []
+    if isinstance(expr, Binary) and expr.op == "AND":
+        return conjuncts(expr.left) + conjuncts(expr.right)
+    return [expr]
+
+
+def and_all(terms: List[Node]) -> Optional[Node]:
+    result = None
+    for term in terms:
+        result = term if result is None else Binary("AND", result, term)
+    return result
+
+
+def is_aggregate(node: Node) -> bool:
+    return isinstance(node, Func) and node.name in AGGREGATE_FUNCTIONS and node.over is None
+
+
+def contains_aggregate(node: Any) -> bool:
+    return any(is_aggregate(n) for n in walk(node, into_subqueries=False))
+
+
+def contains_window(node: Any) -> bool:
+    return any(isinstance(n, Func) and n.over is not None for n in walk(node, into_subqueries=False))
@@ -0,0 +1,442 @@
+"""
+Semantics-preserving rewrites applied to LLM-generated SQL before execution.
+
+Each rule takes the parsed SELECT and returns True if it changed it. When no
+rule fires the original SQL text is executed unchanged.
+"""
+import copy
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import student_stats
+from app.config import settings
+from app.sql_parser import (
+    Binary, Column, DerivedTable, Func, InList, InSubquery, Literal,
+    OrderItem, Select, SelectItem, SQLSyntaxError, Star, Table,
+    and_all, conjuncts, contains_aggregate, contains_window, parse, to_sql, walk,
+)
+from app.sql_validator import sql_validator
+
+logger = logging.getLogger(__name__)
+
+# (column, literal) -> the stored spelling of that literal, or None if unknown
+ValueResolver = Callable[[str, str], Optional[str]]
+
+_TOP_N_RE = re.compile(r"\b(?:top|first|bottom|last|best|worst)\s+(\d+)\b", re.I)
+_SINGLE_TOP_RE = re.compile(
+    r"\b(?:which|what|who)\b.*\b(?:highest|lowest|maximum|minimum|most|least|best|worst|top)\b|"
+    r"\bthe\s+(?:top|best|worst)\s+(?:student|one|performer)\b",
+    re.I,
+)
+_PLURAL_HINT_RE = re.compile(r"\b(?:students|all|each|every|per|list)\b", re.I)
+
+
+@dataclass
+class RewriteContext:
+    question: Optional[str] = None
+    primary_keys: Optional[dict] = None
+    value_resolver: Optional[ValueResolver] = None
+    summary_tables: bool = False
+
+
+@dataclass
+class AppliedRewrite:
+    rule: str
+    before: str
+    after: str
+    cost_before: Optional[float] = None
+    cost_after: Optional[float] = None
+
+
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
+
+def _correct_literal(column, literal, context: RewriteContext) -> bool:
+    if not (isinstance(column, Column) and isinstance(literal, Literal) and literal.kind == "string"):
+        return False
+    canonical = context.value_resolver(column.name, literal.value)
+    if canonical is None or canonical == literal.value:
+        return False
+    literal.value = canonical
+    return True
+
+
+def canonicalize_literals(select: Select, context: RewriteContext) -> bool:
+    """Correct string literals compared with indexed columns to their stored spelling"""
+    if context.value_resolver is None:
+        return False
+    changed = False
+    for node in walk(select):
+        if isinstance(node, Binary) and node.op in ("=", "<>", "!="):
+            changed |= _correct_literal(node.left, node.right, context)
+            changed |= _correct_literal(node.right, node.left, context)
+        elif isinstance(node, InList):
+            for item in node.values:
+                changed |= _correct_literal(node.expr, item, context)
+    return changed
+
+
+def _is_plain_table_select(select: Select) -> bool:
+    return isinstance(select.from_, Table) and not select.joins and not select.ctes
+
+
+def _qualifiers(node) -> set:
+    """Table qualifiers used by column references outside subqueries"""
+    return {n.table for n in walk(node, into_subqueries=False) if isinstance(n, Column) and n.table}
+
+
+def _only_star_or_columns(items: List[SelectItem]) -> bool:
+    return all(
+        (isinstance(item.expr, Star) and item.expr.table is None) or
+        (isinstance(item.expr, Column) and item.alias is None)
+        for item in items
+    )
+
+
+def flatten_derived_table(select: Select, context: RewriteContext) -> bool:
+    """
+    SELECT ... FROM (SELECT * FROM t WHERE p) s WHERE q
+      -> SELECT ... FROM t s WHERE p AND q
+    Only for a bare projection/filter of one table (no grouping, limits or
+    DISTINCT inside). An inner ORDER BY moves to an outer query that has none,
+    so a following LIMIT still takes the intended rows; an outer ORDER BY
+    supersedes it.
+    """
+    derived = select.from_
+    if not isinstance(derived, DerivedTable) or select.joins:
+        return False
+    inner = derived.select
+    if not _is_plain_table_select(inner) or inner.joins:
+        return False
+    if inner.group_by or inner.having or inner.distinct or inner.limit or inner.offset:
+        return False
+    if not _only_star_or_columns(inner.items):
+        return False
+    if inner.order_by and not select.order_by and (
+            select.group_by or select.having or select.distinct
+            or contains_aggregate(select.items) or contains_window(select.items)):
+        # The inner order could only matter to the outer query through row order; keep it nested
+        return False
+
+    inner_projects_columns = not any(isinstance(item.expr, Star) for item in inner.items)
+    outer_has_star = any(isinstance(item.expr, Star) for item in select.items)
+    if inner_projects_columns and outer_has_star:
+        if len(select.items) != 1 or select.items[0].expr.table not in (None, derived.alias):
+            return False
+        select.items = [SelectItem(Column(item.expr.name)) for item in inner.items]
+
+    table = copy.copy(inner.from_)
+    if derived.alias:
+        if _qualifiers([inner.where, inner.items, inner.order_by]) - {derived.alias}:
+            # Inner references are qualified with a name that won't exist after flattening
+            return False
+        table.alias = derived.alias
+    select.from_ = table
+    select.where = and_all(conjuncts(inner.where) + conjuncts(select.where))
+    if inner.order_by and not select.order_by:
+        select.order_by = inner.order_by
+    return True
+
+
+def remove_redundant_in_subquery(select: Select, context: RewriteContext) -> bool:
+    """
+    SELECT ... FROM t WHERE pk IN (SELECT pk FROM t WHERE p) -> ... WHERE p
+    Exact when the IN column is t's primary key.
+    """
+    if not _is_plain_table_select(select) or not context.primary_keys:
+        return False
+    table = select.from_.name.lower()
+    primary_key = context.primary_keys.get(table)
+    if primary_key is None:
+        return False
+
+    changed = False
+    terms = []
+    for term in conjuncts(select.where):
+        inner = term.select if isinstance(term, InSubquery) else None
+        if (inner is not None and not term.negated
+                and isinstance(term.expr, Column) and term.expr.name.lower() == primary_key
+                and _is_plain_table_select(inner) and inner.from_.name.lower() == table
+                and not (inner.group_by or inner.having or inner.limit or inner.offset or inner.distinct)
+                and len(inner.items) == 1 and isinstance(inner.items[0].expr, Column)
+                and inner.items[0].expr.name.lower() == primary_key
+                and not _qualifiers(inner.where) - {select.from_.alias or select.from_.name}
+                and term.expr.table in (None, select.from_.alias or select.from_.name)):
+            terms.extend(conjuncts(inner.where))
+            changed = True
+        else:
+            terms.append(term)
+
+    if changed:
+        select.where = and_all(terms)
+    return changed
+
+
+def prune_derived_projection(select: Select, context: RewriteContext) -> bool:
+    """
+    SELECT AVG(marks) FROM (SELECT * FROM t ... LIMIT n) s
+      -> SELECT AVG(marks) FROM (SELECT marks FROM t ... LIMIT n) s
+    """
+    derived = select.from_
+    if not isinstance(derived, DerivedTable) or select.joins:
+        return False
+    inner = derived.select
+    if not (len(inner.items) == 1 and isinstance(inner.items[0].expr, Star)):
+        return False
+    if inner.distinct or inner.group_by or not _is_plain_table_select(inner):
+        return False
+
+    referenced = []
+    for node in walk([select.items, select.where, select.group_by, select.having, select.order_by],
+                     into_subqueries=False):
+        if isinstance(node, Star) and not _is_count_star_arg(node, select):
+            return False
+        if isinstance(node, Column):
+            if node.table not in (None, derived.alias):
+                return False
+            if node.name not in referenced:
+                referenced.append(node.name)
+
+    if not referenced:
+        primary_key = (context.primary_keys or {}).get(inner.from_.name.lower())
+        if primary_key is None:
+            return False
+        referenced = [primary_key]
+
+    inner.items = [SelectItem(Column(name)) for name in referenced]
+    return True
+
+
+def _is_count_star_arg(star: Star, select: Select) -> bool:
+    return any(isinstance(node, Func) and node.args and node.args[0] is star
+               for node in walk(select.items, into_subqueries=False))
+
+
+_FLIPPED = {"=": "=", "<>": "<>", "!=": "!=", "<": ">", ">": "<", "<=": ">=", ">=": "<="}
+
+
+def _int_literal(node) -> Optional[int]:
+    if isinstance(node, Literal) and node.kind == "number" and re.fullmatch(r"-?\d+", str(node.value)):
+        return int(node.value)
+    return None
+
+
+def _sargable_term(term):
+    if not isinstance(term, Binary) or term.op not in _FLIPPED:
+        return None
+
+    left, op, right = term.left, term.op, term.right
+    if isinstance(left, Literal) and not isinstance(right, Literal):
+        left, op, right = right, _FLIPPED[op], left
+
+    # col + c OP k  ->  col OP k - c   (integers only, so no rounding changes)
+    if isinstance(left, Binary) and left.op in ("+", "-") and isinstance(left.left, Column):
+        offset, bound = _int_literal(left.right), _int_literal(right)
+        if offset is not None and bound is not None:
+            value = bound - offset if left.op == "+" else bound + offset
+            return Binary(op, left.left, Literal(str(value), "number"))
+
+    # LOWER(col) = 'x' is left alone: the only index-friendly forms list the stored
+    # spellings, and the value index can't vouch that a row written since its
+    # last refresh doesn't add another
+    return None
+
+
+def make_predicates_sargable(select: Select, context: RewriteContext) -> bool:
+    """Rewrite WHERE terms so the bare column is compared, letting indexes apply"""
+    changed = False
+    terms = []
+    for term in conjuncts(select.where):
+        rewritten = _sargable_term(term)
+        terms.append(rewritten or term)
+        changed = changed or rewritten is not None
+    if changed:
+        select.where = and_all(terms)
+    return changed
+
+
+def use_summary_table(select: Select, context: RewriteContext) -> bool:
+    """Answer per class/section aggregates of marks from student_stats"""
+    return context.summary_tables and student_stats.rewrite_select(select)
+
+
+def _requested_limit(question: Optional[str]) -> Optional[int]:
+    if not question:
+        return None
+    match = _TOP_N_RE.search(question)
+    if match:
+        return int(match.group(1))
+    if _SINGLE_TOP_RE.search(question) and not _PLURAL_HINT_RE.search(question):
+        return 1
+    return None
+
+
+def add_limit_for_top_questions(select: Select, context: RewriteContext) -> bool:
+    """
+    "Top 5 students by marks" answered with ORDER BY but no LIMIT -> add LIMIT 5.
+    Only for plain sorted listings (no grouping, DISTINCT or window functions).
+    """
+    if not select.order_by or select.limit is not None or select.offset is not None:
+        return False
+    if select.group_by or select.distinct or contains_aggregate(select.items) or contains_window(select.items):
+        return False
+    limit = _requested_limit(context.question)
+    if limit is None:
+        return False
+    select.limit = Literal(str(limit), "number")
+    return True
+
+
+def push_limit_into_derived_table(select: Select, context: RewriteContext) -> bool:
+    """
+    SELECT ... FROM (SELECT ... FROM t) s ORDER BY c LIMIT n
+      -> SELECT ... FROM (SELECT ... FROM t ORDER BY c LIMIT n) s ORDER BY c LIMIT n
+    when the outer query only projects and sorts the derived table's rows.
+    """
+    derived = select.from_
+    if select.limit is None or select.offset is not None or not isinstance(derived, DerivedTable):
+        return False
+    if select.joins or select.where or select.group_by or select.having or select.distinct:
+        return False
+    if contains_aggregate(select.items) or contains_window(select.items):
+        return False
+    inner = derived.select
+    if inner.limit is not None or inner.offset is not None or inner.group_by or inner.having or inner.distinct:
+        return False
+    if contains_aggregate(inner.items) or contains_window(inner.items):
+        return False
+
+    # Outer sort keys must be columns the inner query exposes under the same name
+    exposed = {
+        (item.alias or (item.expr.name if isinstance(item.expr, Column) else None))
+        for item in inner.items
+    }
+    has_star = any(isinstance(item.expr, Star) for item in inner.items)
+    inner_order = []
+    for item in select.order_by:
+        if not isinstance(item.expr, Column) or item.expr.table not in (None, derived.alias):
+            return False
+        if item.expr.name not in exposed and not has_star:
+            return False
+        source = next((i.expr for i in inner.items if i.alias == item.expr.name), Column(item.expr.name))
+        inner_order.append(OrderItem(copy.deepcopy(source), item.direction, item.nulls))
+
+    inner.order_by = inner_order
+    inner.limit = copy.deepcopy(select.limit)
+    return True
+
+
+RULES: List[Tuple[str, Callable[[Select, RewriteContext], bool]]] = [
+    ("canonicalize_literals", canonicalize_literals),
+    ("flatten_derived_table", flatten_derived_table),
+    ("remove_redundant_in_subquery", remove_redundant_in_subquery),
+    ("prune_derived_projection", prune_derived_projection),
+    ("make_predicates_sargable", make_predicates_sargable),
+    ("use_summary_table", use_summary_table),
+    ("add_limit_for_top_questions", add_limit_for_top_questions),
+    ("push_limit_into_derived_table", push_limit_into_derived_table),
+]
+
+
+# ---------------------------------------------------------------------------
+# Stage
+# ---------------------------------------------------------------------------
+
+def estimate_cost(db: Session, sql_query: str) -> Optional[float]:
+    """
+    Planner total cost from EXPLAIN (PostgreSQL only). The SQL is validated
+    first, since it may not have been yet, and EXPLAIN runs in a savepoint so
+    a failure doesn't roll back the caller's transaction.
+    """
+    if db is None or db.get_bind().dialect.name != "postgresql":
+        return None
+    try:
+        sql_query = sql_validator.validate(sql_query).sql
+    except ValueError as e:
+        logger.debug("Not estimating cost of invalid SQL: %s", e)
+        return None
+    try:
+        with db.begin_nested():
+            plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+    except Exception as e:
+        logger.warning("Could not estimate cost: %s", e)
+        return None
+
+
+class SQLRewriter:
+    def __init__(self, primary_keys: Optional[dict] = None, value_resolver: Optional[ValueResolver] = None,
+                 summary_tables: bool = False, log_costs: bool = False):
+        self.primary_keys = primary_keys or {}
+        self.value_resolver = value_resolver
+        self.summary_tables = summary_tables
+        self.log_costs = log_costs
+
+    def rewrite(self, sql_query: str, question: Optional[str] = None) -> Tuple[str, List[AppliedRewrite]]:
+        """Apply every rule that fires; returns the new SQL and what changed"""
+        try:
+            select = parse(sql_query)
+        except SQLSyntaxError:
+            return sql_query, []
+
+        context = RewriteContext(
+            question, self.primary_keys, self.value_resolver, self.summary_tables
+        )
+        applied = []
+        current = sql_query
+        for name, rule in RULES:
+            if rule(select, context):
+                rendered = to_sql(select)
+                if rendered != current:
+                    applied.append(AppliedRewrite(name, current, rendered))
+                    current = rendered
+        return current, applied
+
+    def rewrite_and_log(self, db: Session, sql_query: str, question: Optional[str] = None) -> str:
+        new_sql, applied = self.rewrite(sql_query, question)
+        costs = {}
+        for rewrite in applied:
+            if self.log_costs:
+                for sql in (rewrite.before, rewrite.after):
+                    if sql not in costs:
+                        costs[sql] = estimate_cost(db, sql)
+                rewrite.cost_before = costs[rewrite.before]
+                rewrite.cost_after = costs[rewrite.after]
+            logger.info(
+                "SQL rewrite %s: %r -> %r (cost %s -> %s)",
+                rewrite.rule, rewrite.before, rewrite.after, rewrite.cost_before, rewrite.cost_after
+            )
+        return new_sql
+
+
+def primary_keys_from_metadata(metadata) -> dict:
+    """Single-column primary key of each table, for remove_redundant_in_subquery"""
+    keys = {}
+    for table in metadata.tables.values():
+        columns = list(table.primary_key.columns)
+        if len(columns) == 1:
+            keys[table.name.lower()] = columns[0].name.lower()
+    return keys
+
+
+def _create_rewriter() -> SQLRewriter:
+    from app.models import Base
+    from app.value_index import value_index
+    return SQLRewriter(
+        primary_keys=primary_keys_from_metadata(Base.metadata),
+        value_resolver=value_index.canonical,
+        summary_tables=settings.STUDENT_STATS_ENABLED,
+        log_costs=settings.SQL_REWRITE_LOG_COSTS,
+    )
+
+
+sql_rewriter = _create_rewriter()
@@ -0,0 +1,32 @@
+import hashlib
+from typing import Optional
+
+from app.cache import make_cache
+from app.config import settings
+
+
+class GeneratedSQLStore:
+    """
+    Bounded registry of generated SQL so clients can refer back to a query
+    (e.g. to export its full result) by id instead of resending the SQL.
+    With the shared cache backend an id works on any worker.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = make_cache("generated_sql", max_entries=max_entries)
+
+    @staticmethod
+    def make_id(sql_query: str) -> str:
+        return hashlib.sha256(sql_query.encode()).hexdigest()[:16]
+
+    def add(self, sql_query: str) -> str:
+        sql_id = self.make_id(sql_query)
+        self._entries.set(sql_id, sql_query)
+        return sql_id
+
+    def get(self, sql_id: str) -> Optional[str]:
+        return self._entries.get(sql_id)
+
+
+generated_sql_store = GeneratedSQLStore(max_entries=settings.GENERATED_SQL_STORE_SIZE)
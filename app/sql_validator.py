@@ -0,0 +1,141 @@
+"""
+Single-pass, token-based validation of generated SQL.
+
+Keywords are matched as whole tokens, so identifiers such as ``updated_at``
+are not mistaken for ``UPDATE`` and text inside strings or comments is never
+inspected as SQL. Validated queries are memoized by their exact text, and each
+one gets a canonical fingerprint (literals replaced by ``?``) that identifies
+its shape for caching and metrics.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.cache import LRUCache
+from app.config import settings
+from app.sql_parser import RESERVED, Select, SQLSyntaxError, Token, parse_tokens, tokenize
+
+FORBIDDEN_KEYWORDS = {
+    "DROP", "DELETE", "TRUNCATE", "ALTER", "UPDATE", "INSERT",
+    "CREATE", "GRANT", "REVOKE", "COPY", "MERGE", "VACUUM", "LOCK", "CALL", "INTO",
+}
+
+# Functions with side effects or filesystem/network access
+FORBIDDEN_FUNCTIONS = {
+    "PG_SLEEP", "PG_TERMINATE_BACKEND", "PG_CANCEL_BACKEND", "PG_RELOAD_CONF",
+    "PG_READ_FILE", "PG_READ_BINARY_FILE", "PG_LS_DIR", "LO_IMPORT", "LO_EXPORT",
+    "DBLINK", "DBLINK_EXEC", "SET_CONFIG", "NEXTVAL", "SETVAL",
+}
+
+_LITERAL_KINDS = ("string", "escape_string", "dollar_string", "number")
+
+
+@dataclass(frozen=True)
+class ValidatedQuery:
+    sql: str                    # executable SQL: comments and trailing semicolons removed
+    canonical: str              # normalized token stream with literals replaced by ?
+    fingerprint: str            # short hash of ``canonical``
+    tokens: tuple
+    ast: Optional[Select] = None  # None when outside the parser's subset
+
+    @property
+    def literal_count(self) -> int:
+        return sum(1 for token in self.tokens if token.kind in _LITERAL_KINDS)
+
+
+def _canonical_token(token: Token) -> str:
+    if token.kind in _LITERAL_KINDS:
+        return "?"
+    if token.kind == "ident":
+        return token.upper if token.upper in RESERVED else token.value.lower()
+    return token.value
+
+
+def canonicalize(tokens: List[Token]) -> str:
+    return " ".join(_canonical_token(token) for token in tokens)
+
+
+def fingerprint_of(canonical: str) -> str:
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def _function_name(token: Token) -> str:
+    """Case-folded name of a called function; "pg_sleep"(1) is still pg_sleep"""
+    if token.kind == "quoted_ident":
+        return token.value[1:-1].replace('""', '"').upper()
+    return token.upper
+
+
+def _strip_comments(sql: str, comments: List[Token]) -> str:
+    for comment in reversed(comments):
+        # Same-length padding keeps the other tokens' positions valid
+        sql = sql[:comment.pos] + " " * len(comment.value) + sql[comment.pos + len(comment.value):]
+    return sql
+
+
+class SQLValidator:
+    def __init__(self, cache_size: int = 1000):
+        self._cache = LRUCache(max_entries=cache_size)
+
+    def validate(self, sql_query: str) -> ValidatedQuery:
+        """Validate a read-only query, reusing the memoized result for repeated text"""
+        cached = self._cache.get(sql_query)
+        if cached is not None:
+            return cached
+        validated = self._validate(sql_query)
+        self._cache.set(sql_query, validated)
+        return validated
+
+    def _validate(self, sql_query: str) -> ValidatedQuery:
+        try:
+            all_tokens = tokenize(sql_query, keep_comments=True)
+        except SQLSyntaxError as e:
+            raise ValueError(f"Could not parse query: {e}")
+
+        comments = [token for token in all_tokens if token.kind == "comment"]
+        tokens = [token for token in all_tokens if token.kind != "comment"]
+
+        if not tokens or not tokens[0].is_keyword("SELECT", "WITH"):
+            raise ValueError("Only SELECT queries are allowed for security reasons")
+
+        for index, token in enumerate(tokens):
+            if token.kind not in ("ident", "quoted_ident"):
+                continue
+            if token.kind == "ident" and token.upper in FORBIDDEN_KEYWORDS:
+                raise ValueError(f"Query contains forbidden keyword: {token.upper}")
+            next_token = tokens[index + 1] if index + 1 < len(tokens) else None
+            if next_token is not None and next_token.kind == "punct" and next_token.value == "(":
+                name = _function_name(token)
+                if name in FORBIDDEN_FUNCTIONS:
+                    raise ValueError(f"Query calls forbidden function: {name}")
+
+        # Trailing semicolons are fine; anything after a semicolon is a second statement
+        while tokens and tokens[-1].value == ";" and tokens[-1].kind == "punct":
+            tokens.pop()
+        if any(token.kind == "punct" and token.value == ";" for token in tokens):
+            raise ValueError("Only a single SQL statement is allowed")
+
+        if tokens[0].is_keyword("WITH") and not any(token.is_keyword("SELECT") for token in tokens):
+            raise ValueError("Only SELECT queries are allowed for security reasons")
+
+        executable = _strip_comments(sql_query, comments)[:tokens[-1].pos + len(tokens[-1].value)].strip()
+
+        try:
+            ast = parse_tokens(tokens)
+        except SQLSyntaxError:
+            ast = None
+
+        canonical = canonicalize(tokens)
+        return ValidatedQuery(
+            sql=executable,
+            canonical=canonical,
+            fingerprint=fingerprint_of(canonical),
+            tokens=tuple(tokens),
+            ast=ast,
+        )
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+sql_validator = SQLValidator(cache_size=settings.SQL_VALIDATION_CACHE_SIZE)
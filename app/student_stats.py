@@ -0,0 +1,248 @@
+"""
+Incrementally maintained marks aggregates per (class_name, section).
+
+``student_stats`` holds count, sum, min and max of ``marks`` for every class
+and section. Writers call ``record_students`` in the same transaction as their
+insert, so the aggregates commit or roll back together with the rows.
+``rewrite_select`` answers simple aggregate queries over ``students`` from the
+(at most a few hundred rows) summary instead of scanning the base table.
+"""
+import copy
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from app.models import Student, StudentStats
+from app.sql_parser import (
+    Binary, Column, DerivedTable, Exists, Func, InSubquery, Literal, Node,
+    Select, SelectItem, Star, Subquery, Table, contains_aggregate, is_aggregate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+SOURCE_TABLE = "students"
+STATS_TABLE = "student_stats"
+GROUP_COLUMNS = ("class_name", "section")
+MEASURE = "marks"
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+def _upsert_statement(dialect: str, class_name: str, section: str, count: int, total: int, low: int, high: int):
+    values = dict(class_name=class_name, section=section, student_count=count,
+                  marks_sum=total, marks_min=low, marks_max=high)
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        least, greatest = func.least, func.greatest
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        least, greatest = func.min, func.max  # two-argument scalar forms
+    else:
+        return None
+
+    statement = dialect_insert(StudentStats).values(**values)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[StudentStats.class_name, StudentStats.section],
+        set_={
+            "student_count": StudentStats.student_count + excluded.student_count,
+            "marks_sum": StudentStats.marks_sum + excluded.marks_sum,
+            "marks_min": least(func.coalesce(StudentStats.marks_min, excluded.marks_min), excluded.marks_min),
+            "marks_max": greatest(func.coalesce(StudentStats.marks_max, excluded.marks_max), excluded.marks_max),
+        },
+    )
+
+
+def _merge_fallback(db: Session, class_name: str, section: str, count: int, total: int, low: int, high: int):
+    row = db.get(StudentStats, (class_name, section), with_for_update=True)
+    if row is None:
+        db.add(StudentStats(class_name=class_name, section=section, student_count=count,
+                            marks_sum=total, marks_min=low, marks_max=high))
+        db.flush()
+        return
+    db.execute(
+        update(StudentStats)
+        .where(StudentStats.class_name == class_name, StudentStats.section == section)
+        .values(
+            student_count=StudentStats.student_count + count,
+            marks_sum=StudentStats.marks_sum + total,
+            marks_min=min(low, row.marks_min) if row.marks_min is not None else low,
+            marks_max=max(high, row.marks_max) if row.marks_max is not None else high,
+        )
+    )
+
+
+def record_students(db: Session, rows: Iterable[Tuple[str, str, int]]):
+    """
+    Fold new (class_name, section, marks) rows into the aggregates.
+    Must run in the caller's transaction, before it commits.
+    """
+    groups = defaultdict(lambda: [0, 0, None, None])
+    for class_name, section, marks in rows:
+        group = groups[(class_name, section)]
+        group[0] += 1
+        group[1] += marks
+        group[2] = marks if group[2] is None else min(group[2], marks)
+        group[3] = marks if group[3] is None else max(group[3], marks)
+
+    dialect = db.get_bind().dialect.name
+    # Stable order so concurrent writers lock groups in the same sequence
+    for (class_name, section), (count, total, low, high) in sorted(groups.items()):
+        statement = _upsert_statement(dialect, class_name, section, count, total, low, high)
+        if statement is None:
+            _merge_fallback(db, class_name, section, count, total, low, high)
+        else:
+            db.execute(statement)
+
+
+def rebuild(db: Session):
+    """Recompute every aggregate from ``students`` (one full scan)"""
+    db.execute(StudentStats.__table__.delete())
+    db.execute(
+        insert(StudentStats).from_select(
+            ["class_name", "section", "student_count", "marks_sum", "marks_min", "marks_max"],
+            select(
+                Student.class_name, Student.section, func.count(), func.sum(Student.marks),
+                func.min(Student.marks), func.max(Student.marks),
+            ).group_by(Student.class_name, Student.section),
+        )
+    )
+    db.commit()
+
+
+def ensure_consistent(db: Session) -> bool:
+    """Rebuild when the summary doesn't account for every student; True if rebuilt"""
+    summarized = total_students(db)
+    actual = db.execute(text("SELECT COUNT(*) FROM students")).scalar()
+    if summarized == actual:
+        return False
+    logger.warning("student_stats covers %d of %d students; rebuilding", summarized, actual)
+    rebuild(db)
+    return True
+
+
+def total_students(db: Session) -> int:
+    return db.execute(select(func.coalesce(func.sum(StudentStats.student_count), 0))).scalar()
+
+
+# ---------------------------------------------------------------------------
+# Query rewrite
+# ---------------------------------------------------------------------------
+
+def _sum(column: str) -> Func:
+    return Func("SUM", [Column(column)])
+
+
+def _is_measure(args) -> bool:
+    return len(args) == 1 and isinstance(args[0], Column) and args[0].name.lower() == MEASURE
+
+
+def _counts_rows(args) -> bool:
+    # Every students column is NOT NULL, so COUNT(col) and COUNT(1) equal COUNT(*)
+    if len(args) != 1:
+        return False
+    arg = args[0]
+    return (isinstance(arg, Star) and arg.table is None) or isinstance(arg, Column) or \
+        (isinstance(arg, Literal) and arg.kind == "number")
+
+
+def _aggregate(node: Func, grouped: bool) -> Optional[Node]:
+    if node.distinct:
+        return None
+    if node.name == "COUNT" and _counts_rows(node.args):
+        count = _sum("student_count")
+        # SUM over no groups is NULL where COUNT(*) is 0
+        return count if grouped else Func("COALESCE", [count, Literal("0", "number")])
+    if not _is_measure(node.args):
+        return None
+    if node.name == "SUM":
+        return _sum("marks_sum")
+    if node.name == "MIN":
+        return Func("MIN", [Column("marks_min")])
+    if node.name == "MAX":
+        return Func("MAX", [Column("marks_max")])
+    if node.name == "AVG":
+        # * 1.0 keeps AVG's numeric (not integer) division on every dialect
+        return Binary("/", Binary("*", _sum("marks_sum"), Literal("1.0", "number")), _sum("student_count"))
+    return None
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _translate(node, grouped: bool, aliases: set):
+    if isinstance(node, list):
+        return [_translate(item, grouped, aliases) for item in node]
+    if not isinstance(node, Node):
+        return node
+    if isinstance(node, (Subquery, Exists, InSubquery, DerivedTable, Star)):
+        raise _Unsupported()
+    if isinstance(node, Column):
+        if node.table is None and node.name in aliases:
+            return node
+        if node.name.lower() not in GROUP_COLUMNS or node.table not in (None, SOURCE_TABLE):
+            raise _Unsupported()
+        return Column(node.name)
+    if isinstance(node, Func):
+        if node.over is not None:
+            raise _Unsupported()
+        if is_aggregate(node):
+            rewritten = _aggregate(node, grouped)
+            if rewritten is None:
+                raise _Unsupported()
+            return rewritten
+    translated = copy.copy(node)
+    for name, value in vars(node).items():
+        setattr(translated, name, _translate(value, grouped, aliases))
+    return translated
+
+
+def _default_alias(item: SelectItem) -> Optional[str]:
+    # Keep the output name the aggregate would have had (PostgreSQL style)
+    if item.alias is None and isinstance(item.expr, Func):
+        return item.expr.name.lower()
+    return item.alias
+
+
+def rewrite_select(select_node: Select) -> bool:
+    """Point a simple aggregate query over ``students`` at ``student_stats`` in place"""
+    table = select_node.from_
+    if not (isinstance(table, Table) and table.name.lower() == SOURCE_TABLE and table.schema is None):
+        return False
+    if select_node.joins or select_node.distinct or select_node.ctes:
+        return False
+    if not any(contains_aggregate(item.expr) for item in select_node.items):
+        return False
+    if table.alias is not None:
+        return False  # qualified references to the alias aren't translated
+
+    grouped = bool(select_node.group_by)
+    aliases = {item.alias for item in select_node.items if item.alias}
+    try:
+        items = [
+            SelectItem(_translate(item.expr, grouped, set()), _default_alias(item))
+            for item in select_node.items
+        ]
+        where = _translate(select_node.where, grouped, set())
+        group_by = _translate(select_node.group_by, grouped, set())
+        having = _translate(select_node.having, grouped, aliases)
+        order_by = _translate(select_node.order_by, grouped, aliases)
+    except _Unsupported:
+        return False
+    if contains_aggregate(where):
+        return False
+
+    select_node.items = items
+    select_node.from_ = Table(STATS_TABLE)
+    select_node.where = where
+    select_node.group_by = group_by
+    select_node.having = having
+    select_node.order_by = order_by
+    return True
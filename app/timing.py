@@ -0,0 +1,119 @@
+"""
+Per-request stage timings.
+
+``TimingMiddleware`` gives each HTTP request a ``RequestTimings`` in a
+context variable; code on the request's path wraps its stages in
+``with stage("llm"):``. Sync endpoints run in the threadpool with a copy of
+the context, so they record into the same object. When the response starts
+the stages go out in a ``Server-Timing`` header, e.g.
+
+    Server-Timing: cache;dur=0.2, prompt;dur=0.4, llm;dur=1840.3, validate;dur=0.3, execute;dur=2.1, total;dur=1851.0
+
+and once the request is done they are observed into the
+``nl2sql_stage_duration_seconds`` histogram labelled by model and cache
+outcome (set with ``label()``).
+
+Outside a request, or with METRICS_ENABLED off, ``stage()`` only does a
+context variable lookup. Work handed to other threads (batch and job
+workers) isn't timed per request.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from app.metrics import request_seconds, stage_seconds
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.stages: Dict[str, float] = {}  # seconds, in the order stages first ran
+        self.labels: Dict[str, str] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+    def observe(self):
+        model = self.labels.get("model", "")
+        cache = self.labels.get("cache", "")
+        for name, seconds in self.stages.items():
+            stage_seconds.observe(seconds, stage=name, model=model, cache=cache)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block as ``name`` in the current request, if there is one"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def label(**labels: str):
+    """Set histogram labels (model, cache) for the current request's stages"""
+    timings = _current.get()
+    if timings is not None:
+        timings.labels.update({name: str(value) for name, value in labels.items()})
+
+
+class TimingMiddleware:
+    """ASGI middleware adding Server-Timing and recording request and stage histograms"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}  # endpoint -> path template
+
+    def _route(self, scope) -> str:
+        """The matched route's path template, so /jobs/{job_id} is one series"""
+        endpoint = scope.get("endpoint")
+        if endpoint not in self._routes:
+            routes = getattr(getattr(scope.get("app"), "router", None), "routes", ())
+            self._routes[endpoint] = next(
+                (route.path for route in routes if getattr(route, "endpoint", None) is endpoint), "unmatched"
+            )
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing(total=time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            request_seconds.observe(time.perf_counter() - start, method=scope["method"],
+                                    route=self._route(scope), status=status)
+            timings.observe()
@@ -0,0 +1,258 @@
+"""
+Index of the distinct values of low-cardinality text columns in ``students``.
+
+Used to recognize entity mentions ("DevOps", "section B") in questions, to
+correct literals in generated SQL to their stored spelling ('data science' ->
+'Data Science') and to tell the LLM which values exist for what it was asked.
+
+Mentions are found with a character trie over the lowercased values; literals
+and question words that match nothing exactly fall back to a fuzzy match. The
+index is topped up incrementally from rows above the last seen id and fully
+reloaded less often, so deleted values eventually disappear.
+"""
+import difflib
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import String, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Values this short ("A", "B") are only recognized next to their column word,
+# otherwise every article "a" in a question would be a section mention
+_SHORT_VALUE_LENGTH = 2
+# Fuzzy correction of values shorter than this is too likely to pick a different value
+_MIN_FUZZY_LENGTH = 5
+_TERMINAL = "\0"
+
+
+@dataclass(frozen=True)
+class Mention:
+    column: str
+    value: str   # canonical value as stored
+    start: int   # span in the question
+    end: int
+
+
+def _compact(value: str) -> str:
+    return re.sub(r"[\W_]+", "", value.lower())
+
+
+def text_columns(model) -> List[str]:
+    """Non-key string columns of a model, the candidates for indexing"""
+    return [
+        column.name for column in model.__table__.columns
+        if isinstance(column.type, String) and not column.primary_key and not column.unique
+    ]
+
+
+class ValueIndex:
+    def __init__(self, columns: Optional[List[str]] = None, refresh_seconds: float = 30,
+                 full_refresh_seconds: float = 600, max_values: int = 200, fuzzy_cutoff: float = 0.8):
+        # columns=None discovers the low-cardinality text columns of models.Student on refresh
+        self.columns = tuple(columns) if columns else None
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.max_values = max_values
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._values: Dict[str, List[str]] = {}
+        self._by_lower: Dict[str, Dict[str, List[str]]] = {}
+        self._by_compact: Dict[str, Dict[str, str]] = {}
+        self._trie: dict = {}
+        self._watermark: Optional[int] = None
+        self._loaded_at: Optional[float] = None
+        self._full_loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # -- building -----------------------------------------------------------
+
+    def load(self, values: Dict[str, List[str]], watermark: Optional[int] = None):
+        """Replace the indexed values, e.g. {"class_name": ["DevOps", ...]}"""
+        values = {column: sorted(set(v for v in column_values if v)) for column, column_values in values.items()}
+        by_lower = {}
+        by_compact = {}
+        trie = {}
+        for column, column_values in values.items():
+            lower_map = by_lower.setdefault(column, {})
+            compact_map = by_compact.setdefault(column, {})
+            for value in column_values:
+                lower_map.setdefault(value.lower(), []).append(value)
+                compact_map.setdefault(_compact(value), value)
+                node = trie
+                for char in value.lower():
+                    node = node.setdefault(char, {})
+                node.setdefault(_TERMINAL, []).append((column, value))
+
+        now = time.monotonic()
+        with self._lock:
+            self._values = values
+            self._by_lower = by_lower
+            self._by_compact = by_compact
+            self._trie = trie
+            self._watermark = watermark
+            self._loaded_at = now
+            self._full_loaded_at = now
+
+    def add(self, column: str, values: List[str]):
+        """Add newly seen values without a full reload"""
+        known = self._by_lower.get(column, {})
+        new = [value for value in values if value and value not in known.get(value.lower(), [])]
+        if not new:
+            return
+        merged = {name: list(column_values) for name, column_values in self._values.items()}
+        merged.setdefault(column, []).extend(new)
+        full_loaded_at = self._full_loaded_at
+        self.load(merged, self._watermark)
+        self._full_loaded_at = full_loaded_at
+
+    def _candidate_columns(self) -> List[str]:
+        if self.columns:
+            return list(self.columns)
+        from app.models import Student
+        return text_columns(Student)
+
+    def refresh(self, db: Session):
+        """Full reload of every low-cardinality column"""
+        values = {}
+        for column in self._candidate_columns():
+            rows = db.execute(text(
+                f"SELECT DISTINCT {column} FROM students WHERE {column} IS NOT NULL LIMIT {self.max_values + 1}"
+            )).fetchall()
+            if len(rows) <= self.max_values:
+                values[column] = [row[0] for row in rows]
+        watermark = db.execute(text("SELECT MAX(id) FROM students")).scalar()
+        self.load(values, watermark)
+
+    def refresh_incremental(self, db: Session):
+        """Add values from rows inserted since the last refresh"""
+        watermark = self._watermark
+        latest = db.execute(text("SELECT MAX(id) FROM students")).scalar()
+        if latest is not None and (watermark is None or latest > watermark):
+            for column in list(self._values):
+                rows = db.execute(
+                    text(f"SELECT DISTINCT {column} FROM students WHERE id > :watermark AND {column} IS NOT NULL"),
+                    {"watermark": watermark or 0}
+                )
+                self.add(column, [row[0] for row in rows])
+            self._watermark = latest
+        self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session):
+        """Top up or reload the index when it is older than the refresh intervals"""
+        now = time.monotonic()
+        if self._full_loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        try:
+            if self._full_loaded_at is None or now - self._full_loaded_at >= self.full_refresh_seconds:
+                self.refresh(db)
+            else:
+                self.refresh_incremental(db)
+        except Exception as e:
+            # Keep serving the previous values; retry after the next interval
+            self._loaded_at = now
+            if self._full_loaded_at is None:
+                self._full_loaded_at = now
+            logger.warning("Value index refresh failed: %s", e)
+
+    # -- lookups ------------------------------------------------------------
+
+    def values(self, column: str) -> List[str]:
+        return list(self._values.get(column, []))
+
+    def canonical(self, column: str, value: str) -> Optional[str]:
+        """
+        The stored spelling of a literal compared with ``column``: exact, then
+        case-insensitive, then ignoring spaces/punctuation, then fuzzy.
+        None when the column isn't indexed or nothing is close enough.
+        """
+        by_lower = self._by_lower.get(column)
+        if not by_lower:
+            return None
+        variants = by_lower.get(value.lower())
+        if variants:
+            return value if value in variants else variants[0]
+        compact = self._by_compact[column].get(_compact(value))
+        if compact is not None:
+            return compact
+        if len(value) < _MIN_FUZZY_LENGTH:
+            return None
+        matches = difflib.get_close_matches(value.lower(), list(by_lower), n=1, cutoff=self.fuzzy_cutoff)
+        return by_lower[matches[0]][0] if matches else None
+
+    def _longest_match(self, question: str, start: int) -> Optional[Tuple[int, List[tuple]]]:
+        node = self._trie
+        best = None
+        position = start
+        while position < len(question):
+            node = node.get(question[position])
+            if node is None:
+                break
+            position += 1
+            if _TERMINAL in node and (position == len(question) or not question[position].isalnum()):
+                best = (position, node[_TERMINAL])
+        return best
+
+    @staticmethod
+    def _next_to_word(question: str, start: int, end: int, word: str) -> bool:
+        before = re.search(r"(\w+)\s+$", question[:start])
+        after = re.match(r"\s+(\w+)", question[end:])
+        return (before is not None and before.group(1) == word) or (after is not None and after.group(1) == word)
+
+    def find_mentions(self, question: str) -> List[Mention]:
+        """Non-overlapping value mentions in the question, left to right"""
+        question = question.lower()
+        mentions = []
+        position = 0
+        while position < len(question):
+            if not question[position].isalnum() or (position > 0 and question[position - 1].isalnum()):
+                position += 1
+                continue
+            match = self._longest_match(question, position)
+            if match is not None:
+                end, entries = match
+                for column, value in entries:
+                    if len(value) <= _SHORT_VALUE_LENGTH and not self._next_to_word(
+                            question, position, end, column.split("_")[0]):
+                        continue
+                    mentions.append(Mention(column, value, position, end))
+                    position = end
+                    break
+            position += 1
+        return mentions
+
+    def relevant_values(self, question: str, limit: int = 5) -> Dict[str, List[str]]:
+        """
+        Values worth showing the LLM for this question: exact mentions plus fuzzy
+        matches of its word n-grams ("data sciense" -> "Data Science").
+        """
+        relevant: Dict[str, List[str]] = {}
+        for mention in self.find_mentions(question):
+            relevant.setdefault(mention.column, []).append(mention.value)
+
+        words = re.findall(r"\w+", question.lower())
+        ngrams = {" ".join(words[i:i + n]) for n in (1, 2, 3) for i in range(len(words) - n + 1)}
+        ngrams = [ngram for ngram in ngrams if len(ngram) >= _MIN_FUZZY_LENGTH]
+        for column, by_lower in self._by_lower.items():
+            candidates = [value for value in by_lower if len(value) >= _MIN_FUZZY_LENGTH]
+            for ngram in ngrams if candidates else []:
+                for match in difflib.get_close_matches(ngram, candidates, n=2, cutoff=self.fuzzy_cutoff):
+                    value = by_lower[match][0]
+                    if value not in relevant.get(column, []):
+                        relevant.setdefault(column, []).append(value)
+
+        return {column: values[:limit] for column, values in relevant.items()}
+
+
+value_index = ValueIndex(
+    refresh_seconds=settings.VALUE_INDEX_REFRESH_SECONDS,
+    full_refresh_seconds=settings.VALUE_INDEX_FULL_REFRESH_SECONDS,
+    max_values=settings.VALUE_INDEX_MAX_VALUES,
+    fuzzy_cutoff=settings.VALUE_INDEX_FUZZY_CUTOFF,
+)
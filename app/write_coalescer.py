@@ -0,0 +1,132 @@
+"""
+Micro-batching for concurrent single-student inserts.
+
+The first request to arrive opens a batch and becomes its leader. Requests
+arriving within ``window_ms`` join it (up to ``max_batch`` rows). The leader
+then inserts every row with one multi-row INSERT ... RETURNING on its own
+session, commits once, and hands each caller the row that carries its id.
+Followers just wait. If the batch insert fails, the leader falls back to
+inserting rows one by one, so one bad row fails only its own request.
+"""
+import threading
+from concurrent.futures import Future
+from typing import List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas, student_stats
+from app.columnar import columnar_snapshot
+from app.config import settings
+from app.pagination import students_changes
+
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Tuple[schemas.StudentCreate, Future]] = []
+        self.full = threading.Event()
+
+
+class WriteCoalescer:
+    def __init__(self, window_ms: float = 5.0, max_batch: int = 100):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._batch = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.fallbacks = 0
+
+    def submit(self, db: Session, student: schemas.StudentCreate) -> schemas.StudentResponse:
+        """Insert one student, possibly together with concurrent callers"""
+        future = Future()
+        with self._lock:
+            batch, leader = self._batch, False
+            if batch is None:
+                batch, leader = _Batch(), True
+                self._batch = batch
+            batch.items.append((student, future))
+            if len(batch.items) >= self.max_batch:
+                self._batch = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batch is batch:
+                    self._batch = None
+            try:
+                self._flush(db, batch.items)
+            except BaseException as e:
+                # Never leave followers waiting on a batch that won't complete
+                for _, pending in batch.items:
+                    if not pending.done():
+                        pending.set_exception(e)
+                raise
+        return future.result()
+
+    def _flush(self, db: Session, items: List[Tuple[schemas.StudentCreate, Future]]):
+        students = [student for student, _ in items]
+        try:
+            rows = insert_students(db, students)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._insert_one_by_one(db, items)
+            return
+        columnar_snapshot.invalidate()
+        students_changes.bump()
+
+        with self._lock:
+            self.batches += 1
+            self.rows += len(items)
+            self.largest_batch = max(self.largest_batch, len(items))
+        for (_, future), row in zip(items, rows):
+            future.set_result(schemas.StudentResponse.model_validate(row._mapping))
+
+    def _insert_one_by_one(self, db: Session, items: List[Tuple[schemas.StudentCreate, Future]]):
+        with self._lock:
+            self.fallbacks += 1
+        for student, future in items:
+            try:
+                future.set_result(schemas.StudentResponse.model_validate(crud.create_student(db, student)))
+            except Exception as e:
+                db.rollback()
+                future.set_exception(e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": settings.WRITE_COALESCE_ENABLED,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "rows": self.rows,
+                "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "fallbacks": self.fallbacks,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.batches = self.rows = self.largest_batch = self.fallbacks = 0
+
+
+def insert_students(db: Session, students: List[schemas.StudentCreate]):
+    """
+    One multi-row INSERT ... RETURNING in the current transaction. Rows come
+    back in the order of ``students``, each with its generated id.
+    """
+    table = models.Student.__table__
+    statement = insert(table).returning(*table.c, sort_by_parameter_order=True)
+    rows = db.execute(statement, [student.model_dump() for student in students]).all()
+    if settings.STUDENT_STATS_ENABLED:
+        student_stats.record_students(db, [(s.class_name, s.section, s.marks) for s in students])
+    return rows
+
+
+write_coalescer = WriteCoalescer(
+    window_ms=settings.WRITE_COALESCE_WINDOW_MS,
+    max_batch=settings.WRITE_COALESCE_MAX_BATCH,
+)
@@ -0,0 +1,112 @@
+"""
+N sequential /query/ calls versus one /query/batch call for the same questions.
+
+Ollama is simulated: every LLM call takes a fixed latency and at most
+``parallel`` calls are served at once, like a server started with
+OLLAMA_NUM_PARALLEL. /query/ also asks for an explanation (a second LLM
+call), so the batch is timed both with and without explanations. The
+question cache is off so every unique question reaches the LLM.
+
+    python benchmarks/bench_batch_query.py [questions] [latency_ms] [parallel]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("HEALTH_MONITOR_ENABLED", "false")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.main as api
+from app import batch_query, bulk_load
+from app.batch_query import BatchQueryRunner
+from app.config import settings
+from app.database import Base, get_read_db, get_read_session_factory
+
+CLASSES = ["DevOps", "Data Science", "Cloud", "Security"]
+
+
+class SimulatedOllama:
+    model = "simulated"
+
+    def __init__(self, latency, parallel):
+        self.latency = latency
+        self._slots = threading.Semaphore(parallel)
+        self.calls = 0
+
+    def _call(self):
+        with self._slots:
+            self.calls += 1
+            time.sleep(self.latency)
+
+    def generate_sql(self, question):
+        self._call()
+        class_name = next((c for c in CLASSES if c.lower() in question.lower()), "DevOps")
+        threshold = int(question.rsplit(" ", 1)[-1])
+        return f"SELECT AVG(marks) FROM students WHERE class_name = '{class_name}' AND marks > {threshold}"
+
+    def explain_query(self, sql_query, result):
+        self._call()
+        return "simulated"
+
+
+def questions(count):
+    # About one in five repeats an earlier question, as report jobs tend to
+    unique = max(1, count * 4 // 5)
+    return [f"Average marks in {CLASSES[i % 4]} above {i}" for i in (i % unique for i in range(count))]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+    parallel = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    settings.NL_CACHE_ENABLED = False
+    batch = questions(count)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/batch.db", pool_size=16, max_overflow=0)
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        with factory() as db:
+            bulk_load.load_records(db, [
+                {"name": f"Student {i}", "class_name": CLASSES[i % 4], "section": "ABCD"[i % 4], "marks": i % 101}
+                for i in range(20000)
+            ])
+
+        def read_db():
+            with factory() as db:
+                yield db
+
+        api.app.dependency_overrides[get_read_db] = read_db
+        api.app.dependency_overrides[get_read_session_factory] = lambda: factory
+        results = {}
+        with TestClient(api.app) as client:
+            for label, explain in [("sequential /query/", True), ("batch, explain", True), ("batch", False)]:
+                ollama = SimulatedOllama(latency, parallel)
+                api.ollama_service = batch_query.ollama_service = ollama
+                batch_query.batch_query_runner = BatchQueryRunner(generation_concurrency=parallel)
+                api.batch_query_runner = batch_query.batch_query_runner
+                start = time.perf_counter()
+                if label.startswith("sequential"):
+                    for question in batch:
+                        assert client.post("/query/", json={"question": question}).status_code == 200
+                else:
+                    response = client.post("/query/batch", json={"questions": batch, "explain": explain})
+                    assert response.status_code == 200 and response.text.count("\n") == count
+                results[label] = (time.perf_counter() - start, ollama.calls)
+        engine.dispose()
+
+    print(f"{count} questions, LLM call {latency * 1000:.0f} ms, Ollama serving {parallel} in parallel\n")
+    print(f"{'mode':<20} {'seconds':>8} {'questions/s':>12} {'LLM calls':>10}")
+    for label, (seconds, calls) in results.items():
+        print(f"{label:<20} {seconds:>8.2f} {count / seconds:>12.1f} {calls:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Rows per second for per-row crud.create_student vs. the bulk loader.
+
+Runs against a SQLite file in a temporary directory, so every commit pays for
+a real fsync as it would in production. Per-row inserts are timed on a sample
+and extrapolated to the full row count.
+
+    python benchmarks/bench_bulk_load.py [row_count] [batch_size]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.bulk_load import iter_csv_records, load_records
+from app.models import Base
+
+CLASSES = ["Data Science", "DevOps", "Machine Learning", "Web Development", "Cloud", "Security"]
+SECTIONS = ["A", "B", "C", "D"]
+PER_ROW_SAMPLE = 2000
+
+
+def make_rows(row_count):
+    rng = random.Random(42)
+    return [
+        {"name": f"Student {i}", "class_name": rng.choice(CLASSES), "section": rng.choice(SECTIONS),
+         "marks": rng.randint(0, 100)}
+        for i in range(row_count)
+    ]
+
+
+def csv_chunks(rows, chunk_size=64 * 1024):
+    data = "name,class_name,section,marks\n" + "".join(
+        f"{r['name']},{r['class_name']},{r['section']},{r['marks']}\n" for r in rows
+    )
+    encoded = data.encode()
+    return [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+
+
+def fresh_session(directory, name):
+    engine = create_engine(f"sqlite:///{directory}/{name}.db")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rows = make_rows(row_count)
+
+    with tempfile.TemporaryDirectory() as directory:
+        session = fresh_session(directory, "per_row")
+        sample = rows[:PER_ROW_SAMPLE]
+        start = time.perf_counter()
+        for row in sample:
+            crud.create_student(session, schemas.StudentCreate(**row))
+        per_row = (time.perf_counter() - start) / len(sample)
+
+        session = fresh_session(directory, "json")
+        start = time.perf_counter()
+        report = load_records(session, rows, batch_size=batch_size)
+        json_seconds = time.perf_counter() - start
+        assert report["inserted"] == row_count
+
+        session = fresh_session(directory, "csv")
+        chunks = csv_chunks(rows)
+        start = time.perf_counter()
+        report = load_records(session, iter_csv_records(chunks), batch_size=batch_size)
+        csv_seconds = time.perf_counter() - start
+        assert session.execute(text("SELECT COUNT(*) FROM students")).scalar() == row_count
+
+    print(f"{row_count} rows, batches of {batch_size}\n")
+    print(f"{'':<28} {'seconds':>10} {'rows/s':>12}")
+    print(f"{'create_student (estimated)':<28} {per_row * row_count:>10.1f} {1 / per_row:>12.0f}")
+    print(f"{'bulk, records':<28} {json_seconds:>10.1f} {row_count / json_seconds:>12.0f}")
+    print(f"{'bulk, streamed CSV':<28} {csv_seconds:>10.1f} {row_count / csv_seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold start: time to import the app, run its startup handlers and answer the
+first request, each measured in a fresh interpreter.
+
+Ollama is pointed at a socket that accepts connections but never replies,
+the worst case for a startup that waits on it. "first response" is a load balancer probe
+(/health); "checks done" is when the background startup checks finished.
+
+    python benchmarks/bench_cold_start.py [runs]
+"""
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+CHILD = r"""
+import json, sys, time
+from fastapi.testclient import TestClient  # test harness, not counted
+
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+from app.health import startup_checks
+with TestClient(app) as client:
+    started = time.perf_counter()
+    client.get("/health")
+    answered = time.perf_counter()
+    startup_checks.wait(timeout=30)
+    checked = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "first response": answered - start,
+    "checks done": checked - start,
+}))
+"""
+
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    hung_ollama = socket.socket()
+    hung_ollama.bind(("127.0.0.1", 0))
+    hung_ollama.listen(16)  # never accepted, so requests time out
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{directory}/cold_start.db",
+            OLLAMA_BASE_URL=f"http://127.0.0.1:{hung_ollama.getsockname()[1]}",
+            HEALTH_MONITOR_INTERVAL_SECONDS="60",
+        )
+        results = [run_once(env) for _ in range(runs)]
+    hung_ollama.close()
+
+    print(f"median of {runs} runs, seconds since interpreter start of the import\n")
+    for key in results[0]:
+        print(f"{key:<16} {statistics.median(r[key] for r in results):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
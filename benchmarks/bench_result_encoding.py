@@ -0,0 +1,77 @@
+"""
+Payload size and serialization CPU for a large /query/ result.
+
+Compares today's response (SQLResponse validation + jsonable_encoder +
+json.dumps) with the rows-fast, columnar and Arrow IPC encodings.
+
+    python benchmarks/bench_result_encoding.py [row_count]
+"""
+import decimal
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+
+from app import encoding, schemas
+
+CLASSES = ["Data Science", "DevOps", "Machine Learning", "Web Development"]
+
+
+def make_rows(count):
+    return [
+        (i, f"Student {i}", CLASSES[i % 4], "ABC"[i % 3], 35 + i % 66, decimal.Decimal(i % 1000) / 7)
+        for i in range(count)
+    ]
+
+
+def current_format(payload, columns, rows):
+    response = schemas.SQLResponse(**payload, result=rows)
+    return json.dumps(jsonable_encoder(response)).encode()
+
+
+def rows_fast(payload, columns, rows):
+    return encoding.encode_sql_response(payload, columns, rows, result_format="rows-fast").body
+
+
+def columnar(payload, columns, rows):
+    return encoding.encode_sql_response(payload, columns, rows, result_format="columnar").body
+
+
+def arrow(payload, columns, rows):
+    return encoding.arrow_ipc_bytes(columns, rows, metadata=payload)
+
+
+def measure(name, encoder, payload, columns, rows, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        body = encoder(payload, columns, rows)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<12} {len(body) / 1024:>10.1f} KiB {best * 1000:>10.1f} ms CPU")
+    return best
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    columns = ["id", "name", "class_name", "section", "marks", "ratio"]
+    rows = make_rows(row_count)
+    payload = {"sql_query": "SELECT * FROM students", "explanation": None,
+               "row_count": row_count, "model_used": "llama3.2:3b"}
+
+    print(f"{row_count} rows x {len(columns)} columns")
+    baseline = measure("current", current_format, payload, columns, rows)
+    for name, encoder in (("rows-fast", rows_fast), ("columnar", columnar), ("arrow", arrow)):
+        if name == "arrow" and encoding.pa is None:
+            print("arrow        skipped (pyarrow not installed)")
+            continue
+        elapsed = measure(name, encoder, payload, columns, rows)
+        print(f"{'':<12} {baseline / elapsed:>10.1f}x faster than current")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Question cache across worker processes: per-process LRU ("memory") versus
+LRU over the shared SQLite file ("sqlite"), at 1, 4 and 16 workers.
+
+Each worker process answers ``requests`` questions drawn with a skew from
+a pool of ``questions``. A miss costs a simulated LLM call and stores the
+SQL. Reported per backend and worker count:
+
+    LLM calls          misses across all workers
+    hit rate           of all lookups
+    get p50/p99        cache lookup latency
+    fresh worker       hit rate of a worker started after the run
+    stale reads        reads older than a write another worker had finished
+
+For "stale reads" one extra process keeps overwriting a key while the
+workers read it.
+
+    python benchmarks/bench_shared_cache.py [requests] [questions] [llm_ms]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.cache import LRUCache, SQLiteCache, TieredCache
+
+MODEL = "llama3.2:3b"
+
+
+def make(backend, path):
+    l1 = LRUCache(max_entries=1000)
+    return l1 if backend == "memory" else TieredCache(l1, SQLiteCache(path, "nl_exact"))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def serve(backend, path, seed, requests, questions, llm_seconds, version, results):
+    cache = make(backend, path)
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(questions)]
+    misses, stale, latencies = 0, 0, []
+    for i in range(requests):
+        question = rng.choices(range(questions), weights)[0]
+        start = time.perf_counter()
+        sql = cache.get((MODEL, f"question {question}"))
+        latencies.append(time.perf_counter() - start)
+        if sql is None:
+            misses += 1
+            time.sleep(llm_seconds)
+            cache.set((MODEL, f"question {question}"), f"SELECT {question}")
+        if version is not None and i % 10 == 0:
+            expected = version.value
+            seen = cache.get("version")
+            if seen is not None and seen < expected:
+                stale += 1
+    results.put((misses, stale, latencies))
+
+
+def overwrite(path, version, stop):
+    cache = make("sqlite", path)
+    value = 0
+    while not stop.is_set():
+        value += 1
+        cache.set("version", value)
+        version.value = value  # published only after the write is committed
+        time.sleep(0.002)
+
+
+def run(backend, workers, requests, questions, llm_seconds, directory):
+    path = os.path.join(directory, f"{backend}-{workers}.sqlite")
+    results = multiprocessing.Queue()
+    version = multiprocessing.Value("q", 0) if backend == "sqlite" else None
+    stop = multiprocessing.Event()
+    writer = None
+    if version is not None:
+        writer = multiprocessing.Process(target=overwrite, args=(path, version, stop))
+        writer.start()
+
+    start = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=serve, args=(backend, path, seed, requests, questions, llm_seconds, version, results))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    # A worker started after the others warmed the cache, e.g. after a restart or scale-up
+    fresh = multiprocessing.Process(target=serve, args=(backend, path, 999, 100, questions, 0, None, results))
+    fresh.start()
+    fresh_misses, _, _ = results.get()
+    fresh.join()
+    if writer is not None:
+        stop.set()
+        writer.join()
+
+    misses = sum(o[0] for o in outcomes)
+    latencies = [sample for o in outcomes for sample in o[2]]
+    return {
+        "seconds": elapsed,
+        "llm_calls": misses,
+        "hit_rate": 1 - misses / (workers * requests),
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "fresh_hit_rate": 1 - fresh_misses / 100,
+        "stale": sum(o[1] for o in outcomes) if version is not None else None,
+    }
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    llm_seconds = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    print(f"{requests} requests per worker over {questions} questions, LLM call {llm_seconds * 1000:.0f} ms\n")
+    print(f"{'backend':<8} {'workers':>7} {'seconds':>8} {'LLM calls':>10} {'hit rate':>9} "
+          f"{'get p50 us':>11} {'get p99 us':>11} {'fresh hit':>10} {'stale':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in (1, 4, 16):
+            for backend in ("memory", "sqlite"):
+                r = run(backend, workers, requests, questions, llm_seconds, directory)
+                stale = "-" if r["stale"] is None else r["stale"]
+                print(f"{backend:<8} {workers:>7} {r['seconds']:>8.2f} {r['llm_calls']:>10} {r['hit_rate']:>9.1%} "
+                      f"{r['p50_us']:>11.1f} {r['p99_us']:>11.1f} {r['fresh_hit_rate']:>10.0%} {stale:>6}")
+
+
+if __name__ == "__main__":
+    main()
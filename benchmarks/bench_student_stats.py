@@ -0,0 +1,97 @@
+"""
+Scan volume and latency of typical NL aggregate queries, before and after the
+student_stats rewrite.
+
+Runs against an in-memory SQLite database. "Rows read" is the row count of the
+table the query scans; "VM steps" counts SQLite bytecode instructions (in
+units of 1000) as a dialect-neutral measure of work done.
+
+    python benchmarks/bench_student_stats.py [row_count]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app import student_stats
+from app.models import Base
+from app.sql_rewriter import SQLRewriter
+
+CLASSES = ["Data Science", "DevOps", "Machine Learning", "Web Development", "Cloud", "Security"]
+SECTIONS = ["A", "B", "C", "D"]
+
+QUERIES = [
+    "SELECT COUNT(*) FROM students",
+    "SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'",
+    "SELECT MAX(marks) FROM students WHERE class_name = 'Data Science' AND section = 'B'",
+    "SELECT class_name, COUNT(*), AVG(marks) FROM students GROUP BY class_name",
+    "SELECT class_name, section, MIN(marks), MAX(marks) FROM students GROUP BY class_name, section",
+]
+
+
+def seed(session, row_count):
+    rng = random.Random(42)
+    rows = [
+        {"name": f"Student {i}", "class_name": rng.choice(CLASSES), "section": rng.choice(SECTIONS),
+         "marks": rng.randint(0, 100)}
+        for i in range(row_count)
+    ]
+    session.execute(
+        text("INSERT INTO students (name, class_name, section, marks) VALUES (:name, :class_name, :section, :marks)"),
+        rows,
+    )
+    session.commit()
+    student_stats.rebuild(session)
+
+
+def measure(session, sql, steps, repeat=5):
+    best = None
+    for _ in range(repeat):
+        steps[0] = 0
+        start = time.perf_counter()
+        session.execute(text(sql)).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, steps[0]
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    engine = create_engine("sqlite://")
+    steps = [0]
+
+    @event.listens_for(engine, "connect")
+    def count_steps(dbapi_connection, connection_record):
+        def tick():
+            steps[0] += 1
+            return 0
+        dbapi_connection.set_progress_handler(tick, 1000)
+
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    seed(session, row_count)
+
+    table_rows = {
+        "students": session.execute(text("SELECT COUNT(*) FROM students")).scalar(),
+        "student_stats": session.execute(text("SELECT COUNT(*) FROM student_stats")).scalar(),
+    }
+    rewriter = SQLRewriter(summary_tables=True, log_costs=False)
+
+    print(f"{table_rows['students']} students, {table_rows['student_stats']} class/section aggregates\n")
+    print(f"{'':<8} {'rows read':>10} {'VM steps':>10} {'ms':>9}")
+    for sql in QUERIES:
+        rewritten, _ = rewriter.rewrite(sql)
+        print(sql)
+        for label, query, table in (("before", sql, "students"), ("after", rewritten, "student_stats")):
+            elapsed, vm_steps = measure(session, query, steps)
+            print(f"{label:<8} {table_rows[table]:>10} {vm_steps:>9}k {elapsed * 1000:>9.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Commit rate and request latency for concurrent student inserts, with and
+without the write coalescer.
+
+Each worker thread stands in for a /students/create request handler with its
+own session. Runs against a SQLite file in a temporary directory, so every
+commit is a real fsync.
+
+    python benchmarks/bench_write_coalescer.py [workers] [requests_per_worker] [window_ms]
+"""
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.models import Base
+from app.write_coalescer import WriteCoalescer
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(directory, name, workers, per_worker, create):
+    engine = create_engine(f"sqlite:///{directory}/{name}.db", connect_args={"timeout": 60},
+                           pool_size=workers, max_overflow=0)
+    Base.metadata.create_all(engine)
+    commits = [0]
+
+    @event.listens_for(engine, "commit")
+    def count_commit(connection):
+        commits[0] += 1
+
+    factory = sessionmaker(bind=engine)
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def worker(index):
+        db = factory()
+        barrier.wait()
+        for i in range(per_worker):
+            student = schemas.StudentCreate(name=f"Student {index}-{i}", class_name="DevOps",
+                                            section="ABCD"[i % 4], marks=i % 101)
+            start = time.perf_counter()
+            create(db, student)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        db.close()
+
+    commits[0] = 0
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "commits": commits[0],
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_worker = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    window_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    coalescer = WriteCoalescer(window_ms=window_ms, max_batch=100)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            "off": run(directory, "off", workers, per_worker, lambda db, s: crud.create_student(db, s)),
+            "on": run(directory, "on", workers, per_worker, coalescer.submit),
+        }
+
+    print(f"{workers} concurrent writers x {per_worker} inserts, window {window_ms} ms\n")
+    print(f"{'coalescing':<12} {'commits':>8} {'commits/s':>10} {'inserts/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, r in results.items():
+        print(f"{label:<12} {r['commits']:>8} {r['commits'] / r['seconds']:>10.0f} "
+              f"{r['requests'] / r['seconds']:>10.0f} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+    print(f"\naverage batch size with coalescing: {coalescer.stats()['avg_batch_size']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,9 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 # Import modules
 try:
-    from app.database import SessionLocal, engine
+    from app.database import SessionLocal, init_db
     from app import models, schemas
-    from app.crud import create_student
+    from app.bulk_load import load_records
     print("Successfully imported modules")
 except ImportError as e:
     print(f"Import error: {e}")
@@ -29,7 +29,7 @@ except ImportError as e:
 def seed_database():
     # Create tables first
     print("Creating database tables...")
-    models.Base.metadata.create_all(bind=engine)
+    init_db()
     
     db = SessionLocal()
     
@@ -66,14 +66,15 @@ def seed_database():
         
         # Clear existing data first
         db.query(models.Student).delete()
+        db.query(models.StudentStats).delete()
         db.commit()
         
-        # Add students to database
-        for i, student_data in enumerate(students_data, 1):
-            student = schemas.StudentCreate(**student_data)
-            db_student = create_student(db, student)
-            if i % 5 == 0 or i == len(students_data):
-                print(f"   {i}. Added {db_student.name} - {db_student.class_name} ({db_student.section})")
+        # Add students to database in bulk
+        report = load_records(db, students_data)
+        print(f"   Added {report['inserted']} students, rejected {report['rejected']}")
+        for batch in report["batches"]:
+            for error in batch["errors"]:
+                print(f"   Row {error['row']}: {error['error']}")
         
         db.commit()
         print("\nDatabase seeded successfully!")
@@ -1,5 +1,7 @@
 import pytest
 import os
+import threading
+import time
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
@@ -7,10 +9,15 @@ from typing import Generator
 import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Endpoints check live; the background monitor would read the app database, not the test session
+os.environ.setdefault("HEALTH_MONITOR_ENABLED", "false")
 
+from app import crud, schemas
 from app.main import app
-from app.database import Base, get_db
+from app.cancellation import Cancelled
+from app.database import Base, get_db, get_read_db
 from app.config import settings
+from app.nl_cache import nl_query_cache
 
 # Use SQLite for testing (in-memory)
 TEST_DATABASE_URL = "sqlite:///:memory:"
@@ -51,6 +58,8 @@ def client(db_session):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    nl_query_cache.clear()
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -89,4 +98,72 @@ def mock_ollama_service(monkeypatch):
     monkeypatch.setattr('app.ollama_service.ollama_service', MockOllamaService())
     monkeypatch.setattr('app.main.ollama_service', MockOllamaService())
     
-    return MockOllamaService()
\ No newline at end of file
+    return MockOllamaService()
+
+class FakeService:
+    """
+    Ollama stand-in that records its calls. ``sql`` is returned as is, or
+    called with the question. Generation waits while ``release`` is clear
+    (giving up once ``cancel`` is set) and takes at least ``delay`` seconds,
+    so overlapping calls show up in ``max_in_flight``.
+    """
+    model = "fake"
+
+    def __init__(self, sql="SELECT COUNT(*) FROM students",
+                 refinement="SELECT * FROM previous WHERE section = 'A'", delay=0.0):
+        self.sql = sql
+        self.refinement = refinement
+        self.delay = delay
+        self.generated = []
+        self.refined = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def generate_sql(self, question, cancel=None):
+        with self._lock:
+            self.generated.append(question)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.started.set()
+        try:
+            time.sleep(self.delay)
+            while not self.release.wait(0.01):
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return self.sql(question) if callable(self.sql) else self.sql
+
+    def refine_sql(self, previous_sql, columns, follow_up):
+        self.refined.append((previous_sql, columns, follow_up))
+        return self.refinement
+
+    def explain_query(self, sql_query, result):
+        return "explained"
+
+@pytest.fixture
+def fake_service():
+    """Builds FakeService instances: fake_service(sql=..., refinement=..., delay=...)"""
+    return FakeService
+
+@pytest.fixture
+def seed_students():
+    """(name, class_name, section, marks) rows file_sessions starts with; override per module"""
+    return [("Alice", "DevOps", "A", 80)]
+
+@pytest.fixture
+def file_sessions(tmp_path, seed_students):
+    """Session factory on a SQLite file, so worker threads and real commits and rollbacks work"""
+    engine = create_engine(f"sqlite:///{tmp_path}/students.db", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        for name, class_name, section, marks in seed_students:
+            crud.create_student(db, schemas.StudentCreate(name=name, class_name=class_name, section=section, marks=marks))
+    yield factory
+    engine.dispose()
@@ -0,0 +1,73 @@
+import json
+import pytest
+from app.batch_query import BatchQueryRunner, dedupe, ordered
+from app.database import get_read_session_factory
+from app.main import app
+
+def batch_sql(question):
+    if "drop" in question:
+        return "DROP TABLE students"
+    if "devops" in question.lower():
+        return "SELECT name FROM students WHERE class_name = 'DevOps'"
+    return "SELECT COUNT(*) FROM students"
+
+@pytest.fixture
+def seed_students():
+    return [("Alice", "DevOps", "A", 80), ("Bob", "Data Science", "A", 80)]
+
+@pytest.fixture
+def service(monkeypatch, fake_service):
+    fake = fake_service(sql=batch_sql)
+    monkeypatch.setattr("app.batch_query.ollama_service", fake)
+    monkeypatch.setattr("app.main.settings.NL_CACHE_ENABLED", False)
+    return fake
+
+def test_dedupe_and_ordered():
+    """Test duplicates are grouped by normalized text and results re-sequenced"""
+    assert dedupe(["How many?", "how many", "Who?"]) == {"how many": [0, 1], "who": [2]}
+    items = [{"index": i} for i in (2, 0, 3, 1)]
+    assert [item["index"] for item in ordered(items)] == [0, 1, 2, 3]
+
+def test_run_answers_duplicates_once(file_sessions, service):
+    """Test each position gets a result while duplicate questions reach the LLM once"""
+    questions = ["How many students?", "how many students", "Students in DevOps", "drop everything"]
+    items = {item["index"]: item for item in BatchQueryRunner().run(file_sessions, questions)}
+
+    assert sorted(items) == [0, 1, 2, 3]
+    assert len(service.generated) == 3
+    assert items[0]["result"] == items[1]["result"] == [(2,)]
+    assert items[1]["duplicate_of"] == 0
+    assert items[2]["result"] == [("Alice",)]
+    assert items[3]["status"] == "invalid"
+
+def test_generation_concurrency_is_bounded(file_sessions, service):
+    """Test no more LLM calls overlap than the configured concurrency"""
+    service.delay = 0.05
+    runner = BatchQueryRunner(generation_concurrency=2, max_workers=8)
+    items = list(runner.run(file_sessions, [f"How many students, take {i}?" for i in range(8)]))
+
+    assert all(item["status"] == "ok" for item in items)
+    assert service.max_in_flight == 2
+    assert runner.stats()["generated"] == 8
+
+def test_batch_endpoint(file_sessions, service):
+    """Test NDJSON streams every item and JSON comes back in question order"""
+    app.dependency_overrides[get_read_session_factory] = lambda: file_sessions
+    try:
+        from fastapi.testclient import TestClient
+        with TestClient(app) as client:
+            questions = ["Students in DevOps", "How many students?", "How many students?"]
+            response = client.post("/query/batch", json={"questions": questions})
+            assert response.headers["content-type"] == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert sorted(line["index"] for line in lines) == [0, 1, 2]
+
+            response = client.post("/query/batch?format=json", json={"questions": questions, "explain": True})
+            data = response.json()
+            assert [item["question"] for item in data] == questions
+            assert data[0]["explanation"] == "explained"
+
+            assert client.post("/query/batch", json={"questions": []}).status_code == 422
+            assert client.post("/query/batch?format=xml", json={"questions": ["x"]}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
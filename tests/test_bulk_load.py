@@ -0,0 +1,127 @@
+from unittest.mock import MagicMock
+import pytest
+from sqlalchemy import text
+from app import bulk_load
+from app.bulk_load import BulkLoader, iter_csv_records, load_records, validate_record
+
+ROWS = [
+    {"name": "Alice", "class_name": "Data Science", "section": "A", "marks": 90},
+    {"name": "Bob", "class_name": "DevOps", "section": "B", "marks": 72},
+    {"name": "Carol", "class_name": "DevOps", "section": "B", "marks": 85},
+]
+
+@pytest.fixture
+def seed_students():
+    return []
+
+@pytest.fixture
+def fresh_db(file_sessions):
+    """A session on its own database, so batch commits and rollbacks are real"""
+    with file_sessions() as session:
+        yield session
+
+def count(db, table="students"):
+    return db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+def test_validate_record():
+    """Test rows are coerced and checked against the column limits"""
+    assert validate_record({"name": "A", "class_name": "B", "section": "C", "marks": "42"}) == (("A", "B", "C", 42), None)
+    assert "marks" in validate_record({"name": "A", "class_name": "B", "section": "C", "marks": "x"})[1]
+    assert "section" in validate_record({"name": "A", "class_name": "B", "section": "C" * 11, "marks": 1})[1]
+    assert validate_record(["A", "B"])[1] == "wrong number of fields (2)"
+
+def test_load_in_batches(fresh_db):
+    """Test rows are committed per batch and the summary reports each one"""
+    records = ROWS * 3 + [{"name": "Bad", "class_name": "DevOps", "section": "A"}]
+    report = load_records(fresh_db, records, batch_size=4)
+
+    assert (report["rows"], report["inserted"], report["rejected"]) == (10, 9, 1)
+    assert [(b["rows"], b["inserted"]) for b in report["batches"]] == [(4, 4), (4, 4), (2, 1)]
+    assert report["batches"][2]["errors"] == [{"row": 10, "error": "marks: Field required"}]
+    assert count(fresh_db) == 9
+
+def test_stats_maintained(fresh_db):
+    """Test student_stats counts the loaded rows"""
+    load_records(fresh_db, ROWS, batch_size=2)
+    assert fresh_db.execute(text(
+        "SELECT student_count, marks_sum FROM student_stats WHERE class_name = 'DevOps'"
+    )).one() == (2, 157)
+
+def test_failed_batch_rolls_back_alone(fresh_db, monkeypatch):
+    """Test a batch the database rejects is reported without losing the others"""
+    insert_rows = bulk_load.insert_rows
+    calls = []
+
+    def flaky(db, rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            insert_rows(db, rows)
+            raise RuntimeError("disk full")
+        insert_rows(db, rows)
+
+    monkeypatch.setattr("app.bulk_load.insert_rows", flaky)
+    report = load_records(fresh_db, ROWS * 2, batch_size=2)
+
+    assert [b["failed"] for b in report["batches"]] == [None, "disk full", None]
+    assert report["inserted"] == 4
+    assert count(fresh_db) == 4
+    assert count(fresh_db, "student_stats") == 2
+    assert fresh_db.execute(text("SELECT SUM(student_count) FROM student_stats")).scalar() == 4
+
+def test_empty_strings_stay_empty(fresh_db):
+    """Test "" is stored as an empty string by executemany and sent to COPY as not-null"""
+    load_records(fresh_db, [{"name": "", "class_name": "DevOps", "section": "", "marks": 50}])
+    assert fresh_db.execute(text("SELECT name, section FROM students")).one() == ("", "")
+
+    copied = []
+    db = MagicMock()
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert.side_effect = lambda statement, buffer: copied.append((statement, buffer.read()))
+    bulk_load._copy_rows(db, [("", "DevOps", "", 50)])
+
+    statement, data = copied[0]
+    assert data == ',DevOps,,50\r\n'
+    assert statement.endswith("FORCE_NOT_NULL (name, class_name, section))")
+
+def test_error_list_is_capped(fresh_db):
+    """Test a batch keeps counting errors past the listed maximum"""
+    loader = BulkLoader(fresh_db, batch_size=10, max_errors_per_batch=2)
+    report = loader.add_all([{}] * 5).summary()
+
+    assert report["batches"][0]["error_count"] == 5
+    assert len(report["batches"][0]["errors"]) == 2
+
+def test_csv_records_across_chunks():
+    """Test quoted fields and multi-byte characters split between chunks parse intact"""
+    data = 'name,class_name,section,marks\r\n"Zoë, Jr.",DevOps,A,70\n"Multi\nLine",Data Science,B,80\n\nshort,row\n'.encode()
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+
+    records = list(iter_csv_records(chunks))
+
+    assert records[0] == {"name": "Zoë, Jr.", "class_name": "DevOps", "section": "A", "marks": "70"}
+    assert records[1]["name"] == "Multi\nLine"
+    assert records[2] == ["short", "row"]
+
+def test_bulk_endpoint_json(client):
+    """Test the endpoint loads a JSON array"""
+    response = client.post("/students/bulk?batch_size=2", json=ROWS + [{"name": "No marks"}])
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["rejected"], len(body["batches"])) == (3, 1, 2)
+    assert client.get("/count").json()["count"] == 3
+
+def test_bulk_endpoint_csv(client):
+    """Test the endpoint loads a streamed CSV body"""
+    def body():
+        yield b"name,class_name,section,marks\n"
+        for row in ROWS:
+            yield f"{row['name']},{row['class_name']},{row['section']},{row['marks']}\n".encode()
+
+    response = client.post("/students/bulk", content=body(), headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 3
+
+def test_bulk_endpoint_rejects_other_bodies(client):
+    """Test non-array JSON and unknown content types are refused"""
+    assert client.post("/students/bulk", json={"name": "Alice"}).status_code == 400
+    assert client.post("/students/bulk", content=b"x", headers={"Content-Type": "application/xml"}).status_code == 415
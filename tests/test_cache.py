@@ -0,0 +1,108 @@
+import os
+import pickle
+import stat
+import time
+import pytest
+from app.cache import LRUCache, SQLiteCache, TieredCache, make_cache
+from app.nl_cache import SQLTemplate
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "l2.sqlite")
+
+def worker(path, namespace="test", **kwargs):
+    """One process's view of the shared cache; each has its own connection"""
+    return TieredCache(LRUCache(max_entries=100), SQLiteCache(path, namespace, **kwargs))
+
+def test_l2_is_shared(path):
+    """Test a value stored by one worker is found by another, then served from its L1"""
+    a, b = worker(path), worker(path)
+    a.set(("model", "how many students"), "SELECT COUNT(*) FROM students")
+
+    assert b.get(("model", "how many students")) == "SELECT COUNT(*) FROM students"
+    assert b.l2.hits == 1
+    assert b.get(("model", "how many students")) == "SELECT COUNT(*) FROM students"
+    assert b.l2.hits == 1
+
+def test_writes_invalidate_other_workers_l1(path):
+    """Test overwrites, deletes and clears by one worker apply to the others' L1"""
+    a, b = worker(path), worker(path)
+    a.set("q", "old")
+    assert b.get("q") == "old"
+
+    a.set("q", "new")
+    assert b.get("q") == "new"
+    a.delete("q")
+    assert b.get("q") is None
+
+    a.set("r", 1)
+    assert b.get("r") == 1
+    a.clear()
+    assert b.get("r") is None
+    assert len(b.l1) == 0
+
+def test_namespaces_are_separate(path):
+    """Test caches sharing a file don't see each other's keys"""
+    exact, templates = worker(path, "exact"), worker(path, "templates")
+    exact.set("k", "sql")
+    assert templates.get("k") is None
+    templates.clear()
+    assert exact.get("k") == "sql"
+
+def test_l2_ttl_and_size_bound(path):
+    """Test L2 entries expire and pruning keeps the newest max_entries"""
+    cache = SQLiteCache(path, "test", ttl_seconds=0.05)
+    cache.set("k", "v")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+    cache = SQLiteCache(path, "bounded", max_entries=3, prune_every=5)
+    for i in range(10):
+        cache.set(i, i)
+    assert len(cache) == 3
+    assert cache.get(9) == 9
+
+def test_lagging_worker_drops_l1_after_log_pruned(path):
+    """Test a worker whose unread invalidations were pruned clears its whole L1"""
+    a = worker(path, log_retention_seconds=0, prune_every=2)
+    b = worker(path)
+    a.set("k", "old")
+    assert b.get("k") == "old"
+
+    a.set("k", "new")  # second write prunes the log, including this entry
+    assert b.get("k") == "new"
+
+    a.set("unrelated", 1)  # not pruned: b catches up from the log and keeps "k" in L1
+    assert b.get("unrelated") == 1
+    assert len(b.l1) == 2
+
+def test_l2_stores_json_not_pickle(tmp_path):
+    """Test values are stored as JSON in a private directory, and pickled rows are never loaded"""
+    path = str(tmp_path / "private" / "l2.sqlite")
+    templates = SQLiteCache(path, "templates", encode=SQLTemplate.to_json, decode=SQLTemplate.from_json)
+    template = SQLTemplate(("SELECT * FROM students WHERE class_name = ", ""), (0,))
+    templates.set("shape", template)
+    assert templates.get("shape") == template
+    assert stat.S_IMODE(os.stat(tmp_path / "private").st_mode) == 0o700
+
+    cache = SQLiteCache(path, "test")
+    cache._conn.execute(
+        "INSERT INTO cache_entries (namespace, key, value) VALUES ('test', ?, ?)",
+        (cache._key("k"), pickle.dumps(("os.system", "echo pwned"))),
+    )
+    assert cache.get("k") is None and cache.misses == 1
+
+def test_make_cache_backends(path, monkeypatch):
+    """Test the configured backend decides between an LRU and a tiered cache"""
+    monkeypatch.setattr("app.cache.settings.CACHE_BACKEND", "memory")
+    assert isinstance(make_cache("ns"), LRUCache)
+
+    monkeypatch.setattr("app.cache.settings.CACHE_BACKEND", "sqlite")
+    monkeypatch.setattr("app.cache.settings.CACHE_L2_PATH", path)
+    cache = make_cache("ns", max_entries=10, ttl_seconds=60)
+    assert isinstance(cache, TieredCache)
+    assert (cache.max_entries, cache.ttl_seconds) == (10, 60)
+
+    monkeypatch.setattr("app.cache.settings.CACHE_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        make_cache("ns")
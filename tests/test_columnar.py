@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import text
+from app import crud, schemas
+from app.sql_parser import parse
+
+np = pytest.importorskip("numpy")
+
+from app.columnar import ColumnarSnapshot
+
+STUDENTS = [
+    ("Alice", "Data Science", "A", 91),
+    ("Bob", "Data Science", "B", 72),
+    ("Carol", "DevOps", "A", 85),
+    ("Dan", "DevOps", "B", 40),
+    ("Eve", "Machine Learning", "A", 97),
+    ("Frank", "Machine Learning", "B", 63),
+    ("Grace", "Data Science", "A", 78),
+    ("Heidi", "DevOps", "C", 55),
+]
+
+# Every query here must produce the same rows as the database
+SUPPORTED_QUERIES = [
+    "SELECT * FROM students WHERE class_name = 'DevOps' ORDER BY marks DESC",
+    "SELECT name, marks FROM students WHERE marks > 70 AND section = 'A' ORDER BY marks",
+    "SELECT name FROM students WHERE class_name IN ('DevOps', 'Data Science') AND NOT section = 'B' ORDER BY id",
+    "SELECT name FROM students WHERE marks BETWEEN 60 AND 90 ORDER BY marks DESC LIMIT 3",
+    "SELECT name FROM students WHERE name LIKE '%a%' ORDER BY marks LIMIT 2 OFFSET 1",
+    "SELECT name, marks FROM students ORDER BY 2 DESC LIMIT 1",
+    "SELECT COUNT(*) FROM students",
+    "SELECT COUNT(*) FROM students WHERE class_name = 'Nothing'",
+    "SELECT AVG(marks) FROM students WHERE class_name = 'Nothing'",
+    "SELECT AVG(marks) FROM students WHERE class_name = 'Data Science'",
+    "SELECT MIN(marks), MAX(marks), SUM(marks) FROM students",
+    "SELECT COUNT(DISTINCT class_name) FROM students",
+    "SELECT class_name, COUNT(*) AS total, AVG(marks) FROM students GROUP BY class_name ORDER BY total DESC, 3",
+    "SELECT class_name, section, MAX(marks) FROM students GROUP BY class_name, section ORDER BY MAX(marks) DESC",
+    "SELECT section, ROUND(AVG(marks), 2) AS avg_marks FROM students GROUP BY section ORDER BY avg_marks DESC",
+    "SELECT class_name, MAX(marks) - MIN(marks) AS spread FROM students GROUP BY class_name ORDER BY spread",
+    "SELECT class_name FROM students GROUP BY class_name HAVING COUNT(*) >= 3 AND AVG(marks) > 60 ORDER BY COUNT(*)",
+    "SELECT s.name FROM students s WHERE s.marks >= 85 ORDER BY s.marks",
+]
+
+UNSUPPORTED_QUERIES = [
+    "SELECT name FROM students ORDER BY name",
+    "SELECT MAX(name) FROM students",
+    "SELECT marks * 2 FROM students",
+    "SELECT DISTINCT section FROM students",
+    "SELECT name FROM students WHERE marks > (SELECT AVG(marks) FROM students)",
+    "SELECT s.name FROM students s JOIN students t ON s.marks = t.marks",
+    "SELECT name, RANK() OVER (ORDER BY marks) FROM students",
+    "SELECT class_name, name FROM students GROUP BY class_name",
+    r"SELECT name FROM students WHERE name LIKE 'A\%'",
+]
+
+@pytest.fixture
+def seeded(db_session):
+    for name, class_name, section, marks in STUDENTS:
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=name, class_name=class_name, section=section, marks=marks
+        ))
+    return db_session
+
+@pytest.fixture
+def snapshot(seeded):
+    snapshot = ColumnarSnapshot(max_age_seconds=3600)
+    snapshot.load(seeded)
+    return snapshot
+
+def normalize(rows):
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows]
+
+@pytest.mark.parametrize("sql", SUPPORTED_QUERIES)
+def test_matches_database(seeded, snapshot, sql):
+    """Test snapshot results equal the database's, in order"""
+    answer = snapshot.execute(seeded, parse(sql))
+
+    assert answer is not None, "query should be answered in-process"
+    columns, rows = answer
+    expected = seeded.execute(text(sql)).fetchall()
+    assert normalize(rows) == normalize(tuple(row) for row in expected)
+    assert len(columns) == len(expected[0]) if expected else True
+
+@pytest.mark.parametrize("sql", UNSUPPORTED_QUERIES)
+def test_falls_back(seeded, snapshot, sql):
+    """Test queries outside the subset are left to the database"""
+    assert snapshot.execute(seeded, parse(sql)) is None
+    assert snapshot.stats()["fallbacks"] == 1
+
+def test_output_column_names(seeded, snapshot):
+    """Test aggregate and alias naming follows PostgreSQL"""
+    columns, _ = snapshot.execute(seeded, parse("SELECT class_name, COUNT(*), AVG(marks) AS a FROM students GROUP BY class_name"))
+    assert columns == ["class_name", "count", "a"]
+
+def test_invalidate_reloads(seeded, snapshot):
+    """Test a write through crud is visible on the next query"""
+    query = parse("SELECT COUNT(*) FROM students")
+    before = snapshot.execute(seeded, query)[1][0][0]
+
+    crud.create_student(seeded, schemas.StudentCreate(name="Ivan", class_name="DevOps", section="A", marks=70))
+    snapshot.invalidate()
+
+    assert snapshot.execute(seeded, query)[1][0][0] == before + 1
+    assert snapshot.stats()["loads"] == 2
+
+def test_crud_uses_snapshot_when_enabled(seeded, monkeypatch):
+    """Test execute_sql_query answers from the snapshot and falls back otherwise"""
+    from app.columnar import columnar_snapshot
+    monkeypatch.setattr("app.crud.settings.COLUMNAR_SNAPSHOT_ENABLED", True)
+    columnar_snapshot.invalidate()
+    hits = columnar_snapshot.hits
+
+    assert crud.execute_sql_query(seeded, "SELECT COUNT(*) FROM students WHERE section = 'A'") == [(4,)]
+    assert columnar_snapshot.hits == hits + 1
+    assert crud.execute_sql_query(seeded, "SELECT name FROM students ORDER BY name LIMIT 1") == [("Alice",)]
+    assert columnar_snapshot.hits == hits + 1
@@ -0,0 +1,99 @@
+import time
+import pytest
+from app import crud, schemas
+from app.conversations import ConversationStore, compose_sql, is_follow_up
+from app.ollama_service import OllamaService
+
+DEVOPS_SQL = "SELECT name, section, marks FROM students WHERE class_name = 'DevOps'"
+
+@pytest.fixture
+def students(db_session):
+    for name, section, marks in [("Alice", "A", 90), ("Bob", "B", 70), ("Carol", "A", 60)]:
+        crud.create_student(db_session, schemas.StudentCreate(name=name, class_name="DevOps", section=section, marks=marks))
+    crud.create_student(db_session, schemas.StudentCreate(name="Dan", class_name="Cloud", section="A", marks=50))
+    return db_session
+
+@pytest.fixture(autouse=True)
+def no_nl_cache(monkeypatch):
+    monkeypatch.setattr("app.conversations.settings.NL_CACHE_ENABLED", False)
+
+def test_follow_up_detection_and_composition():
+    """Test follow-up phrasing is recognised and refinements run over the previous query"""
+    assert is_follow_up("now only section A")
+    assert is_follow_up("Sort those by marks")
+    assert is_follow_up("Show them by section")
+    assert is_follow_up("How many of those scored above 90?")
+    assert is_follow_up("Use section B instead")
+    assert not is_follow_up("How many students are in DevOps?")
+    assert not is_follow_up("Which students have marks above the average?")
+    assert not is_follow_up("List students with the same marks as Alice")
+    assert not is_follow_up("Which students scored higher than those in DevOps?")
+    assert not is_follow_up("Compare the previous section A results with section B")
+
+    assert compose_sql("SELECT * FROM students", "SELECT name FROM previous") == \
+        "WITH previous AS (SELECT * FROM students) SELECT name FROM previous"
+    assert compose_sql("SELECT * FROM students", "SELECT COUNT(*) FROM students") == "SELECT COUNT(*) FROM students"
+
+def test_follow_up_refines_previous_query(students, fake_service):
+    """Test a follow-up edits the last query instead of generating a new one"""
+    store, service = ConversationStore(), fake_service(sql=DEVOPS_SQL)
+    conversation = store.create()
+
+    first = store.ask(conversation, students, "Show DevOps students", service)
+    assert first["refined"] is False and first["row_count"] == 3
+
+    second = store.ask(conversation, students, "now only section A", service)
+    assert second["refined"] is True
+    assert second["sql_query"].startswith("WITH previous AS (SELECT name, section, marks FROM students")
+    assert sorted(row[0] for row in second["result"]) == ["Alice", "Carol"]
+    assert service.generated == ["Show DevOps students"]
+    assert service.refined[0][1] == ["name", "section", "marks"]
+
+    third = store.ask(conversation, students, "sort those by marks", service, refine=True)
+    assert third["sql_query"].count("WITH previous AS") == 2
+    assert [turn["refined"] for turn in conversation.to_dict()["turns"]] == [False, True, True]
+
+def test_failed_refinement_regenerates_with_context(students, fake_service):
+    """Test a refinement that doesn't run falls back to generation with the earlier question"""
+    store, service = ConversationStore(), fake_service(sql=DEVOPS_SQL, refinement="SELECT * FROM previous WHERE missing = 1")
+    conversation = store.create()
+    store.ask(conversation, students, "Show DevOps students", service)
+
+    answer = store.ask(conversation, students, "now only section A", service)
+    assert (answer["refined"], answer["row_count"]) == (False, 3)
+    assert service.generated[-1] == "Show DevOps students; then: now only section A"
+    assert store.stats()["refine_fallbacks"] == 1
+
+def test_session_limits():
+    """Test turns are capped, idle sessions expire and the oldest are evicted"""
+    store = ConversationStore(max_sessions=2, idle_seconds=0.05, max_turns=2)
+    conversation = store.create()
+    conversation.turns.extend(range(5))
+    assert list(conversation.turns) == [3, 4]
+
+    assert store.get(conversation.id) is conversation
+    time.sleep(0.1)
+    assert store.get(conversation.id) is None
+
+    first, _, _ = store.create(), store.create(), store.create()
+    assert store.get(first.id) is None
+
+def test_refine_prompt_is_short():
+    """Test the refinement prompt is a fraction of the full generation prompt"""
+    service = OllamaService()
+    prompt = service._refine_prompt("SELECT * FROM students WHERE class_name = 'DevOps'",
+                                    ["id", "name", "class_name", "section", "marks"], "now only section A")
+    assert len(prompt) < len(service.sql_prompt) / 2
+
+def test_session_endpoints(client, students, monkeypatch, fake_service):
+    """Test a conversation over HTTP, then its deletion"""
+    monkeypatch.setattr("app.main.ollama_service", fake_service(sql=DEVOPS_SQL))
+    session_id = client.post("/sessions").json()["session_id"]
+
+    assert client.post(f"/sessions/{session_id}/query", json={"question": "Show DevOps students"}).json()["row_count"] == 3
+    data = client.post(f"/sessions/{session_id}/query", json={"question": "now only section A"}).json()
+    assert (data["refined"], data["row_count"], data["turn"]) == (True, 2, 2)
+    assert len(client.get(f"/sessions/{session_id}").json()["turns"]) == 2
+
+    assert client.delete(f"/sessions/{session_id}").status_code == 204
+    assert client.post(f"/sessions/{session_id}/query", json={"question": "again"}).status_code == 404
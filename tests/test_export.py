@@ -0,0 +1,109 @@
+import csv
+import gzip
+import io
+import pytest
+from unittest.mock import Mock
+from app import crud, export, schemas
+from app.sql_store import GeneratedSQLStore, generated_sql_store
+
+COLUMNS = ["name", "marks"]
+
+def make_batches(batch_count, batch_size=3):
+    for b in range(batch_count):
+        yield [(f"Student {b}-{i}", 50 + i) for i in range(batch_size)]
+
+def test_csv_stream_yields_per_batch():
+    """Test CSV is streamed one chunk per batch"""
+    chunks = list(export.csv_stream(COLUMNS, make_batches(4)))
+    assert len(chunks) == 4
+
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == COLUMNS
+    assert len(rows) == 13
+
+def test_csv_stream_empty_result_has_header():
+    """Test an empty result still produces the header row"""
+    assert b"".join(export.csv_stream(COLUMNS, iter([]))) == b"name,marks\r\n"
+
+def test_gzip_stream_roundtrip():
+    """Test gzip output decompresses to the plain CSV"""
+    plain = b"".join(export.csv_stream(COLUMNS, make_batches(3)))
+    compressed = b"".join(export.export_stream(COLUMNS, make_batches(3), gzip=True))
+    assert gzip.decompress(compressed) == plain
+
+def test_parquet_stream_row_groups():
+    """Test Parquet output is written in row groups of the requested size"""
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    data = b"".join(export.parquet_stream(COLUMNS, make_batches(5, batch_size=4), row_group_size=6))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+
+    assert parquet_file.metadata.num_rows == 20
+    assert parquet_file.metadata.num_row_groups == 4
+    assert parquet_file.read().column("marks").to_pylist()[:4] == [50, 51, 52, 53]
+
+def test_parquet_stream_empty_result():
+    """Test an empty Parquet export is still a valid file"""
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    data = b"".join(export.parquet_stream(COLUMNS, iter([])))
+    assert pq.ParquetFile(io.BytesIO(data)).schema_arrow.names == COLUMNS
+
+def test_stream_sql_query_batches(db_session):
+    """Test server-side cursor streaming in batches"""
+    for i in range(5):
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=f"Stream {i}", class_name="Export", section="A", marks=60 + i
+        ))
+
+    columns, batches = crud.stream_sql_query(db_session, "SELECT name, marks FROM students ORDER BY id", batch_size=2)
+    batch_list = list(batches)
+
+    assert columns == ["name", "marks"]
+    assert [len(batch) for batch in batch_list] == [2, 2, 1]
+
+def test_stream_sql_query_rejects_writes(db_session):
+    """Test streaming applies the same SELECT-only validation"""
+    with pytest.raises(ValueError, match="Only SELECT queries are allowed"):
+        crud.stream_sql_query(db_session, "DELETE FROM students")
+
+def test_generated_sql_store_is_bounded():
+    """Test the generated SQL registry evicts the oldest entries"""
+    store = GeneratedSQLStore(max_entries=2)
+    first = store.add("SELECT 1")
+    store.add("SELECT 2")
+    store.add("SELECT 3")
+
+    assert store.get(first) is None
+    assert store.get(store.make_id("SELECT 3")) == "SELECT 3"
+
+def test_export_endpoint_by_sql_id(client):
+    """Test exporting a previously generated query by sql_id"""
+    client.post("/students/create", json={
+        "name": "Exported", "class_name": "DevOps", "section": "A", "marks": 81
+    })
+    sql_id = generated_sql_store.add("SELECT name, marks FROM students")
+
+    response = client.post("/query/export", json={"sql_id": sql_id, "format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="export.csv"' in response.headers["content-disposition"]
+    assert response.text.splitlines() == ["name,marks", "Exported,81"]
+
+def test_export_endpoint_by_question(client, monkeypatch):
+    """Test exporting the result of a new question, gzipped"""
+    mock_service = Mock()
+    mock_service.generate_sql = Mock(return_value="SELECT COUNT(*) AS total FROM students")
+    monkeypatch.setattr('app.main.ollama_service', mock_service)
+
+    response = client.post("/query/export", json={"question": "how many students", "gzip": True})
+
+    assert response.status_code == 200
+    assert gzip.decompress(response.content).decode().splitlines() == ["total", "0"]
+
+def test_export_endpoint_errors(client):
+    """Test export with unknown sql_id or no input"""
+    assert client.post("/query/export", json={"sql_id": "missing"}).status_code == 404
+    assert client.post("/query/export", json={}).status_code == 400
+    assert client.post("/query/export", json={"question": "x", "format": "xlsx"}).status_code == 422
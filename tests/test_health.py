@@ -0,0 +1,109 @@
+import time
+from unittest.mock import Mock
+import pytest
+from app.health import HealthMonitor
+
+@pytest.fixture
+def ollama_up(monkeypatch):
+    response = Mock(status_code=200)
+    response.json.return_value = {"models": [{"name": "llama3.2:3b"}]}
+    get = Mock(return_value=response)
+    monkeypatch.setattr("app.health.requests.get", get)
+    return get
+
+@pytest.fixture
+def monitor(file_sessions, ollama_up, monkeypatch):
+    """The app's monitor, enabled and pointed at the file database"""
+    from app.health import health_monitor
+    monkeypatch.setattr("app.main.settings.HEALTH_MONITOR_ENABLED", True)
+    monkeypatch.setattr(health_monitor, "session_factory", file_sessions)
+    monkeypatch.setattr(health_monitor, "_snapshot", None)
+    health_monitor.refresh()
+    return health_monitor
+
+def test_refresh_records_snapshot(file_sessions, ollama_up):
+    """Test a refresh captures database, count and Ollama state with a timestamp"""
+    monitor = HealthMonitor(file_sessions, "http://ollama:11434", stale_after_seconds=60)
+    assert monitor.snapshot() is None
+
+    monitor.refresh()
+    snapshot = monitor.snapshot()
+
+    assert snapshot["database"]["status"] == "connected"
+    assert snapshot["database"]["student_count"] == 1
+    assert snapshot["ollama"]["models"] == ["llama3.2:3b"]
+    assert snapshot["stale"] is False
+    ollama_up.assert_called_once_with("http://ollama:11434/api/tags", timeout=3.0)
+
+def test_snapshot_goes_stale(file_sessions, ollama_up):
+    """Test an old snapshot is flagged as stale"""
+    monitor = HealthMonitor(file_sessions, "http://ollama:11434", stale_after_seconds=0.01)
+    monitor.refresh()
+    time.sleep(0.02)
+    assert monitor.snapshot()["stale"] is True
+
+def test_background_thread_refreshes(file_sessions, ollama_up):
+    """Test the monitor thread keeps refreshing until stopped"""
+    monitor = HealthMonitor(file_sessions, "http://ollama:11434", interval_seconds=0.01)
+    monitor.start()
+    deadline = time.monotonic() + 2
+    while monitor.refreshes < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    monitor.stop()
+
+    assert monitor.refreshes >= 3
+    assert not monitor.running
+
+def test_first_refresh_publishes_database_before_ollama(file_sessions, monkeypatch):
+    """Test probes see the database result while the first Ollama check is still running"""
+    monitor = HealthMonitor(file_sessions, "http://ollama:11434")
+    seen = []
+    monkeypatch.setattr("app.health.requests.get", Mock(side_effect=lambda *a, **k: seen.append(monitor.snapshot())))
+    monitor.refresh()
+
+    assert seen[0]["database"]["student_count"] == 1
+    assert seen[0]["ollama"]["status"] == "unknown"
+
+def test_unreachable_ollama(file_sessions, monkeypatch):
+    """Test connection failures are captured rather than raised"""
+    monkeypatch.setattr("app.health.requests.get", Mock(side_effect=Exception("refused")))
+    snapshot = HealthMonitor(file_sessions, "http://ollama:11434").check()
+    assert (snapshot["ollama"]["status"], snapshot["ollama"]["message"]) == ("not_connected", "refused")
+
+def test_health_from_snapshot(client, monitor, ollama_up):
+    """Test /health answers from the snapshot without live checks"""
+    ollama_up.reset_mock()
+    data = client.get("/health").json()
+
+    assert (data["source"], data["database"], data["ollama"], data["student_count"]) == \
+        ("snapshot", "connected", "connected", 1)
+    ollama_up.assert_not_called()
+
+def test_health_deep(client, monitor, ollama_up):
+    """Test deep mode checks live, against the request's database"""
+    ollama_up.reset_mock()
+    data = client.get("/health?deep=true").json()
+
+    assert data["source"] == "live"
+    assert data["student_count"] == 0  # the test session, not the monitor's database
+    assert "duration_ms" in data["checks"]["database"]
+    ollama_up.assert_called_once()
+
+def test_count_follows_local_writes(client, monitor):
+    """Test /count uses the snapshot until this process writes"""
+    assert client.get("/count").json()["count"] == 1
+
+    for name in ("Bob", "Carol"):
+        client.post("/students/create", json={"name": name, "class_name": "DevOps", "section": "A", "marks": 70})
+    assert client.get("/count").json()["count"] == 2  # live read of the test session
+    assert monitor.snapshot()["database"]["student_count"] == 2
+
+def test_ollama_status_from_snapshot(client, monitor, ollama_up):
+    """Test /ollama-status reports the last background check and its age"""
+    ollama_up.reset_mock()
+    data = client.get("/ollama-status").json()
+
+    assert data["status"] == "connected"
+    assert data["models"] == ["llama3.2:3b"]
+    assert "age_seconds" in data
+    ollama_up.assert_not_called()
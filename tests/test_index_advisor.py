@@ -0,0 +1,155 @@
+import pytest
+from unittest.mock import Mock, call
+from sqlalchemy import create_engine, inspect
+from app import crud, schemas
+from app.database import Base
+from app.index_advisor import IndexAdvisor, index_candidate
+from app.sql_parser import parse
+
+STUDENTS = [
+    ("Alice", "Data Science", "A", 90),
+    ("Bob", "Data Science", "B", 72),
+    ("Carol", "DevOps", "A", 85),
+    ("Dan", "DevOps", "B", 40),
+    ("Eve", "Machine Learning", "C", 95),
+    ("Frank", "Machine Learning", "A", 63),
+]
+
+@pytest.fixture
+def seeded(db_session):
+    for name, class_name, section, marks in STUDENTS:
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=name, class_name=class_name, section=section, marks=marks
+        ))
+    return db_session
+
+def observe(advisor, sql, times=1, duration_ms=5.0):
+    for _ in range(times):
+        advisor.observe(parse(sql), sql, duration_ms)
+
+@pytest.mark.parametrize("sql,expected", [
+    ("SELECT * FROM students WHERE class_name = 'DevOps'", ("class_name",)),
+    ("SELECT * FROM students WHERE section = 'A' AND class_name IN ('DevOps', 'ML')", ("class_name", "section")),
+    ("SELECT * FROM students WHERE class_name = 'DevOps' AND marks > 80", ("class_name", "marks")),
+    ("SELECT name FROM students WHERE section = 'B' ORDER BY marks DESC", ("section", "marks")),
+    ("SELECT s.name FROM students s WHERE s.marks BETWEEN 50 AND 60", ("marks",)),
+    ("SELECT * FROM students ORDER BY marks DESC LIMIT 1", ("marks",)),
+])
+def test_index_candidate(sql, expected):
+    """Test equality columns lead, followed by one range or sort column"""
+    assert index_candidate(parse(sql)) == ("students", expected)
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM students",
+    "SELECT * FROM students WHERE marks > id",
+    "SELECT * FROM students WHERE NOT class_name IN ('DevOps')",
+    "SELECT s.name FROM students s JOIN students t ON s.marks = t.marks WHERE s.section = 'A'",
+    "WITH previous AS (SELECT * FROM students) SELECT name FROM previous WHERE section = 'A'",
+])
+def test_no_candidate(sql):
+    """Test queries no single-table index helps are ignored"""
+    assert index_candidate(parse(sql)) is None
+
+def test_unknown_tables_are_not_recorded(seeded):
+    """Test only tables in the schema become candidates, so recommendations never look up others"""
+    advisor = IndexAdvisor(min_queries=1, tables={"students"})
+    observe(advisor, "SELECT * FROM previous WHERE section = 'A'")
+    observe(advisor, "SELECT * FROM students WHERE section = 'A'")
+
+    assert [c.table for c in advisor.candidates()] == ["students"]
+    assert [r["columns"] for r in advisor.recommendations(seeded)] == [["section"]]
+
+def test_recommendations_by_selectivity(seeded):
+    """Test frequent shapes are recommended with an estimated benefit"""
+    advisor = IndexAdvisor(min_queries=3)
+    observe(advisor, "SELECT * FROM students WHERE class_name = 'DevOps' AND section = 'A'", times=4)
+    observe(advisor, "SELECT * FROM students WHERE marks > 50", times=2)
+
+    recommendations = advisor.recommendations(seeded)
+
+    assert [r["columns"] for r in recommendations] == [["class_name", "section"]]
+    top = recommendations[0]
+    assert top["name"] == "ix_students_class_name_section"
+    assert top["queries"] == 4
+    assert top["estimate_method"] == "selectivity"
+    assert top["cost_after"] < top["cost_before"]
+    assert 0 < top["estimated_benefit_ms"] <= top["total_ms"]
+
+def test_limit_keeps_the_largest_benefits(seeded):
+    """Test the limit applies after ranking by benefit, not by observed time"""
+    advisor = IndexAdvisor(min_queries=1)
+    observe(advisor, "SELECT * FROM students WHERE section = 'A'", duration_ms=10.0)
+    observe(advisor, "SELECT * FROM students WHERE name = 'Alice'", duration_ms=9.0)
+
+    assert [r["columns"] for r in advisor.recommendations(seeded)] == [["name"], ["section"]]
+    assert [r["columns"] for r in advisor.recommendations(seeded, limit=1)] == [["name"]]
+
+def test_failed_hypothetical_index_rolls_back_before_reset(monkeypatch):
+    """Test a failing hypopg call falls back to selectivity and resets on a usable transaction"""
+    monkeypatch.setattr("app.sql_rewriter.estimate_cost", lambda db, sql: 10.0)
+
+    def execute(statement, *args):
+        if "hypopg_create_index" in str(statement):
+            raise RuntimeError("hypopg")
+
+    db = Mock()
+    db.execute.side_effect = execute
+    advisor = IndexAdvisor(min_queries=1)
+    observe(advisor, "SELECT * FROM students WHERE section = 'A'")
+
+    assert advisor._hypothetical_estimate(db, advisor.candidates()[0]) is None
+    calls = [c for c in db.mock_calls if c[0] in ("rollback", "execute")]
+    assert calls[-2] == call.rollback()
+    assert "hypopg_reset" in str(calls[-1].args[0])
+
+def test_existing_index_excluded(seeded):
+    """Test candidates already served by an existing index (the primary key) are skipped"""
+    advisor = IndexAdvisor(min_queries=1)
+    observe(advisor, "SELECT * FROM students WHERE id = 3")
+    observe(advisor, "SELECT * FROM students WHERE name = 'Alice'")
+
+    assert [r["columns"] for r in advisor.recommendations(seeded)] == [["name"]]
+
+def test_apply_creates_index():
+    """Test apply issues the DDL and records the outcome"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    advisor = IndexAdvisor(min_queries=1)
+    observe(advisor, "SELECT * FROM students WHERE section = 'A' ORDER BY marks")
+    candidate = advisor.get("ix_students_section_marks")
+
+    advisor.apply(engine, candidate)
+
+    assert candidate.status == "created"
+    indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("students")}
+    assert indexes["ix_students_section_marks"] == ["section", "marks"]
+
+def test_crud_records_executed_queries(seeded):
+    """Test execute_sql_query feeds the global advisor"""
+    from app.index_advisor import index_advisor
+    index_advisor.reset()
+    crud.execute_sql_query(seeded, "SELECT name FROM students WHERE section = 'A'")
+
+    assert [(c.columns, c.count) for c in index_advisor.candidates()] == [(("section",), 1)]
+    index_advisor.reset()
+
+def test_apply_endpoint_requires_admin_key(client, monkeypatch):
+    """Test applying is refused without the configured key"""
+    monkeypatch.setattr("app.main.settings.ADMIN_API_KEY", "secret")
+    response = client.post("/admin/index-recommendations/apply", json={"names": ["ix_students_section"]})
+    assert response.status_code == 403
+
+    response = client.post(
+        "/admin/index-recommendations/apply", json={"names": ["ix_students_unknown"]},
+        headers={"X-Admin-Key": "secret"}
+    )
+    assert response.status_code == 404
+
+def test_recommendations_endpoint(client, monkeypatch):
+    """Test the listing endpoint needs the admin key and responds with the advisor state"""
+    monkeypatch.setattr("app.main.settings.ADMIN_API_KEY", "secret")
+    assert client.get("/admin/index-recommendations").status_code == 403
+
+    response = client.get("/admin/index-recommendations", headers={"X-Admin-Key": "secret"})
+    assert response.status_code == 200
+    assert "recommendations" in response.json()
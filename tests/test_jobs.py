@@ -0,0 +1,127 @@
+import json
+import time
+from unittest.mock import MagicMock
+import pytest
+from fastapi.testclient import TestClient
+from app.batch_query import BatchQueryRunner
+from app.cancellation import CancelToken, Cancelled
+from app.jobs import JobQueue, QueueFull
+from app.main import app
+from app.ollama_service import OllamaService
+
+@pytest.fixture
+def service(monkeypatch, fake_service):
+    fake = fake_service()
+    monkeypatch.setattr("app.jobs.ollama_service", fake)
+    monkeypatch.setattr("app.main.settings.NL_CACHE_ENABLED", False)
+    monkeypatch.setattr("app.main.settings.SQL_REWRITE_ENABLED", False)
+    return fake
+
+@pytest.fixture
+def queue(file_sessions):
+    queue = JobQueue(session_factory=file_sessions, runner=BatchQueryRunner(generation_concurrency=1), max_workers=1)
+    yield queue
+    queue.shutdown()
+
+def test_job_runs_to_completion(queue, service):
+    """Test a submitted job finishes with the query result and timings"""
+    job = queue.submit("How many students?")
+    assert job.done.wait(5)
+
+    data = job.to_dict()
+    assert data["status"] == "succeeded"
+    assert data["result"]["result"] == [(1,)]
+    assert data["result"]["explanation"] == "explained"
+    assert data["run_ms"] is not None
+    assert queue.stats()["run_ms"]["count"] == 1
+
+def test_cancel_queued_job(queue, service):
+    """Test a job still waiting for a worker is dropped without running"""
+    service.release.clear()
+    running = queue.submit("first")
+    assert service.started.wait(5)
+    waiting = queue.submit("second")
+    assert queue.queue_depth() == 1
+
+    queue.cancel(waiting.id)
+    assert waiting.status == "cancelled" and waiting.started_at is None
+    service.release.set()
+    assert running.done.wait(5) and running.status == "succeeded"
+
+def test_cancel_running_generation_frees_slot(queue, service):
+    """Test cancelling during generation stops it and releases the Ollama slot"""
+    service.release.clear()
+    job = queue.submit("slow question")
+    assert service.started.wait(5)
+
+    queue.cancel(job.id)
+    assert job.done.wait(5)
+    assert job.status == "cancelled"
+    assert queue.runner._generation_slots.acquire(blocking=False)
+
+def test_cancel_interrupts_running_query(queue, service):
+    """Test cancelling while the query runs interrupts it on the connection"""
+    service.sql = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c"
+    job = queue.submit("endless")
+    while job.status != "running":
+        time.sleep(0.01)
+    time.sleep(0.2)
+
+    queue.cancel(job.id)
+    assert job.done.wait(5)
+    assert job.status == "cancelled"
+
+def test_queue_bound_and_result_ttl(file_sessions, service):
+    """Test submissions beyond the queue bound are rejected and results expire"""
+    queue = JobQueue(session_factory=file_sessions, max_workers=1, max_queued=1, result_ttl_seconds=0.05)
+    service.release.clear()
+    first = queue.submit("one")
+    assert service.started.wait(5)
+    queue.submit("two")
+    with pytest.raises(QueueFull):
+        queue.submit("three")
+    assert queue.stats()["rejected"] == 1
+
+    service.release.set()
+    assert first.done.wait(5)
+    time.sleep(0.1)
+    assert queue.get(first.id) is None
+    queue.shutdown()
+
+def test_job_endpoints(queue, service, monkeypatch):
+    """Test submit, long-poll, subscribe, cancel and metrics over HTTP"""
+    monkeypatch.setattr("app.main.job_queue", queue)
+    with TestClient(app) as client:
+        response = client.post("/jobs", json={"question": "How many students?", "explain": False})
+        assert response.status_code == 202
+        assert response.headers["Location"] == f"/jobs/{response.json()['job_id']}"
+
+        data = client.get(response.headers["Location"], params={"wait": 5}).json()
+        assert data["status"] == "succeeded"
+        assert data["result"]["result"] == [[1]]
+
+        events = client.get(response.headers["Location"] + "/events").text.strip().split("\n\n")
+        assert events[-1].startswith("event: result")
+        assert json.loads(events[-1].split("data: ", 1)[1])["status"] == "succeeded"
+
+        assert client.delete(response.headers["Location"]).json()["status"] == "succeeded"
+        assert client.get("/jobs/nope").status_code == 404
+        assert client.get("/metrics/jobs").json()["succeeded"] == 1
+
+def test_generate_sql_stops_reading_when_cancelled(monkeypatch):
+    """Test cancelled generation closes Ollama's stream instead of reading it to the end"""
+    cancel = CancelToken()
+
+    def lines():
+        yield b'{"response": "SELECT", "done": false}'
+        cancel.set()
+        yield b'{"response": " 1", "done": false}'
+
+    response = MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = lines()
+    monkeypatch.setattr("app.ollama_service.requests.post", MagicMock(return_value=response))
+
+    with pytest.raises(Cancelled):
+        OllamaService().generate_sql("anything", cancel=cancel)
+    response.close.assert_called_once()
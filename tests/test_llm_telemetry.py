@@ -0,0 +1,89 @@
+import json
+from unittest.mock import MagicMock
+import pytest
+import requests
+from app.cancellation import CancelToken
+from app.llm_telemetry import LLMCall, LLMTelemetry, prompt_version
+from app.ollama_service import OllamaService
+
+def ollama_response(text, **counters):
+    """Final /api/generate object with nanosecond durations, as Ollama returns it"""
+    return {"response": text, "done": True, "prompt_eval_count": 400, "eval_count": 20,
+            "load_duration": 5_000_000, "prompt_eval_duration": 200_000_000,
+            "eval_duration": 500_000_000, "total_duration": 800_000_000, **counters}
+
+@pytest.fixture
+def telemetry(monkeypatch):
+    store = LLMTelemetry(max_calls=100, cold_load_seconds=1.0)
+    monkeypatch.setattr("app.ollama_service.llm_telemetry", store)
+    return store
+
+def post_returning(monkeypatch, *bodies, status_code=200):
+    responses = []
+    for body in bodies:
+        response = MagicMock(status_code=status_code)
+        response.json.return_value = body
+        responses.append(response)
+    post = MagicMock(side_effect=responses)
+    monkeypatch.setattr("app.ollama_service.requests.post", post)
+    return post
+
+def test_generate_and_explain_record_counters(telemetry, monkeypatch):
+    """Test SQL generation and explanation keep Ollama's counters per call"""
+    post_returning(monkeypatch, ollama_response("SELECT 1"),
+                   ollama_response("It selects one.", load_duration=3_000_000_000))
+    service = OllamaService(model="m1")
+    service.generate_sql("anything")
+    service.explain_query("SELECT 1", [(1,)])
+
+    generate, explain = telemetry.calls()
+    assert (generate.kind, generate.prompt_tokens, generate.output_tokens) == ("generate_sql", 400, 20)
+    assert generate.eval_seconds == 0.5 and generate.prompt_version == prompt_version(service.sql_prompt)
+    assert (explain.kind, explain.load_seconds) == ("explain", 3.0)
+
+def test_streamed_and_failed_calls(telemetry, monkeypatch):
+    """Test the counters come from a stream's done object and failures count as errors"""
+    response = MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = [
+        json.dumps({"response": "SELECT", "done": False}).encode(),
+        json.dumps(ollama_response(" 1")).encode(),
+    ]
+    monkeypatch.setattr("app.ollama_service.requests.post", MagicMock(return_value=response))
+    assert OllamaService().generate_sql("anything", cancel=CancelToken()) == "SELECT 1"
+    assert telemetry.calls()[-1].output_tokens == 20
+
+    monkeypatch.setattr("app.ollama_service.requests.post",
+                        MagicMock(side_effect=requests.exceptions.Timeout()))
+    with pytest.raises(Exception):
+        OllamaService().generate_sql("anything")
+    assert telemetry.calls()[-1].ok is False
+
+def test_rollups_by_model_and_prompt_version():
+    """Test rollups sum tokens, derive tokens/sec and count cold loads per group"""
+    telemetry = LLMTelemetry(max_calls=3, cold_load_seconds=1.0)
+    data = ollama_response("")
+    for model, version in [("old", "v0"), ("m1", "v1"), ("m1", "v1"), ("m1", "v2")]:
+        telemetry.record(LLMCall.from_response(model, "generate_sql", version, data, 1.0))
+    telemetry.record(LLMCall.from_response("m1", "generate_sql", "v2", dict(data, load_duration=2e9), 3.0))
+
+    (by_model,) = telemetry.rollup(("model",))
+    assert by_model["model"] == "m1" and by_model["calls"] == 3
+    assert by_model["prompt_tokens"] == {"total": 1200, "avg": 400.0}
+    assert by_model["output_tokens_per_second"] == pytest.approx(40.0)
+    assert by_model["prompt_tokens_per_second"] == pytest.approx(2000.0)
+    assert (by_model["cold_loads"], by_model["load_seconds"]["max"]) == (1, 2.0)
+
+    by_version = {row["prompt_version"]: row["calls"] for row in telemetry.rollup(("model", "prompt_version"))}
+    assert by_version == {"v1": 1, "v2": 2}
+
+def test_llm_metrics_endpoint(client, monkeypatch, telemetry):
+    """Test /metrics/llm serves both rollups and, on request, the newest calls"""
+    monkeypatch.setattr("app.main.llm_telemetry", telemetry)
+    telemetry.record(LLMCall.from_response("m1", "explain", "v1", ollama_response(""), 1.0))
+
+    data = client.get("/metrics/llm", params={"recent": 1}).json()
+    assert data["calls"] == 1 and data["max_calls"] == 100
+    assert data["by_model"][0]["output_tokens"]["total"] == 20
+    assert data["by_prompt_version"][0]["kind"] == "explain"
+    assert data["recent"][0]["prompt_tokens"] == 400
@@ -3,17 +3,18 @@ from fastapi import status
 from unittest.mock import Mock, patch, MagicMock
 import json
 
-def test_startup_event_mocked(client, monkeypatch):
+def test_startup_event_mocked(client, monkeypatch, caplog):
     """Test startup_event function"""
     mock_test_connection = Mock(return_value=True)
     monkeypatch.setattr('app.main.ollama_service.test_connection', mock_test_connection)
     
     mock_test_connection.assert_not_called()
     
-    with patch('builtins.print') as mock_print:
-        from app.main import startup_event
+    with caplog.at_level("INFO", logger="app.main"):
+        from app.main import startup_event, startup_checks
         startup_event()
-        mock_print.assert_any_call("Checking Ollama connection...")
+        assert startup_checks.wait(timeout=5)
+        assert "Checking Ollama connection..." in caplog.messages
         mock_test_connection.assert_called_once()
 
 def test_read_root_endpoint(client):
@@ -183,8 +184,8 @@ def test_health_check_comprehensive(client, monkeypatch):
         yield mock_db
     
     # Temporarily override the dependency
-    from app.main import app, get_db as original_get_db
-    app.dependency_overrides[original_get_db] = mock_get_db
+    from app.main import app, get_read_db
+    app.dependency_overrides[get_read_db] = mock_get_db
     
     try:
         response = client.get("/health")
@@ -209,8 +210,8 @@ def test_health_check_database_error(client, monkeypatch):
     def mock_get_db():
         yield mock_db
     
-    from app.main import app, get_db as original_get_db
-    app.dependency_overrides[original_get_db] = mock_get_db
+    from app.main import app, get_read_db
+    app.dependency_overrides[get_read_db] = mock_get_db
     
     try:
         response = client.get("/health")
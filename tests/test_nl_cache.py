@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import Mock
+from app import crud, schemas
+from app.nl_cache import QueryCache, build_template, normalize_question
+from app.value_index import ValueIndex
+
+VALUES = {"class_name": ["DevOps", "Data Science", "Machine Learning"], "section": ["A", "B"]}
+
+@pytest.fixture
+def index():
+    value_index = ValueIndex()
+    value_index.load(VALUES)
+    return value_index
+
+@pytest.fixture
+def cache(index):
+    return QueryCache(index, max_entries=10)
+
+def test_find_mentions(index):
+    """Test class and section values are recognized in questions"""
+    mentions = index.find_mentions("average marks of section b in data science class")
+    assert [(m.column, m.value) for m in mentions] == [("section", "B"), ("class_name", "Data Science")]
+
+def test_short_values_need_column_word(index):
+    """Test one-letter sections are not matched as ordinary words"""
+    assert index.find_mentions("show a list of students") == []
+
+def test_build_template_requires_every_mention(index):
+    """Test SQL that doesn't use the mentioned value is not templated"""
+    mentions = index.find_mentions("average marks in devops class")
+    assert build_template("SELECT AVG(marks) FROM students", mentions) is None
+    assert build_template("SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'", mentions) is not None
+
+def test_exact_hit(cache):
+    """Test repeated questions are served from the exact cache"""
+    cache.store("How many students?", "m", "SELECT COUNT(*) FROM students")
+
+    hit = cache.lookup("  how many STUDENTS ", "m")
+    assert (hit.sql, hit.kind) == ("SELECT COUNT(*) FROM students", "exact")
+    assert cache.lookup("How many students?", "other-model") is None
+
+def test_template_hit_fills_new_value(cache):
+    """Test a question differing only in the class is answered from the template"""
+    cache.store("What is the average marks in DevOps class?", "m",
+                "SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'")
+
+    hit = cache.lookup("What is the average marks in Data Science class?", "m")
+
+    assert hit.kind == "template"
+    assert hit.sql == "SELECT AVG(marks) FROM students WHERE class_name = 'Data Science'"
+    stats = cache.stats()
+    assert stats["template_hits"] == 1
+    assert stats["exact_hits"] == 0
+
+def test_template_multiple_slots(cache):
+    """Test templates with several mentions keep each value in its slot"""
+    cache.store("students in section A of DevOps", "m",
+                "SELECT * FROM students WHERE section = 'A' AND class_name = 'DevOps'")
+
+    hit = cache.lookup("students in section B of Machine Learning", "m")
+    assert hit.sql == "SELECT * FROM students WHERE section = 'B' AND class_name = 'Machine Learning'"
+
+def test_different_shape_misses(cache):
+    """Test a different question shape is not answered by the template"""
+    cache.store("average marks in DevOps class", "m", "SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'")
+    assert cache.lookup("highest marks in Data Science class", "m") is None
+    assert cache.stats()["misses"] == 1
+
+def test_normalize_question():
+    """Test case, whitespace and trailing punctuation are ignored"""
+    assert normalize_question("  How   many\nstudents?! ") == "how many students"
+
+def test_query_endpoint_uses_template_cache(client, db_session, monkeypatch):
+    """Test the second question of the same shape skips the LLM"""
+    for name, class_name in [("Ann", "DevOps"), ("Ben", "Data Science")]:
+        crud.create_student(db_session, schemas.StudentCreate(name=name, class_name=class_name, section="A", marks=80))
+    monkeypatch.setattr("app.query_pipeline.value_index.refresh_seconds", 0)
+    monkeypatch.setattr("app.query_pipeline.value_index.full_refresh_seconds", 0)
+
+    mock_service = Mock()
+    mock_service.generate_sql = Mock(return_value="SELECT name FROM students WHERE class_name = 'DevOps'")
+    mock_service.explain_query = Mock(return_value="Lists students.")
+    mock_service.model = "llama3.2:3b"
+    monkeypatch.setattr('app.main.ollama_service', mock_service)
+
+    first = client.post("/query/", json={"question": "List students in DevOps"})
+    second = client.post("/query/", json={"question": "List students in Data Science"})
+
+    assert first.json()["cache"] is None
+    assert second.json()["cache"] == "template"
+    assert second.json()["result"] == [["Ben"]]
+    assert mock_service.generate_sql.call_count == 1
@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import event, text
+from app import crud, schemas
+from app.pagination import TableChangeCounter, decode_cursor, encode_cursor, students_changes
+
+@pytest.fixture
+def seeded(db_session):
+    for i in range(7):
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=f"Student {i}", class_name="DevOps", section="A", marks=50 + i
+        ))
+    return db_session
+
+def test_cursor_round_trip():
+    """Test cursors decode to the id they were made from and reject anything else"""
+    assert decode_cursor(encode_cursor(42)) == 42
+    for bad in ["", "not-a-cursor", encode_cursor(-1), "eyJhZnRlciI6dHJ1ZX0"]:
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+def test_keyset_pages_cover_table_in_id_order(seeded):
+    """Test walking pages after the last id visits every row once"""
+    seen, after = [], None
+    while True:
+        page = crud.get_students(seeded, limit=3, after_id=after)
+        if not page:
+            break
+        seen.extend(s.id for s in page)
+        after = page[-1].id
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen)) == 7
+
+def test_counter_picks_up_external_writes(seeded):
+    """Test a write by another process changes the version after the next sync"""
+    counter = TableChangeCounter("students", sync_seconds=0)
+    before = counter.etag(seeded)
+    assert counter.etag(seeded) == before
+
+    seeded.execute(text("INSERT INTO students (name, class_name, section, marks) VALUES ('X', 'Y', 'Z', 1)"))
+    seeded.execute(text("UPDATE student_stats SET student_count = student_count + 1 WHERE section = 'A'"))
+
+    assert counter.etag(seeded) != before
+
+def test_etag_is_the_same_in_every_process(seeded):
+    """Test separate counters (one per worker) tag an unchanged table alike, and a local write re-reads it"""
+    first, second = (TableChangeCounter("students", sync_seconds=3600) for _ in range(2))
+    assert first.etag(seeded) == second.etag(seeded)
+
+    seeded.execute(text("INSERT INTO students (name, class_name, section, marks) VALUES ('X', 'Y', 'Z', 1)"))
+    seeded.execute(text("UPDATE student_stats SET student_count = student_count + 1 WHERE section = 'A'"))
+    before = first.etag(seeded)
+    first.bump()
+    assert first.etag(seeded) != before
+
+def test_endpoint_cursor_headers(client, seeded):
+    """Test the endpoint links to the next page until the last one"""
+    names, url = [], "/students/?limit=3"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        names.extend(s["name"] for s in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/students/?limit=3&cursor={cursor}" if cursor else None
+
+    assert names == [f"Student {i}" for i in range(7)]
+    assert client.get("/students/?cursor=garbage").status_code == 400
+
+def test_conditional_get(client, seeded, monkeypatch):
+    """Test unchanged pages return 304 without a query and writes change the ETag"""
+    first = client.get("/students/?limit=2")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    monkeypatch.setattr(students_changes, "sync_seconds", 3600)
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(seeded.get_bind(), "before_cursor_execute", record)
+    try:
+        cached = client.get("/students/?limit=2", headers={"If-None-Match": etag})
+    finally:
+        event.remove(seeded.get_bind(), "before_cursor_execute", record)
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert statements == []
+
+    client.post("/students/create", json={"name": "New", "class_name": "DevOps", "section": "B", "marks": 70})
+    changed = client.get("/students/?limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
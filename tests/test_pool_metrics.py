@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.pool_metrics import InstrumentedQueuePool, PoolMetrics, instrument_engine, registry
+
+@pytest.fixture
+def pooled_engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    yield engine
+    registry.pop("test-pool", None)
+    engine.dispose()
+
+def test_checkout_and_wait_time_recorded(pooled_engine):
+    """Test checkouts, checkins and wait samples are counted"""
+    metrics = instrument_engine(pooled_engine, "test-pool")
+
+    for _ in range(3):
+        with pooled_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    data = metrics.snapshot(pooled_engine.pool)
+    assert data["checkouts"] == 3
+    assert data["checkins"] == 3
+    assert data["connects"] == 1
+    assert data["checkout_wait_ms"]["count"] == 3
+    assert data["in_use"] == 0
+    assert data["idle"] == 1
+
+def test_overflow_and_timeout_recorded(pooled_engine):
+    """Test overflow connections and checkout timeouts are counted"""
+    metrics = instrument_engine(pooled_engine, "test-pool")
+
+    first = pooled_engine.connect()
+    second = pooled_engine.connect()
+
+    assert metrics.snapshot(pooled_engine.pool)["in_use"] == 2
+    assert metrics.overflow_events == 1
+
+    with pytest.raises(PoolTimeoutError):
+        pooled_engine.connect()
+    assert metrics.checkout_timeouts == 1
+
+    first.close()
+    second.close()
+
+def test_invalidation_recorded(pooled_engine):
+    """Test connection invalidations are counted"""
+    metrics = instrument_engine(pooled_engine, "test-pool")
+
+    with pooled_engine.connect() as conn:
+        conn.invalidate()
+
+    assert metrics.invalidations == 1
+
+def test_metrics_survive_pool_recreate(pooled_engine):
+    """Test dispose() keeps the wait-time instrumentation"""
+    metrics = instrument_engine(pooled_engine, "test-pool")
+    pooled_engine.dispose()
+
+    assert pooled_engine.pool.metrics is metrics
+
+def test_snapshot_without_pool():
+    """Test snapshot of an unused metrics object"""
+    data = PoolMetrics("empty").snapshot()
+    assert data["name"] == "empty"
+    assert data["checkout_wait_ms"]["avg"] == 0.0
+
+def test_pool_metrics_endpoint(client):
+    """Test the pool metrics endpoint"""
+    response = client.get("/metrics/pool")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert any(pool["name"] == "primary" for pool in data["pools"])
+    assert data["replicas"] == []
@@ -0,0 +1,125 @@
+import pstats
+import threading
+import time
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from app.profiling import ProfiledRoute, ProfileSession, ProfileStore, ProfilingMiddleware, authorized, requested_mode
+
+ADMIN = {"X-Admin-Key": "secret"}
+
+def busy_work(seconds=0.05):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles"), max_files=3)
+
+@pytest.fixture(autouse=True)
+def admin_key(monkeypatch):
+    monkeypatch.setattr("app.profiling.settings.ADMIN_API_KEY", "secret")
+
+@pytest.fixture
+def profiled(store):
+    """A small app wired like create_app() with PROFILING_ENABLED"""
+    router = APIRouter(route_class=ProfiledRoute)
+
+    @router.get("/work")
+    def work():
+        return {"total": busy_work()}
+
+    application = FastAPI()
+    application.include_router(router)
+    application.add_middleware(ProfilingMiddleware, store=store, sample_interval_ms=0.5)
+    return TestClient(application)
+
+def test_requested_mode():
+    """Test header values select a profiler, with collapsed stacks as the default"""
+    assert requested_mode(None) is None and requested_mode("0") is None
+    assert requested_mode("pstats") == "pstats"
+    assert requested_mode("1") == "collapsed"
+
+def test_unprofiled_requests_are_untouched(profiled, store):
+    """Test a request without X-Profile gets no profile headers and stores nothing"""
+    response = profiled.get("/work")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert store.list() == []
+
+def test_collapsed_profile_covers_the_worker_thread(profiled, store):
+    """Test sampled stacks include the sync endpoint running in the threadpool"""
+    response = profiled.get("/work", headers={"X-Profile": "collapsed", **ADMIN})
+    profile = store.get(response.headers["X-Profile-Id"])
+    assert response.headers["X-Profile-Url"] == f"/admin/profiles/{profile['id']}"
+    assert (profile["mode"], profile["status"], profile["method"]) == ("collapsed", 200, "GET")
+
+    with open(profile["path"]) as f:
+        lines = f.read().splitlines()
+    assert any(line.startswith("worker;") and "busy_work" in line for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) > 10
+
+def test_pstats_profile_and_summary(profiled, store):
+    """Test cProfile output from both threads is merged into one pstats file"""
+    response = profiled.get("/work", params={"profile": "pstats"}, headers=ADMIN)
+    profile_id = response.headers["X-Profile-Id"]
+
+    stats = pstats.Stats(store.get(profile_id)["path"])
+    assert any(name == "busy_work" for _, _, name in stats.stats)
+    assert "busy_work" in store.summary(profile_id)
+
+def test_admin_key_and_retention(profiled, store, monkeypatch):
+    """Test profiling needs the admin key, is off without one configured, and old profiles are pruned"""
+    assert "X-Profile-Id" not in profiled.get("/work", headers={"X-Profile": "1"}).headers
+    monkeypatch.setattr("app.profiling.settings.ADMIN_API_KEY", "")
+    assert not authorized(None) and not authorized("")
+    assert "X-Profile-Id" not in profiled.get("/work", headers={"X-Profile": "1", "X-Admin-Key": ""}).headers
+    monkeypatch.setattr("app.profiling.settings.ADMIN_API_KEY", "secret")
+
+    for _ in range(4):
+        profiled.get("/work", headers={"X-Profile": "1", **ADMIN})
+        time.sleep(0.01)
+    assert len(store.list()) == 3
+
+def test_one_profile_at_a_time(profiled, store, monkeypatch):
+    """Test a request arriving while another is profiled runs unprofiled and says so"""
+    lock = threading.Lock()
+    monkeypatch.setattr("app.profiling._one_at_a_time", lock)
+    with lock:
+        response = profiled.get("/work", headers={"X-Profile": "1", **ADMIN})
+    assert response.headers["X-Profile"] == "busy"
+    assert "X-Profile-Id" not in response.headers
+
+def test_sampler_without_attached_threads(store):
+    """Test a sampling session with no attached thread samples but stores an empty profile"""
+    session = ProfileSession("collapsed", 0.001)
+    session.start()
+    time.sleep(0.01)
+    session.stop()
+    assert session.samples > 0
+    store.save(session, {"created_at": time.time()})
+    with open(store.get(session.id)["path"]) as f:
+        assert f.read() == ""
+
+def test_profile_endpoints(client, store, monkeypatch):
+    """Test /admin/profiles is off by default, then lists and serves stored profiles"""
+    monkeypatch.setattr("app.main.settings.PROFILING_ENABLED", False)
+    assert client.get("/admin/profiles").status_code == 404
+
+    monkeypatch.setattr("app.main.settings.PROFILING_ENABLED", True)
+    monkeypatch.setattr("app.main.profile_store", store)
+    session = ProfileSession("pstats")
+    with session.attach("event_loop"):
+        busy_work(0.01)
+    store.save(session, {"created_at": time.time()})
+
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers=ADMIN).json()["profiles"][0]["id"] == session.id
+    with open(store.get(session.id)["path"], "rb") as f:
+        assert client.get(f"/admin/profiles/{session.id}", headers=ADMIN).content == f.read()
+    text = client.get(f"/admin/profiles/{session.id}", params={"format": "text"}, headers=ADMIN).text
+    assert "busy_work" in text
+    assert client.get("/admin/profiles/..%2F..%2Fetc%2Fpasswd", headers=ADMIN).status_code == 404
@@ -0,0 +1,38 @@
+import pytest
+from app import crud, query_pipeline, schemas
+from app.nl_cache import nl_query_cache
+from app.sql_store import generated_sql_store
+
+DERIVED = "SELECT name FROM (SELECT * FROM students) s"
+FLATTENED = "SELECT name FROM students s"
+
+def test_answer_rewrites_runs_and_caches_generated_sql(db_session, fake_service):
+    """Test the rewritten SQL runs while the question cache keeps the SQL as generated"""
+    nl_query_cache.clear()
+    crud.create_student(db_session, schemas.StudentCreate(name="Ann", class_name="DevOps", section="A", marks=80))
+    service = fake_service(sql=DERIVED)
+
+    query, columns, rows = query_pipeline.answer(db_session, "List the students", service)
+    assert (query.sql, query.cache_kind, columns, rows) == (FLATTENED, None, ["name"], [("Ann",)])
+
+    again, _, _ = query_pipeline.answer(db_session, "List the students", service)
+    assert (again.generated_sql, again.sql, again.cache_kind) == (DERIVED, FLATTENED, "exact")
+    assert service.generated == ["List the students"]
+    nl_query_cache.clear()
+
+def test_failed_query_is_not_cached(db_session, fake_service):
+    """Test SQL that fails validation isn't remembered for the question"""
+    nl_query_cache.clear()
+    service = fake_service("DELETE FROM students")
+    query = query_pipeline.prepare(db_session, "Remove everyone", service)
+    with pytest.raises(ValueError):
+        query_pipeline.execute(db_session, query)
+    assert nl_query_cache.lookup("Remove everyone", service.model) is None
+
+def test_export_runs_the_rewritten_sql(client, monkeypatch, fake_service):
+    """Test /query/export goes through the rewrite stage like /query/"""
+    monkeypatch.setattr("app.main.ollama_service", fake_service(sql=DERIVED))
+    response = client.post("/query/export", json={"question": "List the students", "format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["X-SQL-Id"] == generated_sql_store.make_id(FLATTENED)
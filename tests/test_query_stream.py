@@ -0,0 +1,104 @@
+import asyncio
+import json
+from unittest.mock import MagicMock, Mock, patch
+import pytest
+from app import crud, schemas
+from app.ollama_service import OllamaService
+from app.query_stream import query_events
+
+class FakeService:
+    model = "fake"
+
+    def __init__(self, sql="SELECT name FROM students ORDER BY name"):
+        self.sql = sql
+        self.closed = False
+
+    def generate_sql(self, question):
+        return self.sql
+
+    def stream_explanation(self, sql_query, result):
+        try:
+            for token in ["Lists ", "every ", "student."]:
+                yield token
+        finally:
+            self.closed = True
+
+class FakeRequest:
+    """Reports a disconnect from the nth check on"""
+    def __init__(self, disconnect_at=None):
+        self.disconnect_at = disconnect_at
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.disconnect_at is not None and self.checks >= self.disconnect_at
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def collect(events):
+    async def run():
+        return [chunk async for chunk in events]
+    return parse_events(b"".join(asyncio.run(run())).decode())
+
+@pytest.fixture
+def students(db_session):
+    for name in ["Alice", "Bob", "Carol"]:
+        crud.create_student(db_session, schemas.StudentCreate(name=name, class_name="DevOps", section="A", marks=70))
+    return db_session
+
+def test_stage_order(client, students, monkeypatch):
+    """Test events arrive as sql, columns, row chunks, explanation tokens, done"""
+    monkeypatch.setattr("app.main.ollama_service", FakeService())
+    response = client.get("/query/stream", params={"question": "List students", "chunk_size": 2})
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert [name for name, _ in events] == ["sql", "columns", "rows", "rows", "explanation", "explanation",
+                                            "explanation", "done"]
+    assert events[1][1] == {"columns": ["name"], "row_count": 3}
+    assert [data["offset"] for name, data in events if name == "rows"] == [0, 2]
+    assert "".join(data["token"] for name, data in events if name == "explanation") == "Lists every student."
+    assert set(events[-1][1]["timings"]) == {"generate_ms", "execute_ms", "explain_ms", "total_ms"}
+
+def test_invalid_sql_becomes_error_event(students):
+    """Test a rejected query ends the stream with a 400 error event"""
+    events = collect(query_events(FakeRequest(), students, "drop it", FakeService("DROP TABLE students")))
+    assert events == [("error", {"status": 400, "detail": "Only SELECT queries are allowed for security reasons"})]
+
+def test_disconnect_stops_before_execution(students, monkeypatch):
+    """Test no query runs once the client has gone"""
+    execute = Mock()
+    monkeypatch.setattr("app.query_pipeline.crud.execute_sql_query", execute)
+    events = collect(query_events(FakeRequest(disconnect_at=1), students, "List students", FakeService()))
+
+    assert [name for name, _ in events] == ["sql"]
+    execute.assert_not_called()
+
+def test_disconnect_closes_explanation(students):
+    """Test leaving during the explanation closes the Ollama stream"""
+    service = FakeService()
+    events = collect(query_events(FakeRequest(disconnect_at=4), students, "List students", service))
+
+    assert [name for name, _ in events][-1] == "explanation"
+    assert service.closed
+
+@patch("app.ollama_service.requests.post")
+def test_stream_explanation_tokens(mock_post):
+    """Test tokens are read from Ollama's NDJSON stream until done"""
+    response = MagicMock(status_code=200)
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = [
+        b'{"response": "Counts", "done": false}', b"", b'{"response": " rows.", "done": false}',
+        b'{"response": "", "done": true}', b'{"response": "ignored"}',
+    ]
+    mock_post.return_value = response
+
+    assert list(OllamaService().stream_explanation("SELECT 1", [(1,)])) == ["Counts", " rows."]
+    assert mock_post.call_args.kwargs["stream"] is True
+    assert mock_post.call_args.kwargs["json"]["stream"] is True
+    response.__exit__.assert_called_once()
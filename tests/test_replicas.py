@@ -0,0 +1,100 @@
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from app.replicas import ReplicaRouter, parse_replica_urls
+
+def make_router(count=2, **kwargs):
+    engines = [create_engine("sqlite:///:memory:") for _ in range(count)]
+    return ReplicaRouter(engines, **kwargs)
+
+def measured(router):
+    """Take the first lag measurements synchronously, as the background checks would"""
+    for index in range(len(router.engines)):
+        router.refresh_lag(index)
+    router._lag_checked_at = [time.monotonic()] * len(router.engines)
+    return router
+
+def test_parse_replica_urls():
+    """Test parsing of comma-separated replica URLs"""
+    assert parse_replica_urls("") == []
+    assert parse_replica_urls(None) == []
+    assert parse_replica_urls("sqlite:///a.db, sqlite:///b.db,") == ["sqlite:///a.db", "sqlite:///b.db"]
+
+def test_no_replicas_falls_back_to_primary():
+    """Test router without replicas returns no session factory"""
+    router = ReplicaRouter([])
+    assert router.choose() is None
+    assert router.session_factory() is None
+
+def test_round_robin_selection():
+    """Test round-robin cycles through healthy replicas"""
+    router = measured(make_router(3))
+    chosen = [router.choose() for _ in range(6)]
+    assert chosen == [0, 1, 2, 0, 1, 2]
+
+def test_least_connections_selection(monkeypatch):
+    """Test least-connections picks the replica with fewest checkouts"""
+    router = measured(make_router(2, strategy="least_connections"))
+    checked_out = {id(router.engines[0]): 4, id(router.engines[1]): 1}
+    monkeypatch.setattr(ReplicaRouter, "_checked_out", staticmethod(lambda engine: checked_out[id(engine)]))
+    assert router.choose() == 1
+
+def test_lagging_replica_is_skipped(monkeypatch):
+    """Test replicas over the lag threshold are not used"""
+    router = make_router(2, max_lag_seconds=5.0)
+    lags = {id(router.engines[0]): 30.0, id(router.engines[1]): 1.0}
+    monkeypatch.setattr(router, "_measure_lag", lambda engine: lags[id(engine)])
+    measured(router)
+    assert [router.choose() for _ in range(3)] == [1, 1, 1]
+
+def test_all_replicas_lagging_falls_back(monkeypatch):
+    """Test primary fallback when every replica is lagging or unreachable"""
+    router = make_router(2, max_lag_seconds=5.0)
+    lags = {id(router.engines[0]): 30.0, id(router.engines[1]): None}
+    monkeypatch.setattr(router, "_measure_lag", lambda engine: lags[id(engine)])
+    measured(router)
+    assert router.session_factory() is None
+
+def test_lag_is_cached_between_checks(monkeypatch):
+    """Test lag is only re-measured after the check interval"""
+    router = make_router(1, lag_check_interval=60.0)
+    calls = []
+    monkeypatch.setattr(router, "_measure_lag", lambda engine: calls.append(engine) or 0.0)
+    measured(router)
+    for _ in range(5):
+        router.choose()
+    assert len(calls) == 1
+
+def test_lag_is_measured_off_the_request_path(monkeypatch):
+    """Test a slow lag check doesn't block choose(), which uses the primary until it lands"""
+    router = make_router(1, lag_check_interval=60.0)
+    release, done = threading.Event(), threading.Event()
+
+    def slow_measure(engine):
+        release.wait(5)
+        done.set()
+        return 0.0
+
+    monkeypatch.setattr(router, "_measure_lag", slow_measure)
+    start = time.monotonic()
+    assert router.choose() is None
+    assert time.monotonic() - start < 1
+    release.set()
+    assert done.wait(5)
+    for _ in range(50):
+        if router.choose() == 0:
+            break
+        time.sleep(0.01)
+    assert router.choose() == 0
+
+def test_sqlite_replica_lag_is_zero():
+    """Test lag measurement on non-PostgreSQL replicas"""
+    router = make_router(1)
+    assert router.refresh_lag(0) == 0.0
+    assert router.replica_lag(0) == 0.0
+
+def test_invalid_strategy():
+    """Test unknown selection strategy is rejected"""
+    with pytest.raises(ValueError, match="Unknown replica selection strategy"):
+        make_router(1, strategy="random")
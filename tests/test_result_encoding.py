@@ -0,0 +1,97 @@
+import datetime
+import decimal
+import json
+import pytest
+from unittest.mock import Mock
+from app import encoding
+
+COLUMNS = ["name", "marks", "average"]
+ROWS = [("Alice", 90, decimal.Decimal("88.50")), ("Bob", None, decimal.Decimal("70"))]
+
+def test_infer_column_types():
+    """Test types come from the first non-null value in each column"""
+    assert encoding.infer_column_types(ROWS, 3) == ["string", "integer", "numeric"]
+    assert encoding.infer_column_types([(None,)], 1) == ["null"]
+
+def test_to_columnar():
+    """Test columnar layout: metadata once, one array per column"""
+    data = encoding.to_columnar(COLUMNS, ROWS)
+    assert data["columns"][0] == {"name": "name", "type": "string"}
+    assert data["data"][0] == ["Alice", "Bob"]
+    assert data["data"][1] == [90, None]
+
+def test_to_columnar_empty_result():
+    """Test columnar layout for an empty result"""
+    data = encoding.to_columnar(["count"], [])
+    assert data["data"] == [[]]
+    assert data["columns"] == [{"name": "count", "type": "null"}]
+
+def test_dumps_matches_fastapi_encoding():
+    """Test fast serializer encodes values like jsonable_encoder"""
+    from fastapi.encoders import jsonable_encoder
+
+    rows = [(decimal.Decimal("88.50"), decimal.Decimal("3"), datetime.date(2024, 1, 2))]
+    assert json.loads(encoding.dumps(rows)) == jsonable_encoder(rows)
+
+def test_encode_unknown_format():
+    """Test unknown format is rejected"""
+    with pytest.raises(ValueError, match="Unknown result format"):
+        encoding.encode_sql_response({}, COLUMNS, ROWS, result_format="xml")
+
+def test_encode_rows_default_is_plain_dict():
+    """Test default format keeps the validated dict response"""
+    response = encoding.encode_sql_response({"sql_query": "SELECT 1"}, COLUMNS, ROWS)
+    assert response == {"sql_query": "SELECT 1", "result": ROWS}
+
+def test_arrow_ipc_roundtrip():
+    """Test Arrow IPC stream output"""
+    pa = pytest.importorskip("pyarrow")
+
+    payload = encoding.arrow_ipc_bytes(COLUMNS, ROWS, metadata={"sql_query": "SELECT 1"})
+    table = pa.ipc.open_stream(payload).read_all()
+
+    assert table.column_names == COLUMNS
+    assert table.column("name").to_pylist() == ["Alice", "Bob"]
+    assert table.schema.metadata[b"sql_query"] == b"SELECT 1"
+
+def test_query_endpoint_columnar(client, monkeypatch):
+    """Test /query/ columnar format"""
+    client.post("/students/create", json={
+        "name": "Columnar", "class_name": "DevOps", "section": "A", "marks": 77
+    })
+
+    mock_service = Mock()
+    mock_service.generate_sql = Mock(return_value="SELECT name, marks FROM students")
+    mock_service.explain_query = Mock(return_value="Names and marks.")
+    mock_service.model = "llama3.2:3b"
+    monkeypatch.setattr('app.main.ollama_service', mock_service)
+
+    response = client.post("/query/?format=columnar", json={"question": "names and marks"})
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["format"] == "columnar"
+    assert data["columns"] == [{"name": "name", "type": "string"}, {"name": "marks", "type": "integer"}]
+    assert data["data"] == [["Columnar"], [77]]
+    assert data["row_count"] == 1
+
+def test_query_endpoint_arrow(client, monkeypatch):
+    """Test /query/ Arrow IPC output chosen by Accept header"""
+    pa = pytest.importorskip("pyarrow")
+
+    mock_service = Mock()
+    mock_service.generate_sql = Mock(return_value="SELECT COUNT(*) AS total FROM students")
+    mock_service.explain_query = Mock(return_value="Counts students.")
+    mock_service.model = "llama3.2:3b"
+    monkeypatch.setattr('app.main.ollama_service', mock_service)
+
+    response = client.post(
+        "/query/",
+        json={"question": "how many"},
+        headers={"Accept": encoding.ARROW_STREAM_MEDIA_TYPE}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == encoding.ARROW_STREAM_MEDIA_TYPE
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["total"]
@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import Mock
+from app import crud, schemas
+from app.sql_params import execute_parameterized, parameterize, plan_cache_stats
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    plan_cache_stats.reset()
+    yield
+    plan_cache_stats.reset()
+
+def test_parameterize_where_literals():
+    """Test WHERE literals become bind parameters"""
+    query = parameterize("SELECT name FROM students WHERE class_name = 'O''Neil' AND marks > 80.5 LIMIT 5")
+
+    assert query.sql == "SELECT name FROM students WHERE class_name = :p1 AND marks > :p2 LIMIT 5"
+    assert query.positional == "SELECT name FROM students WHERE class_name = $1 AND marks > $2 LIMIT 5"
+    assert query.params == {"p1": "O'Neil", "p2": 80.5}
+    assert query.kinds == ("unknown", "numeric")
+
+def test_parameterize_variants_share_shape():
+    """Test queries differing only in values share one shape"""
+    first = parameterize("SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'")
+    second = parameterize("SELECT AVG(marks) FROM students WHERE class_name = 'Data Science'")
+    assert first.shape == second.shape
+    assert first.params != second.params
+
+@pytest.mark.parametrize("sql", [
+    "SELECT ROUND(AVG(marks), 2) FROM students GROUP BY 1 ORDER BY 1",
+    "SELECT name FROM students ORDER BY marks DESC LIMIT 3 OFFSET 1",
+    "SELECT name FROM students WHERE created_at > now() - INTERVAL '7 days'",
+    "SELECT name FROM students WHERE id = :id",
+    r"SELECT name FROM students WHERE name = E'O\'Neil' OR name = N'Ann'",
+    "SELECT name FROM students WHERE flags = B'101' OR hash = X'ff'",
+])
+def test_parameterize_keeps_structural_literals(sql):
+    """Test select-list, ordering, limit, typed and prefixed literals are left in place"""
+    query = parameterize(sql)
+    assert query.sql == sql
+    assert query.params == {}
+
+def test_parameterize_subquery_contexts():
+    """Test clause context is tracked through nested subqueries"""
+    query = parameterize("SELECT name FROM students WHERE marks > (SELECT AVG(marks) FROM students "
+                         "WHERE section = 'A' LIMIT 1) AND class_name = 'DevOps'")
+    assert query.sql == ("SELECT name FROM students WHERE marks > (SELECT AVG(marks) FROM students "
+                         "WHERE section = :p1 LIMIT 1) AND class_name = :p2")
+
+def test_execute_parameterized_sqlite(db_session):
+    """Test bound execution returns the same rows and counts shape reuse"""
+    crud.create_student(db_session, schemas.StudentCreate(name="Ann", class_name="DevOps", section="A", marks=80))
+    crud.create_student(db_session, schemas.StudentCreate(name="Ben", class_name="Data Science", section="B", marks=70))
+    db_session.connection().connection.info.pop("prepared_statements", None)
+
+    first = execute_parameterized(db_session, "SELECT name FROM students WHERE class_name = 'DevOps'").fetchall()
+    second = execute_parameterized(db_session, "SELECT name FROM students WHERE class_name = 'Data Science'").fetchall()
+
+    assert [tuple(r) for r in first] == [("Ann",)]
+    assert [tuple(r) for r in second] == [("Ben",)]
+    stats = plan_cache_stats.snapshot()
+    assert stats["executions"] == 2
+    assert stats["hits"] == 1
+    assert stats["distinct_shapes"] == 1
+
+def fake_postgres_session():
+    session = Mock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.connection.return_value.connection.info = {}
+    return session
+
+def executed(session):
+    return [str(call.args[0]) for call in session.execute.call_args_list]
+
+def test_prepared_statements_per_connection():
+    """Test PostgreSQL shapes are PREPAREd once per connection and then EXECUTEd"""
+    session = fake_postgres_session()
+
+    execute_parameterized(session, "SELECT name FROM students WHERE marks > 50", cache_size=2)
+    execute_parameterized(session, "SELECT name FROM students WHERE marks > 90", cache_size=2)
+
+    assert executed(session) == [
+        "PREPARE nlsql_1(integer) AS SELECT name FROM students WHERE marks > $1",
+        "EXECUTE nlsql_1(:p1)",
+        "EXECUTE nlsql_1(:p1)",
+    ]
+    assert plan_cache_stats.snapshot()["hit_rate"] == 0.5
+
+def test_prepared_statements_declare_parameter_types():
+    """Test PREPARE declares number types, leaving strings for the server to infer from context"""
+    session = fake_postgres_session()
+
+    execute_parameterized(session, "SELECT name FROM students WHERE 1 = 1 AND marks > 50 + 10.5 "
+                                   "AND id <> 3000000000 AND created_at > '2024-01-01'", cache_size=2)
+
+    assert executed(session)[0] == (
+        "PREPARE nlsql_1(integer, integer, integer, numeric, bigint, unknown) AS SELECT name FROM students "
+        "WHERE $1 = $2 AND marks > $3 + $4 AND id <> $5 AND created_at > $6"
+    )
+
+def test_prepared_statement_lru_eviction():
+    """Test the least recently used statement is deallocated past the cache size"""
+    session = fake_postgres_session()
+
+    execute_parameterized(session, "SELECT name FROM students WHERE marks > 50", cache_size=1)
+    execute_parameterized(session, "SELECT name FROM students WHERE section = 'A'", cache_size=1)
+
+    assert "DEALLOCATE nlsql_1" in executed(session)
+    assert plan_cache_stats.snapshot()["evictions"] == 1
+
+def test_sql_metrics_endpoint(client):
+    """Test plan cache stats are exposed"""
+    response = client.get("/metrics/sql")
+    assert response.status_code == 200
+    assert set(response.json()["plan_cache"]) >= {"hits", "prepares", "hit_rate"}
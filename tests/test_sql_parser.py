@@ -0,0 +1,118 @@
+import pytest
+from app.sql_parser import (
+    Between, Binary, Column, DerivedTable, Func, InList, IsNull, Literal,
+    SQLSyntaxError, Star, Table, conjuncts, parse, to_sql, tokenize,
+)
+
+ROUND_TRIP_QUERIES = [
+    "SELECT * FROM students",
+    "SELECT COUNT(*) FROM students",
+    "SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'",
+    "SELECT name, marks FROM students ORDER BY marks DESC LIMIT 5",
+    "SELECT class_name, COUNT(*) AS total FROM students GROUP BY class_name HAVING COUNT(*) > 2",
+    "SELECT DISTINCT section FROM students",
+    "SELECT * FROM students WHERE marks BETWEEN 50 AND 90 AND section IN ('A', 'B')",
+    "SELECT * FROM students WHERE name LIKE 'A%' OR name NOT ILIKE '%z'",
+    "SELECT * FROM students WHERE (section = 'A' OR section = 'B') AND marks > 80",
+    "SELECT ROUND(AVG(marks)::numeric, 2) FROM students",
+    "SELECT CAST(marks AS FLOAT) FROM students",
+    "SELECT name, CASE WHEN marks >= 90 THEN 'A' ELSE 'B' END AS grade FROM students",
+    "SELECT name, RANK() OVER (PARTITION BY class_name ORDER BY marks DESC) FROM students",
+    "SELECT * FROM students WHERE marks > (SELECT AVG(marks) FROM students)",
+    "SELECT COUNT(*) FROM (SELECT * FROM students WHERE marks > 50) s",
+    "WITH top AS (SELECT * FROM students ORDER BY marks DESC LIMIT 3) SELECT name FROM top",
+    "SELECT s.name FROM students s JOIN students t ON s.marks = t.marks",
+    "SELECT * FROM students WHERE updated_at IS NOT NULL",
+    "SELECT * FROM students WHERE name = 'O''Brien'",
+    "SELECT (marks + 5) * 2 FROM students",
+    "SELECT marks - (5 - 2) FROM students",
+]
+
+def test_tokenize_kinds():
+    """Test tokenizer splits identifiers, literals, operators and comments"""
+    tokens = tokenize("SELECT name FROM students WHERE marks >= 9.5 AND x = 'it''s' -- note", keep_comments=True)
+    kinds = [(t.kind, t.value) for t in tokens]
+
+    assert ("ident", "updated_at") not in kinds
+    assert ("op", ">=") in kinds
+    assert ("number", "9.5") in kinds
+    assert ("string", "'it''s'") in kinds
+    assert kinds[-1] == ("comment", "-- note")
+
+def test_tokenize_drops_comments_by_default():
+    """Test comments are skipped unless requested"""
+    tokens = tokenize("SELECT 1 /* DROP TABLE students */")
+    assert [t.value for t in tokens] == ["SELECT", "1"]
+
+def test_tokenize_identifier_containing_keyword():
+    """Test identifiers that contain keywords stay single tokens"""
+    tokens = tokenize("SELECT updated_at, deleted FROM students")
+    assert tokens[1].value == "updated_at"
+    assert tokens[1].kind == "ident"
+
+def test_tokenize_errors():
+    """Test unterminated strings and stray characters are rejected"""
+    with pytest.raises(SQLSyntaxError, match="Unterminated"):
+        tokenize("SELECT 'abc")
+    with pytest.raises(SQLSyntaxError, match="Unexpected character"):
+        tokenize("SELECT #")
+
+@pytest.mark.parametrize("sql", ROUND_TRIP_QUERIES)
+def test_round_trip(sql):
+    """Test parse -> render reproduces the query and is stable"""
+    rendered = to_sql(parse(sql))
+    assert rendered == sql
+    assert to_sql(parse(rendered)) == rendered
+
+def test_parse_structure():
+    """Test the AST shape of a typical generated query"""
+    select = parse("SELECT name FROM students WHERE class_name = 'DevOps' AND marks BETWEEN 50 AND 90 "
+                   "AND section IS NULL ORDER BY marks DESC LIMIT 3")
+
+    assert select.items[0].expr == Column("name")
+    assert select.from_ == Table("students")
+    terms = conjuncts(select.where)
+    assert terms[0] == Binary("=", Column("class_name"), Literal("DevOps", "string"))
+    assert isinstance(terms[1], Between)
+    assert isinstance(terms[2], IsNull)
+    assert select.order_by[0].descending
+    assert select.limit == Literal("3", "number")
+
+def test_parse_function_and_star():
+    """Test COUNT(*) and derived tables"""
+    select = parse("SELECT COUNT(*) FROM (SELECT * FROM students) AS s")
+    assert select.items[0].expr == Func("COUNT", [Star()])
+    assert isinstance(select.from_, DerivedTable)
+    assert select.from_.alias == "s"
+
+def test_parse_in_list_and_negative_numbers():
+    """Test IN lists and negative literals"""
+    select = parse("SELECT * FROM students WHERE marks NOT IN (-1, 2)")
+    assert select.where == InList(Column("marks"), [Literal("-1", "number"), Literal("2", "number")], negated=True)
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT - -5 AS x, name FROM students WHERE marks + 5 > 80",
+     "SELECT 5 AS x, name FROM students WHERE marks + 5 > 80"),
+    ("SELECT - - marks, name FROM students", "SELECT - -marks, name FROM students"),
+])
+def test_double_minus_never_renders_a_comment(sql, expected):
+    """Test nested unary minus round-trips without producing "--", which would comment out the rest"""
+    rendered = to_sql(parse(sql))
+    assert rendered == expected
+    assert to_sql(parse(rendered)) == rendered
+
+def test_parse_fetch_first():
+    """Test FETCH FIRST is normalized to LIMIT"""
+    assert to_sql(parse("SELECT * FROM students FETCH FIRST 2 ROWS ONLY")) == "SELECT * FROM students LIMIT 2"
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM students",
+    "SELECT * FROM students UNION SELECT * FROM students",
+    "SELECT * FROM students; DROP TABLE students",
+    "SELECT FROM",
+    "",
+])
+def test_parse_rejects_unsupported(sql):
+    """Test statements outside the supported subset raise SQLSyntaxError"""
+    with pytest.raises(SQLSyntaxError):
+        parse(sql)
@@ -0,0 +1,187 @@
+import pytest
+from sqlalchemy import text
+from app import crud, schemas
+from app.sql_rewriter import SQLRewriter, estimate_cost, sql_rewriter
+
+STUDENTS = [
+    ("Alice", "Data Science", "A", 90),
+    ("Bob", "Data Science", "B", 72),
+    ("Carol", "DevOps", "A", 85),
+    ("Dan", "DevOps", "B", 40),
+    ("Eve", "Machine Learning", "A", 95),
+]
+
+@pytest.fixture
+def seeded(db_session):
+    for name, class_name, section, marks in STUDENTS:
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=name, class_name=class_name, section=section, marks=marks
+        ))
+    return db_session
+
+def rows(db, sql):
+    return sorted(tuple(row) for row in db.execute(text(sql)).fetchall())
+
+def assert_equivalent(db, before, after):
+    assert rows(db, before) == rows(db, after)
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT COUNT(*) FROM (SELECT * FROM students WHERE marks > 50) s",
+     "SELECT COUNT(*) FROM students s WHERE marks > 50"),
+    ("SELECT name FROM (SELECT * FROM students WHERE section = 'A' ORDER BY marks) s WHERE marks > 80",
+     "SELECT name FROM students s WHERE section = 'A' AND marks > 80 ORDER BY marks"),
+    ("SELECT * FROM (SELECT name, marks FROM students) t",
+     "SELECT name, marks FROM students t"),
+])
+def test_flatten_derived_table(seeded, sql, expected):
+    """Test redundant derived tables are flattened"""
+    rewritten, applied = sql_rewriter.rewrite(sql)
+    assert rewritten == expected
+    assert applied[0].rule == "flatten_derived_table"
+    assert_equivalent(seeded, sql, rewritten)
+
+def test_flatten_keeps_inner_order_for_outer_limit(seeded):
+    """Test a top-N over an ordered derived table keeps its order after flattening"""
+    sql = "SELECT * FROM (SELECT * FROM students ORDER BY marks DESC) s LIMIT 3"
+    rewritten, _ = sql_rewriter.rewrite(sql)
+
+    assert rewritten == "SELECT * FROM students s ORDER BY marks DESC LIMIT 3"
+    assert [row[1] for row in seeded.execute(text(rewritten))] == ["Eve", "Alice", "Carol"]
+
+def test_flatten_keeps_ordered_subquery_under_aggregate():
+    """Test an ordered derived table under an aggregate isn't flattened"""
+    sql = "SELECT COUNT(*) FROM (SELECT * FROM students ORDER BY marks) s"
+    _, applied = sql_rewriter.rewrite(sql)
+    assert "flatten_derived_table" not in [a.rule for a in applied]
+
+def test_flatten_keeps_limited_subquery(seeded):
+    """Test derived tables with LIMIT are not flattened, only pruned"""
+    sql = "SELECT AVG(marks) FROM (SELECT * FROM students ORDER BY marks DESC LIMIT 3) s"
+    rewritten, applied = sql_rewriter.rewrite(sql)
+
+    assert [a.rule for a in applied] == ["prune_derived_projection"]
+    assert rewritten == "SELECT AVG(marks) FROM (SELECT marks FROM students ORDER BY marks DESC LIMIT 3) s"
+    assert_equivalent(seeded, sql, rewritten)
+
+def test_prune_count_star_uses_primary_key(seeded):
+    """Test COUNT(*) over a SELECT * subquery projects only the key"""
+    sql = "SELECT COUNT(*) FROM (SELECT * FROM students LIMIT 2) s"
+    rewritten, _ = sql_rewriter.rewrite(sql)
+
+    assert rewritten == "SELECT COUNT(*) FROM (SELECT id FROM students LIMIT 2) s"
+    assert_equivalent(seeded, sql, rewritten)
+
+def test_remove_redundant_in_subquery(seeded):
+    """Test pk IN (SELECT pk FROM same table WHERE p) becomes p"""
+    sql = "SELECT name FROM students WHERE id IN (SELECT id FROM students WHERE class_name = 'DevOps')"
+    rewritten, _ = sql_rewriter.rewrite(sql)
+
+    assert rewritten == "SELECT name FROM students WHERE class_name = 'DevOps'"
+    assert_equivalent(seeded, sql, rewritten)
+
+def test_in_subquery_on_other_column_is_kept():
+    """Test IN subqueries on non-key columns are left alone"""
+    sql = "SELECT name FROM students WHERE marks IN (SELECT marks FROM students WHERE section = 'A')"
+    assert sql_rewriter.rewrite(sql) == (sql, [])
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT name FROM students WHERE marks + 10 > 90", "SELECT name FROM students WHERE marks > 80"),
+    ("SELECT name FROM students WHERE marks - 5 <= 80", "SELECT name FROM students WHERE marks <= 85"),
+    ("SELECT name FROM students WHERE 90 < marks + 5", "SELECT name FROM students WHERE marks > 85"),
+])
+def test_sargable_arithmetic(seeded, sql, expected):
+    """Test arithmetic on the column is moved to the constant side"""
+    rewritten, _ = sql_rewriter.rewrite(sql)
+    assert rewritten == expected
+    assert_equivalent(seeded, sql, rewritten)
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM students WHERE LOWER(class_name) = 'devops'",
+    "SELECT name FROM students WHERE UPPER(class_name) = 'DEVOPS' AND marks > 50",
+    "SELECT name FROM students WHERE LOWER(class_name) IN ('devops', 'data science')",
+])
+def test_case_folded_predicates_unchanged(sql):
+    """Test LOWER()/UPPER() predicates are kept even when the value index knows a single spelling"""
+    canonical = {"devops": "DevOps", "data science": "Data Science"}
+    rewriter = SQLRewriter(value_resolver=lambda column, value: canonical.get(value.lower()), log_costs=False)
+    assert rewriter.rewrite(sql) == (sql, [])
+
+def test_canonicalize_literals(seeded):
+    """Test misspelled literals are corrected to the stored value"""
+    canonical = {"data science": "Data Science", "devops": "DevOps"}
+    rewriter = SQLRewriter(value_resolver=lambda column, value: canonical.get(value.lower()), log_costs=False)
+
+    sql = "SELECT name FROM students WHERE class_name = 'data science' OR class_name IN ('Devops')"
+    rewritten, applied = rewriter.rewrite(sql)
+
+    assert rewritten == "SELECT name FROM students WHERE class_name = 'Data Science' OR class_name IN ('DevOps')"
+    assert applied[0].rule == "canonicalize_literals"
+    assert rows(seeded, rewritten) == [("Alice",), ("Bob",), ("Carol",), ("Dan",)]
+
+@pytest.mark.parametrize("question, limit", [
+    ("Show the top 3 students by marks", "3"),
+    ("Which student has the highest marks?", "1"),
+])
+def test_limit_for_top_questions(question, limit):
+    """Test LIMIT is added to sorted listings for "top" questions"""
+    rewritten, applied = sql_rewriter.rewrite("SELECT * FROM students ORDER BY marks DESC", question)
+    assert rewritten == f"SELECT * FROM students ORDER BY marks DESC LIMIT {limit}"
+    assert applied[0].rule == "add_limit_for_top_questions"
+
+@pytest.mark.parametrize("question", [
+    "List students sorted by name",
+    "Which students have the highest marks in each class?",
+    None,
+])
+def test_no_limit_without_top_intent(question):
+    """Test ordinary sorted listings keep every row"""
+    sql = "SELECT * FROM students ORDER BY marks DESC"
+    assert sql_rewriter.rewrite(sql, question) == (sql, [])
+
+def test_push_limit_into_derived_table(seeded):
+    """Test outer ORDER BY/LIMIT is pushed into a projecting derived table"""
+    sql = "SELECT name, doubled FROM (SELECT name, marks * 2 AS doubled FROM students) t ORDER BY doubled DESC LIMIT 2"
+    rewritten, applied = sql_rewriter.rewrite(sql)
+
+    assert [a.rule for a in applied] == ["push_limit_into_derived_table"]
+    assert rewritten == ("SELECT name, doubled FROM (SELECT name, marks * 2 AS doubled FROM students "
+                         "ORDER BY marks * 2 DESC LIMIT 2) t ORDER BY doubled DESC LIMIT 2")
+    assert_equivalent(seeded, sql, rewritten)
+
+def test_unparseable_sql_is_unchanged():
+    """Test SQL outside the parser's subset passes through"""
+    sql = "SELECT EXTRACT(YEAR FROM now())"
+    assert sql_rewriter.rewrite(sql) == (sql, [])
+
+def test_estimate_cost_non_postgres(seeded):
+    """Test planner cost is only estimated on PostgreSQL"""
+    assert estimate_cost(seeded, "SELECT * FROM students") is None
+
+def test_estimate_cost_validates_and_keeps_the_transaction():
+    """Test invalid SQL is never EXPLAINed and a failed EXPLAIN doesn't roll back the session"""
+    from unittest.mock import MagicMock
+
+    db = MagicMock()
+    db.get_bind().dialect.name = "postgresql"
+    assert estimate_cost(db, "SELECT 1; DROP TABLE students") is None
+    db.execute.assert_not_called()
+
+    db.execute.side_effect = RuntimeError("syntax error")
+    assert estimate_cost(db, "SELECT name FROM students") is None
+    db.begin_nested.assert_called_once()
+    db.rollback.assert_not_called()
+
+def test_query_endpoint_applies_rewrites(client, monkeypatch):
+    """Test /query/ returns and executes the rewritten SQL"""
+    from unittest.mock import Mock
+
+    mock_service = Mock()
+    mock_service.generate_sql = Mock(return_value="SELECT name FROM (SELECT * FROM students) s")
+    mock_service.explain_query = Mock(return_value="Lists students.")
+    mock_service.model = "llama3.2:3b"
+    monkeypatch.setattr('app.main.ollama_service', mock_service)
+
+    response = client.post("/query/", json={"question": "List the students"})
+
+    assert response.status_code == 200
+    assert response.json()["sql_query"] == "SELECT name FROM students s"
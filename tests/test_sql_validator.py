@@ -0,0 +1,79 @@
+import pytest
+from app.sql_validator import SQLValidator
+
+@pytest.fixture
+def validator():
+    return SQLValidator(cache_size=10)
+
+@pytest.mark.parametrize("sql", [
+    "SELECT updated_at, created_at FROM students",
+    "select name from students where name = 'DROP TABLE students'",
+    "SELECT * FROM students -- DELETE everything",
+    "SELECT * FROM students /* ; DROP TABLE students */",
+    "WITH top AS (SELECT * FROM students ORDER BY marks DESC LIMIT 3) SELECT name FROM top",
+    "SELECT * FROM students;",
+    r"SELECT E'it\'s; DROP TABLE students' AS x",
+    "SELECT $$; DROP TABLE students$$ AS x, $q$ $$ ; $$ $q$ AS y",
+])
+def test_valid_queries(validator, sql):
+    """Test read-only queries pass, including keyword-like identifiers and strings"""
+    assert validator.validate(sql).sql
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM students", "Only SELECT queries are allowed"),
+    ("  update students set marks = 1", "Only SELECT queries are allowed"),
+    ("SELECT * FROM students; DROP TABLE students", "forbidden keyword: DROP"),
+    ("WITH gone AS (DELETE FROM students RETURNING *) SELECT * FROM gone", "forbidden keyword: DELETE"),
+    ("SELECT * INTO backup FROM students", "forbidden keyword: INTO"),
+    ("SELECT * FROM students; SELECT 1", "Only a single SQL statement is allowed"),
+    (r"SELECT E'\'' ; DROP TABLE students; --' AS x", "forbidden keyword: DROP"),
+    (r"SELECT e'\\' ; SELECT 1 --'", "Only a single SQL statement is allowed"),
+    ("SELECT $q$ $$ $q$; DELETE FROM students --$$", "forbidden keyword: DELETE"),
+    ("SELECT $$it's$$; SELECT 1 --'", "Only a single SQL statement is allowed"),
+    ("SELECT pg_sleep(10)", "forbidden function: PG_SLEEP"),
+    ('SELECT "pg_sleep"(10)', "forbidden function: PG_SLEEP"),
+    ('SELECT pg_catalog."pg_read_file"(path) FROM files', "forbidden function: PG_READ_FILE"),
+    ("SELECT 'unterminated", "Could not parse query"),
+    ("", "Only SELECT queries are allowed"),
+])
+def test_rejected_queries(validator, sql, message):
+    """Test writes, multiple statements and side-effecting functions are rejected"""
+    with pytest.raises(ValueError, match=message):
+        validator.validate(sql)
+
+def test_executable_sql_strips_comments_and_semicolon(validator):
+    """Test the executable SQL has no comments or trailing semicolons"""
+    validated = validator.validate("SELECT name /* c */ FROM students -- trailing\n;;")
+    assert validated.sql == "SELECT name         FROM students"
+
+def test_fingerprint_ignores_literals_and_formatting(validator):
+    """Test queries differing only in literals and whitespace share a fingerprint"""
+    first = validator.validate("SELECT AVG(marks) FROM students WHERE class_name = 'DevOps'")
+    second = validator.validate("select avg(marks)\n  from STUDENTS where class_name='Data Science'")
+    third = validator.validate("SELECT MAX(marks) FROM students WHERE class_name = 'DevOps'")
+
+    assert first.fingerprint == second.fingerprint
+    assert first.fingerprint != third.fingerprint
+    assert first.canonical == "SELECT avg ( marks ) FROM students WHERE class_name = ?"
+    assert first.literal_count == 1
+
+def test_validated_query_has_ast(validator):
+    """Test the parsed AST is returned when the query is in the supported subset"""
+    assert validator.validate("SELECT name FROM students").ast is not None
+    assert validator.validate("SELECT EXTRACT(YEAR FROM now())").ast is None
+
+def test_repeated_queries_are_memoized(validator, monkeypatch):
+    """Test a repeated query skips validation entirely"""
+    sql = "SELECT COUNT(*) FROM students"
+    first = validator.validate(sql)
+
+    monkeypatch.setattr(validator, "_validate", lambda sql: pytest.fail("validated twice"))
+    assert validator.validate(sql) is first
+    assert validator.stats()["hits"] == 1
+
+def test_execute_sql_query_column_with_keyword_name(db_session):
+    """Test crud no longer rejects identifiers that contain forbidden words"""
+    from app import crud
+
+    result = crud.execute_sql_query(db_session, "SELECT COUNT(*) AS updated_total FROM students")
+    assert result == [(0,)]
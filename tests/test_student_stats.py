@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import text
+from app import crud, schemas, student_stats
+from app.models import StudentStats
+from app.sql_parser import parse, to_sql
+from app.sql_rewriter import SQLRewriter
+
+STUDENTS = [
+    ("Alice", "Data Science", "A", 90),
+    ("Bob", "Data Science", "A", 72),
+    ("Carol", "Data Science", "B", 85),
+    ("Dan", "DevOps", "B", 40),
+    ("Eve", "DevOps", "B", 95),
+]
+
+@pytest.fixture
+def seeded(db_session):
+    for name, class_name, section, marks in STUDENTS:
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=name, class_name=class_name, section=section, marks=marks
+        ))
+    return db_session
+
+def rows(db, sql):
+    return sorted(tuple(row) for row in db.execute(text(sql)).fetchall())
+
+def test_create_student_maintains_stats(seeded):
+    """Test inserts update count, sum, min and max in the same transaction"""
+    stats = seeded.get(StudentStats, ("Data Science", "A"))
+    assert (stats.student_count, stats.marks_sum, stats.marks_min, stats.marks_max) == (2, 162, 72, 90)
+    assert student_stats.total_students(seeded) == 5
+
+def test_rebuild_matches_incremental(seeded):
+    """Test a full rebuild produces the same aggregates"""
+    before = rows(seeded, "SELECT * FROM student_stats")
+    seeded.execute(text("DELETE FROM student_stats"))
+    assert student_stats.ensure_consistent(seeded) is True
+    assert rows(seeded, "SELECT * FROM student_stats") == before
+    assert student_stats.ensure_consistent(seeded) is False
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM students",
+    "SELECT COUNT(*) FROM students WHERE class_name = 'Nothing'",
+    "SELECT AVG(marks) FROM students WHERE class_name = 'Data Science'",
+    "SELECT class_name, COUNT(*), MAX(marks), MIN(marks) FROM students GROUP BY class_name",
+    "SELECT class_name, section, SUM(marks) AS total FROM students GROUP BY class_name, section ORDER BY total DESC",
+    "SELECT section, AVG(marks) FROM students WHERE class_name IN ('DevOps', 'Data Science') GROUP BY section "
+    "HAVING COUNT(*) > 2",
+])
+def test_rewrite_matches_base_table(seeded, sql):
+    """Test rewritten aggregates return the same results as scanning students"""
+    rewriter = SQLRewriter(summary_tables=True, log_costs=False)
+    rewritten, applied = rewriter.rewrite(sql)
+
+    assert "student_stats" in rewritten
+    assert [a.rule for a in applied] == ["use_summary_table"]
+    assert [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows(seeded, rewritten)] == \
+        [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows(seeded, sql)]
+
+def test_rewrite_output_names():
+    """Test unaliased aggregates keep their usual output name"""
+    select = parse("SELECT COUNT(*) FROM students")
+    assert student_stats.rewrite_select(select)
+    assert to_sql(select) == "SELECT COALESCE(SUM(student_count), 0) AS count FROM student_stats"
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM students",
+    "SELECT COUNT(*) FROM students WHERE marks > 50",
+    "SELECT name, MAX(marks) FROM students GROUP BY name",
+    "SELECT COUNT(DISTINCT section) FROM students",
+    "SELECT AVG(marks) FROM students s",
+    "SELECT class_name, RANK() OVER (ORDER BY AVG(marks)) FROM students GROUP BY class_name",
+])
+def test_rewrite_skips_unsupported(sql):
+    """Test queries that need row-level data keep reading students"""
+    assert student_stats.rewrite_select(parse(sql)) is False
+
+def test_count_endpoint_reads_stats(client, seeded):
+    """Test /count is served from the summary"""
+    response = client.get("/count")
+    assert response.status_code == 200
+    assert response.json()["count"] == 5
@@ -0,0 +1,62 @@
+import json
+import logging
+from unittest.mock import MagicMock
+from app.logging_config import JsonFormatter
+from app.metrics import Histogram
+from app.ollama_service import OllamaService
+from app.timing import RequestTimings, _current, stage
+
+def test_histogram_buckets_and_series_cap():
+    """Test observations land in cumulative le buckets and extra label sets are dropped"""
+    histogram = Histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0), max_series=1)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="llm")
+    histogram.observe(0.2, stage="execute")
+
+    sample = histogram.samples()[("llm",)]
+    assert sample["buckets"] == [2, 3, 4]
+    assert (sample["count"], sample["sum"]) == (4, 3.65)
+    assert histogram.dropped == 1
+    assert 'latency_seconds_bucket{stage="llm",le="+Inf"} 4' in histogram.render()
+
+def test_stage_records_only_inside_a_request():
+    """Test stages are no-ops without request timings and add up per name within one"""
+    with stage("llm"):
+        pass
+
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        for _ in range(2):
+            with stage("execute"):
+                pass
+        with stage("llm"):
+            pass
+    finally:
+        _current.reset(token)
+    assert list(timings.stages) == ["execute", "llm"]
+    assert timings.server_timing(total=0.01).endswith("total;dur=10.0")
+
+def test_query_reports_server_timing_and_metrics(client, monkeypatch):
+    """Test /query/ returns every stage in Server-Timing and /metrics exports them by model and cache"""
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"response": "SELECT COUNT(*) FROM students"}
+    monkeypatch.setattr("app.ollama_service.requests.post", MagicMock(return_value=response))
+    monkeypatch.setattr("app.main.ollama_service", OllamaService(model="timed-model"))
+
+    answer = client.post("/query/", json={"question": "How many students are there?"})
+    assert answer.status_code == 200
+    stages = [entry.split(";")[0] for entry in answer.headers["Server-Timing"].split(", ")]
+    assert stages == ["cache", "prompt", "llm", "rewrite", "validate", "execute", "explain", "serialize", "total"]
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'nl2sql_stage_duration_seconds_count{stage="llm",model="timed-model",cache="miss"}' in metrics.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/query/",status="200"}' in metrics.text
+
+def test_json_log_lines_include_extra_fields():
+    """Test the JSON formatter writes the message and any extra fields"""
+    record = logging.LogRecord("app.main", logging.DEBUG, __file__, 1, "Query returned %d rows", (3,), None)
+    record.sql_id = "abc"
+    data = json.loads(JsonFormatter().format(record))
+    assert (data["message"], data["level"], data["sql_id"]) == ("Query returned 3 rows", "DEBUG", "abc")
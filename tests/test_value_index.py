@@ -0,0 +1,64 @@
+import pytest
+from app import crud, models, schemas
+from app.value_index import ValueIndex, text_columns
+
+VALUES = {"class_name": ["DevOps", "Data Science", "Machine Learning"], "section": ["A", "B"]}
+
+@pytest.fixture
+def index():
+    value_index = ValueIndex()
+    value_index.load(VALUES)
+    return value_index
+
+@pytest.mark.parametrize("literal, expected", [
+    ("DevOps", "DevOps"),
+    ("devops", "DevOps"),
+    ("Dev-Ops", "DevOps"),
+    ("datascience", "Data Science"),
+    ("Data Sciense", "Data Science"),
+    ("Machine Lerning", "Machine Learning"),
+    ("Biology", None),
+])
+def test_canonical(index, literal, expected):
+    """Test literals resolve to the stored spelling"""
+    assert index.canonical("class_name", literal) == expected
+
+def test_canonical_short_values_not_fuzzy(index):
+    """Test short literals are only corrected by case"""
+    assert index.canonical("section", "b") == "B"
+    assert index.canonical("section", "C") is None
+
+def test_trie_prefers_longest_value(index):
+    """Test overlapping values resolve to the longest mention"""
+    index.load({"class_name": ["Data", "Data Science"]})
+    mentions = index.find_mentions("students in data science and data")
+    assert [m.value for m in mentions] == ["Data Science", "Data"]
+
+def test_mentions_respect_word_boundaries(index):
+    """Test values inside longer words are not mentions"""
+    assert index.find_mentions("devopsy students") == []
+
+def test_relevant_values_fuzzy(index):
+    """Test misspelled question words bring in the intended value only"""
+    relevant = index.relevant_values("average marks in data sciense")
+    assert relevant == {"class_name": ["Data Science"]}
+
+def test_text_columns():
+    """Test only non-key string columns are candidates"""
+    assert text_columns(models.Student) == ["name", "class_name", "section"]
+
+def test_refresh_and_incremental(db_session):
+    """Test full refresh skips high-cardinality columns and increments add new values"""
+    for i, class_name in enumerate(["DevOps", "DevOps", "Data Science"]):
+        crud.create_student(db_session, schemas.StudentCreate(
+            name=f"Student {i}", class_name=class_name, section="A", marks=50
+        ))
+    index = ValueIndex(max_values=2)
+    index.refresh(db_session)
+
+    assert index.values("class_name") == ["Data Science", "DevOps"]
+    assert index.values("name") == []
+
+    crud.create_student(db_session, schemas.StudentCreate(name="New", class_name="Cloud", section="A", marks=60))
+    index.refresh_incremental(db_session)
+    assert index.canonical("class_name", "cloud") == "Cloud"
@@ -0,0 +1,93 @@
+import threading
+import pytest
+from sqlalchemy import event, text
+from app import schemas
+from app.write_coalescer import WriteCoalescer
+
+def student(i):
+    return schemas.StudentCreate(name=f"Student {i}", class_name="DevOps", section="AB"[i % 2], marks=i)
+
+@pytest.fixture
+def seed_students():
+    return []
+
+@pytest.fixture
+def session_factory(file_sessions):
+    """Sessions on a shared file database, one per simulated request, counting commits"""
+    commits = []
+    event.listen(file_sessions.kw["bind"], "commit", lambda connection: commits.append(1))
+    file_sessions.commits = commits
+    return file_sessions
+
+def run_concurrently(coalescer, session_factory, count):
+    results, errors = [None] * count, []
+    barrier = threading.Barrier(count)
+
+    def request(i):
+        db = session_factory()
+        try:
+            barrier.wait()
+            results[i] = coalescer.submit(db, student(i))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_inserts_share_commits(session_factory):
+    """Test concurrent callers are committed together and each gets its own row"""
+    coalescer = WriteCoalescer(window_ms=200, max_batch=10)
+    results, errors = run_concurrently(coalescer, session_factory, 20)
+
+    assert errors == []
+    assert [r.name for r in results] == [f"Student {i}" for i in range(20)]
+    assert len({r.id for r in results}) == 20
+    assert coalescer.stats()["rows"] == 20
+    assert coalescer.stats()["largest_batch"] == 10
+    assert len(session_factory.commits) < 20
+
+    db = session_factory()
+    stored = dict(db.execute(text("SELECT id, name FROM students")).fetchall())
+    assert all(stored[r.id] == r.name for r in results)
+    assert db.execute(text("SELECT SUM(student_count) FROM student_stats")).scalar() == 20
+
+def test_window_closes_partial_batch(session_factory):
+    """Test a lone caller is flushed after the window without waiting for a full batch"""
+    coalescer = WriteCoalescer(window_ms=1, max_batch=100)
+    db = session_factory()
+
+    response = coalescer.submit(db, student(7))
+
+    assert (response.name, response.marks) == ("Student 7", 7)
+    assert coalescer.stats()["batches"] == 1
+
+def test_failed_batch_falls_back_per_row(session_factory, monkeypatch):
+    """Test a failing batch insert is retried row by row"""
+    def broken(db, students):
+        raise RuntimeError("batch insert failed")
+
+    monkeypatch.setattr("app.write_coalescer.insert_students", broken)
+    coalescer = WriteCoalescer(window_ms=200, max_batch=3)
+    results, errors = run_concurrently(coalescer, session_factory, 3)
+
+    assert errors == []
+    assert sorted(r.marks for r in results) == [0, 1, 2]
+    assert coalescer.stats()["fallbacks"] == 1
+
+def test_endpoint_contract_unchanged(client, monkeypatch):
+    """Test /students/create responds the same way with coalescing on"""
+    monkeypatch.setattr("app.main.settings.WRITE_COALESCE_ENABLED", True)
+    response = client.post("/students/create", json={
+        "name": "Alice", "class_name": "DevOps", "section": "A", "marks": 80
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"id", "name", "class_name", "section", "marks"}
+    assert body["name"] == "Alice" and isinstance(body["id"], int)